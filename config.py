@@ -3,11 +3,16 @@ Unified configuration for the StrodService project supporting multi-user mode
 """
 
 import os
-from sqlalchemy import create_engine
+import sys
+from pathlib import Path
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import timedelta
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src" / "backend-python"))
+
+from app.database import create_db_engine  # noqa: E402
+
 
 class Config:
     """Base configuration class"""
@@ -15,33 +20,9 @@ class Config:
     # Database configuration
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./strod_service_main.db")
     
-    # Determine database type and configure accordingly
-    if "postgresql" in DATABASE_URL.lower():
-        # PostgreSQL settings for multi-user environment
-        engine = create_engine(
-            DATABASE_URL,
-            pool_size=20,  # Connection pool size for multi-user support
-            max_overflow=30,  # Maximum additional connections
-            pool_pre_ping=True,  # Check connection before use
-            pool_recycle=300,  # Recreate connections every 5 minutes
-            echo=False  # Enable SQL logging only for debugging
-        )
-    elif "mysql" in DATABASE_URL.lower():
-        engine = create_engine(
-            DATABASE_URL,
-            pool_size=15,
-            max_overflow=20,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            echo=False
-        )
-    else:
-        # For SQLite (single-user mode, mainly for development)
-        engine = create_engine(
-            DATABASE_URL,
-            connect_args={"check_same_thread": False},  # Allow access from different threads
-            echo=False
-        )
+    # Engine is built by the backend factory: pool size/overflow come from
+    # DB_POOL_SIZE/DB_MAX_OVERFLOW, SQLite gets WAL and connection pragmas
+    engine = create_db_engine(DATABASE_URL)
 
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
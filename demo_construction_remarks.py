@@ -154,6 +154,9 @@ def demo_construction_remarks():
             print(f"   Фотографий: {len(full_remark.photos)}")
             print(f"   Записей в истории: {len(full_remark.history)}")
         
+        # CRUD функции только выполняют flush, фиксируем изменения демонстрации
+        db.commit()
+        
     except Exception as e:
         print(f"Ошибка при выполнении демонстрации: {e}")
         import traceback
@@ -1,111 +1,300 @@
 #!/usr/bin/env python3
 """
 Система учета отправленных и возвращенных документов исполнительной документации в ПТО
+
+Реестр ведется в собственной базе pto_docs.db (DocTrackingSystem) или в базе
+бэкенда через его CRUD слой (BackendDocTrackingSystem, ключ --backend): тогда
+реестр ПТО и веб-приложение работают с одним списком документов.
+
+    python doc_tracking_system.py [--db pto_docs.db | --backend [DATABASE_URL]]
+    python doc_tracking_system.py [...] import документы.csv
+    python doc_tracking_system.py [...] export реестр.csv [--search СЛОВО]
 """
 
+import argparse
+import csv
+import json
+import os
 import sqlite3
+import sys
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent / "src" / "backend-python"
+
+# Пакетная загрузка и выгрузка идут частями по BATCH_SIZE строк
+BATCH_SIZE = 500
+# sqlite3 подготавливает выражение один раз для каждого текста SQL и хранит
+# его в кэше соединения, поэтому все запросы ниже - константы модуля
+STATEMENT_CACHE_SIZE = 128
+
+# CSV для Excel: разделитель ";" и BOM, чтобы кириллица открывалась без настройки
+CSV_DELIMITER = ";"
+CSV_ENCODING = "utf-8-sig"
+IMPORT_COLUMNS = ("doc_number", "doc_title", "project_number", "issue_date", "doc_type")
+REGISTER_COLUMNS = (
+    "id", "doc_number", "doc_title", "project_number", "status",
+    "shipment_date", "recipient", "shipped_by", "return_date", "returned_by",
+)
+# Выгрузка: колонки реестра и поля загрузки, которых в реестре нет - файл загружается обратно
+EXPORT_COLUMNS = REGISTER_COLUMNS + tuple(column for column in IMPORT_COLUMNS if column not in REGISTER_COLUMNS)
+
+STATUS_IN_OFFICE = 'в наличии'
+STATUS_SHIPPED = 'отправлен'
+STATUS_RETURNED = 'возвращен'
+
+# Последняя отправка и последний возврат хранятся в documents (денормализация),
+# чтобы реестр читался одним проходом по таблице без подзапросов на каждую строку
+LAST_MOVEMENT_COLUMNS = (
+    ("last_shipment_date", "DATE"),
+    ("last_recipient", "TEXT"),
+    ("last_shipped_by", "INTEGER"),
+    ("last_return_date", "DATE"),
+    ("last_returned_by", "INTEGER"),
+)
+
+# Реестр: те же колонки, что раньше вычислялись подзапросами
+REGISTER_QUERY = '''
+    SELECT
+        d.id,
+        d.doc_number,
+        d.doc_title,
+        d.project_number,
+        d.status,
+        d.last_shipment_date as shipment_date,
+        d.last_recipient as recipient,
+        su.full_name as shipped_by_name,
+        d.last_return_date as return_date,
+        ru.full_name as returned_by_name
+    FROM documents d
+    LEFT JOIN users su ON su.id = d.last_shipped_by
+    LEFT JOIN users ru ON ru.id = d.last_returned_by
+'''
+
+SQL_LIST_DOCUMENTS = REGISTER_QUERY + 'ORDER BY d.id'
+SQL_SEARCH_DOCUMENTS = REGISTER_QUERY + '''
+    WHERE d.doc_number LIKE ? OR d.doc_title LIKE ? OR d.project_number LIKE ?
+    ORDER BY d.id
+'''
+SQL_GET_DOCUMENT = 'SELECT * FROM documents WHERE id = ?'
+# Список значений передается одним параметром (JSON), текст запроса не зависит от размера пачки
+SQL_EXISTING_DOC_NUMBERS = 'SELECT doc_number FROM documents WHERE doc_number IN (SELECT value FROM json_each(?))'
+SQL_EXPORT_FIELDS = 'SELECT id, issue_date, doc_type FROM documents WHERE id BETWEEN ? AND ?'
+SQL_DOCUMENT_STATUS = 'SELECT id, status FROM documents WHERE id = ?'
+SQL_INSERT_DOCUMENT = '''
+    INSERT INTO documents (doc_number, doc_title, project_number, issue_date, doc_type, created_by)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+# Смена статуса с условием на текущий статус: две одновременные отправки
+# одного документа (из разных процессов) не пройдут обе
+SQL_MARK_SHIPPED = f'''
+    UPDATE documents
+    SET status = '{STATUS_SHIPPED}', last_shipment_date = ?, last_recipient = ?, last_shipped_by = ?
+    WHERE id = ? AND status != '{STATUS_SHIPPED}'
+'''
+SQL_INSERT_SHIPMENT = '''
+    INSERT INTO shipments (doc_id, recipient, shipment_date, shipped_by, notes)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_MARK_RETURNED = f'''
+    UPDATE documents
+    SET status = '{STATUS_RETURNED}', last_return_date = ?, last_returned_by = ?
+    WHERE id = ? AND status = '{STATUS_SHIPPED}'
+'''
+SQL_INSERT_RETURN = '''
+    INSERT INTO returns (doc_id, return_date, returned_by, condition, notes)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SQL_USER_BY_USERNAME = 'SELECT id FROM users WHERE username = ?'
+SQL_INSERT_USER = 'INSERT INTO users (username, full_name) VALUES (?, ?)'
+
+
+def _is_valid_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def _batches(rows, size=BATCH_SIZE):
+    """Разбиение итератора строк на списки по size"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 class DocTrackingSystem:
-    """Класс системы учета документов"""
+    """
+    Класс системы учета документов.
+
+    Все операции выполняются через одно соединение, открытое на время работы
+    реестра (close() или with DocTrackingSystem() as system). База работает
+    в режиме WAL: чтение реестра не ждет записи из другого процесса.
+    """
     def __init__(self, db_path="pto_docs.db"):
         self.db_path = db_path
+        self.conn = self._connect()
         self.init_database()
 
-    def init_database(self):
-        """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA busy_timeout = 5000')
+        return conn
 
-        # Таблица пользователей для многопользовательского режима
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                role TEXT DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    def close(self):
+        """Закрытие соединения с базой"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
 
-        # Таблица документов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                doc_number TEXT NOT NULL,
-                doc_title TEXT NOT NULL,
-                project_number TEXT,
-                issue_date DATE,
-                doc_type TEXT,
-                status TEXT DEFAULT 'в наличии',
-                created_by INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_by INTEGER,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (created_by) REFERENCES users (id),
-                FOREIGN KEY (updated_by) REFERENCES users (id)
-            )
-        ''')
+    def __enter__(self):
+        return self
 
-        # Таблица отправок
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS shipments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                doc_id INTEGER,
-                recipient TEXT NOT NULL,
-                shipment_date DATE NOT NULL,
-                shipped_by INTEGER,
-                notes TEXT,
-                FOREIGN KEY (doc_id) REFERENCES documents (id),
-                FOREIGN KEY (shipped_by) REFERENCES users (id)
-            )
-        ''')
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def init_database(self):
+        """Инициализация базы данных"""
+        # Транзакция фиксируется при выходе из блока и откатывается при исключении
+        with self.conn:
+            cursor = self.conn.cursor()
 
-        # Таблица возвратов
+            # Таблица пользователей для многопользовательского режима
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    full_name TEXT NOT NULL,
+                    role TEXT DEFAULT 'user',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Таблица документов
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_number TEXT NOT NULL,
+                    doc_title TEXT NOT NULL,
+                    project_number TEXT,
+                    issue_date DATE,
+                    doc_type TEXT,
+                    status TEXT DEFAULT 'в наличии',
+                    created_by INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_by INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (created_by) REFERENCES users (id),
+                    FOREIGN KEY (updated_by) REFERENCES users (id)
+                )
+            ''')
+
+            # Таблица отправок
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS shipments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id INTEGER,
+                    recipient TEXT NOT NULL,
+                    shipment_date DATE NOT NULL,
+                    shipped_by INTEGER,
+                    notes TEXT,
+                    FOREIGN KEY (doc_id) REFERENCES documents (id),
+                    FOREIGN KEY (shipped_by) REFERENCES users (id)
+                )
+            ''')
+
+            # Таблица возвратов
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS returns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id INTEGER,
+                    return_date DATE NOT NULL,
+                    returned_by INTEGER,
+                    condition TEXT,
+                    notes TEXT,
+                    FOREIGN KEY (doc_id) REFERENCES documents (id),
+                    FOREIGN KEY (returned_by) REFERENCES users (id)
+                )
+            ''')
+
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_shipments_doc_id ON shipments (doc_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_returns_doc_id ON returns (doc_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_documents_doc_number ON documents (doc_number)')
+
+            # Колонки последней отправки/возврата в базах, созданных до их появления
+            existing = {row[1] for row in cursor.execute('PRAGMA table_info(documents)')}
+            missing = [(name, sql_type) for name, sql_type in LAST_MOVEMENT_COLUMNS if name not in existing]
+            for name, sql_type in missing:
+                cursor.execute(f'ALTER TABLE documents ADD COLUMN {name} {sql_type}')
+            if missing:
+                self._backfill_last_movements(cursor)
+
+    def _backfill_last_movements(self, cursor):
+        """Заполнение последней отправки и возврата по существующим записям (однократно)"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS returns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                doc_id INTEGER,
-                return_date DATE NOT NULL,
-                returned_by INTEGER,
-                condition TEXT,
-                notes TEXT,
-                FOREIGN KEY (doc_id) REFERENCES documents (id),
-                FOREIGN KEY (returned_by) REFERENCES users (id)
-            )
+            UPDATE documents SET
+                last_shipment_date = (SELECT s.shipment_date FROM shipments s WHERE s.doc_id = documents.id ORDER BY s.id DESC LIMIT 1),
+                last_recipient = (SELECT s.recipient FROM shipments s WHERE s.doc_id = documents.id ORDER BY s.id DESC LIMIT 1),
+                last_shipped_by = (SELECT s.shipped_by FROM shipments s WHERE s.doc_id = documents.id ORDER BY s.id DESC LIMIT 1),
+                last_return_date = (SELECT r.return_date FROM returns r WHERE r.doc_id = documents.id ORDER BY r.id DESC LIMIT 1),
+                last_returned_by = (SELECT r.returned_by FROM returns r WHERE r.doc_id = documents.id ORDER BY r.id DESC LIMIT 1)
         ''')
 
-        conn.commit()
-        conn.close()
+    def login(self, username, full_name):
+        """Вход пользователя: ID существующего пользователя или нового (регистрация)"""
+        with self.conn:
+            user = self.conn.execute(SQL_USER_BY_USERNAME, (username,)).fetchone()
+            if user:
+                print(f"Добро пожаловать обратно, {full_name} (ID: {user[0]})!")
+                return user[0]
+            user_id = self.conn.execute(SQL_INSERT_USER, (username, full_name)).lastrowid
+            print(f"Пользователь {full_name} успешно зарегистрирован с ID: {user_id}")
+            return user_id
+
+    @staticmethod
+    def _validate_document(doc_number, doc_title, issue_date):
+        """Сообщение об ошибке в данных документа или None"""
+        if not doc_number or not doc_title:
+            return "Номер и наименование документа обязательны"
+        if issue_date and not _is_valid_date(issue_date):
+            return "Неверный формат даты. Используйте ГГГГ-ММ-ДД"
+        return None
+
+    @staticmethod
+    def _validate_shipment(doc_id, recipient, shipment_date):
+        """Сообщение об ошибке в данных отправки или None"""
+        if not isinstance(doc_id, int) or doc_id <= 0:
+            return "ID документа должен быть положительным целым числом"
+        if not recipient or not recipient.strip():
+            return "Получатель обязателен"
+        if shipment_date and not _is_valid_date(shipment_date):
+            return "Неверный формат даты. Используйте ГГГГ-ММ-ДД"
+        return None
 
     def add_document(self, doc_number, doc_title, project_number=None, issue_date=None, doc_type=None, user_id=None):
         """Добавление нового документа"""
         # Валидация входных данных
-        if not doc_number or not doc_title:
-            print("Ошибка: Номер и наименование документа обязательны")
+        error = self._validate_document(doc_number, doc_title, issue_date)
+        if error:
+            print(f"Ошибка: {error}")
             return None
 
-        # Проверка формата даты
-        if issue_date:
-            try:
-                datetime.strptime(issue_date, '%Y-%m-%d')
-            except ValueError:
-                print("Ошибка: Неверный формат даты. Используйте ГГГГ-ММ-ДД")
-                return None
-
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT INTO documents (doc_number, doc_title, project_number, issue_date, doc_type, created_by)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (doc_number, doc_title, project_number, issue_date, doc_type, user_id))
+        with self.conn:
+            doc_id = self.conn.execute(
+                SQL_INSERT_DOCUMENT, (doc_number, doc_title, project_number, issue_date, doc_type, user_id)
+            ).lastrowid
 
-            doc_id = cursor.lastrowid
-            conn.commit()
-
-            print(f"Документ '{doc_title}' (ID: {doc_id}) успешно добавлен пользователем {user_id}")
-            return doc_id
+        print(f"Документ '{doc_title}' (ID: {doc_id}) успешно добавлен пользователем {user_id}")
+        return doc_id
 
     def get_document_by_id(self, doc_id):
         """Получение информации о документе по ID"""
@@ -114,184 +303,357 @@ class DocTrackingSystem:
             print("Ошибка: ID документа должен быть положительным целым числом")
             return None
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT * FROM documents WHERE id = ?
-            ''', (doc_id,))
-
-            doc = cursor.fetchone()
-
-            return doc
+        return self.conn.execute(SQL_GET_DOCUMENT, (doc_id,)).fetchone()
 
     def list_documents(self):
         """Список всех документов"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Используем подзапросы для получения последней отправки и возврата для каждого документа
-        # А также информацию о пользователях
-        cursor.execute('''
-            SELECT
-                d.id,
-                d.doc_number,
-                d.doc_title,
-                d.project_number,
-                d.status,
-                (SELECT s.shipment_date FROM shipments s WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as shipment_date,
-                (SELECT s.recipient FROM shipments s WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as recipient,
-                (SELECT u.full_name FROM shipments s JOIN users u ON s.shipped_by = u.id WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as shipped_by_name,
-                (SELECT r.return_date FROM returns r WHERE r.doc_id = d.id ORDER BY r.id DESC LIMIT 1) as return_date,
-                (SELECT u.full_name FROM returns r JOIN users u ON r.returned_by = u.id WHERE r.doc_id = d.id ORDER BY r.id DESC LIMIT 1) as returned_by_name
-            FROM documents d
-            ORDER BY d.id
-        ''')
+        return list(self._register_rows())
 
-        docs = cursor.fetchall()
-        conn.close()
-
-        return docs
+    def search_documents(self, keyword):
+        """Поиск документов по ключевому слову"""
+        return list(self._register_rows(keyword))
+
+    def _register_rows(self, keyword=None):
+        """Строки реестра (все или найденные по ключевому слову), читаются частями"""
+        # Последняя отправка и возврат берутся из колонок документа
+        if keyword:
+            pattern = f'%{keyword}%'
+            cursor = self.conn.execute(SQL_SEARCH_DOCUMENTS, (pattern, pattern, pattern))
+        else:
+            cursor = self.conn.execute(SQL_LIST_DOCUMENTS)
+        try:
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
 
     def ship_document(self, doc_id, recipient, shipment_date=None, notes=None, user_id=None):
         """Отправка документа"""
         # Валидация параметров
-        if not isinstance(doc_id, int) or doc_id <= 0:
-            print("Ошибка: ID документа должен быть положительным целым числом")
+        error = self._validate_shipment(doc_id, recipient, shipment_date)
+        if error:
+            print(f"Ошибка: {error}")
             return False
+        shipment_date = shipment_date or datetime.now().strftime('%Y-%m-%d')
 
-        if not recipient or not recipient.strip():
-            print("Ошибка: Получатель обязателен")
-            return False
+        # Статус, последняя отправка и запись отправки - в одной транзакции
+        with self.conn:
+            # Проверяем, существует ли документ
+            if not self.conn.execute(SQL_DOCUMENT_STATUS, (doc_id,)).fetchone():
+                print(f"Документ с ID {doc_id} не найден")
+                return False
 
-        # Проверка формата даты
-        if shipment_date:
-            try:
-                datetime.strptime(shipment_date, '%Y-%m-%d')
-            except ValueError:
-                print("Ошибка: Неверный формат даты. Используйте ГГГГ-ММ-ДД")
+            # Статус меняется, только если документ еще не отправлен
+            if not self.conn.execute(SQL_MARK_SHIPPED, (shipment_date, recipient, user_id, doc_id)).rowcount:
+                print(f"Документ с ID {doc_id} уже отправлен")
                 return False
-        else:
-            shipment_date = datetime.now().strftime('%Y-%m-%d')
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+            self.conn.execute(SQL_INSERT_SHIPMENT, (doc_id, recipient, shipment_date, user_id, notes))
+
+        print(f"Документ с ID {doc_id} отправлен получателю '{recipient}' пользователем {user_id}")
+        return True
+
+    def return_document(self, doc_id, condition=None, notes=None, user_id=None):
+        """Возврат документа"""
+        return_date = datetime.now().strftime('%Y-%m-%d')
 
+        with self.conn:
             # Проверяем, существует ли документ
-            cursor.execute('SELECT id, status FROM documents WHERE id = ?', (doc_id,))
-            doc = cursor.fetchone()
-            if not doc:
+            if not self.conn.execute(SQL_DOCUMENT_STATUS, (doc_id,)).fetchone():
                 print(f"Документ с ID {doc_id} не найден")
                 return False
 
-            # Проверяем статус документа
-            if doc[1] == 'отправлен':
-                print(f"Документ с ID {doc_id} уже отправлен")
+            # Статус меняется, только если документ отправлен
+            if not self.conn.execute(SQL_MARK_RETURNED, (return_date, user_id, doc_id)).rowcount:
+                print(f"Документ с ID {doc_id} не был отправлен, невозможно зафиксировать возврат")
                 return False
 
-            # Обновляем статус документа
-            cursor.execute('UPDATE documents SET status = ? WHERE id = ?', ('отправлен', doc_id))
+            self.conn.execute(SQL_INSERT_RETURN, (doc_id, return_date, user_id, condition, notes))
 
-            # Добавляем запись об отправке
-            cursor.execute('''
-                INSERT INTO shipments (doc_id, recipient, shipment_date, shipped_by, notes)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (doc_id, recipient, shipment_date, user_id, notes))
+        print(f"Документ с ID {doc_id} возвращен пользователем {user_id}")
+        return True
 
-            conn.commit()
+    def import_documents(self, path, user_id=None):
+        """
+        Пакетная загрузка документов из CSV (разделитель ";", колонки
+        doc_number, doc_title, project_number, issue_date, doc_type; обязательны
+        первые две). Строки с ошибками и документы с уже существующим номером
+        пропускаются с сообщением, остальные сохраняются пачками по BATCH_SIZE.
+        Возвращает (загружено, пропущено).
+        """
+        imported = skipped = 0
+        with open(path, newline='', encoding=CSV_ENCODING) as file:
+            reader = csv.DictReader(file, delimiter=CSV_DELIMITER)
+            missing = {'doc_number', 'doc_title'} - set(reader.fieldnames or ())
+            if missing:
+                print(f"Ошибка: в файле нет колонок {', '.join(sorted(missing))}")
+                return 0, 0
+
+            def valid_rows():
+                nonlocal skipped
+                for row in reader:
+                    values = tuple((row.get(column) or '').strip() or None for column in IMPORT_COLUMNS)
+                    error = self._validate_document(values[0], values[1], values[3])
+                    if error:
+                        print(f"Строка {reader.line_num}: {error}, пропущена")
+                        skipped += 1
+                        continue
+                    yield values
+
+            for batch in _batches(valid_rows()):
+                rows = self._new_documents(batch)
+                skipped += len(batch) - len(rows)
+                if rows:
+                    self._insert_documents(rows, user_id)
+                imported += len(rows)
+
+        print(f"Загружено документов: {imported}, пропущено строк: {skipped}")
+        return imported, skipped
+
+    def _new_documents(self, rows):
+        """Строки пачки, номеров которых еще нет в реестре (повторы в пачке тоже пропускаются)"""
+        existing = self._existing_doc_numbers([row[0] for row in rows])
+        result = []
+        for row in rows:
+            if row[0] in existing:
+                print(f"Документ с номером {row[0]} уже есть в реестре, пропущен")
+                continue
+            existing.add(row[0])
+            result.append(row)
+        return result
+
+    def _existing_doc_numbers(self, doc_numbers):
+        return {row[0] for row in self.conn.execute(SQL_EXISTING_DOC_NUMBERS, (json.dumps(doc_numbers),))}
+
+    def _insert_documents(self, rows, user_id):
+        """Вставка пачки документов одним подготовленным выражением"""
+        with self.conn:
+            self.conn.executemany(SQL_INSERT_DOCUMENT, [row + (user_id,) for row in rows])
+
+    def _export_fields(self, doc_ids):
+        """Дата выпуска и тип документов пачки реестра: {id: (issue_date, doc_type)}"""
+        rows = self.conn.execute(SQL_EXPORT_FIELDS, (min(doc_ids), max(doc_ids)))
+        return {doc_id: (issue_date, doc_type) for doc_id, issue_date, doc_type in rows}
+
+    def export_documents(self, path, keyword=None):
+        """
+        Выгрузка реестра (или найденных документов) в CSV для Excel.
+        Кроме колонок реестра выгружаются дата выпуска и тип документа,
+        поэтому файл можно загрузить через import_documents в другой
+        реестр; документы с уже существующими номерами при этом
+        пропускаются. Реестр читается и пишется частями. Возвращает число
+        выгруженных документов.
+        """
+        exported = 0
+        with open(path, 'w', newline='', encoding=CSV_ENCODING) as file:
+            writer = csv.writer(file, delimiter=CSV_DELIMITER)
+            writer.writerow(EXPORT_COLUMNS)
+            for batch in _batches(self._register_rows(keyword)):
+                fields = self._export_fields([row[0] for row in batch])
+                writer.writerows(tuple(row) + fields.get(row[0], (None, None)) for row in batch)
+                exported += len(batch)
+
+        print(f"Выгружено документов: {exported} в {path}")
+        return exported
+
+
+class BackendDocTrackingSystem(DocTrackingSystem):
+    """
+    Реестр ПТО в базе бэкенда.
+
+    Документы, отправки и возвраты записываются CRUD функциями бэкенда
+    (app.crud), как при работе через API: с проверкой переходов статуса,
+    историей статусов, журналом синхронизации и уведомлениями. Соединения
+    берутся из пула движка бэкенда. Пользователь - пользователь бэкенда,
+    его имя записывается в историю статусов. Дата выпуска документа в
+    схеме бэкенда не хранится.
+    """
+    def __init__(self, database_url=None):
+        # DATABASE_URL читается бэкендом при импорте app.database
+        if database_url:
+            os.environ["DATABASE_URL"] = database_url
+        else:
+            os.environ.setdefault("DATABASE_URL", f"sqlite:///{BACKEND_DIR / 'strod_service_tech.db'}")
+        if str(BACKEND_DIR) not in sys.path:
+            sys.path.insert(0, str(BACKEND_DIR))
+
+        from app import crud, crud_user, models, schemas
+        from app.database import SessionLocal
+        from app.utils import legacy_documents
+
+        self.crud, self.crud_user, self.schemas, self.legacy = crud, crud_user, schemas, legacy_documents
+        self.models = models
+        self.session_factory = SessionLocal
+        self.db_path = os.environ["DATABASE_URL"]
+        self.conn = None
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def _session(self):
+        """Сессия бэкенда на одну операцию: фиксация при успехе, откат при ошибке"""
+        db = self.session_factory()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def login(self, username, full_name):
+        """Вход существующего пользователя бэкенда; возвращает его имя или None"""
+        with self._session() as db:
+            user = self.crud_user.get_user_by_username(db, username)
+            if not user:
+                print(f"Пользователь {username} не найден в базе бэкенда")
+                return None
+            print(f"Добро пожаловать обратно, {user.full_name or full_name} ({user.username})!")
+            return user.username
 
-            print(f"Документ с ID {doc_id} отправлен получателю '{recipient}' пользователем {user_id}")
-            return True
+    def add_document(self, doc_number, doc_title, project_number=None, issue_date=None, doc_type=None, user_id=None):
+        """Добавление нового документа"""
+        error = self._validate_document(doc_number, doc_title, issue_date)
+        if error:
+            print(f"Ошибка: {error}")
+            return None
 
-    def return_document(self, doc_id, condition=None, notes=None, user_id=None):
-        """Возврат документа"""
-        return_date = datetime.now().strftime('%Y-%m-%d')
+        with self._session() as db:
+            doc_id = self._create_document(db, self.legacy.DocumentTypeResolver(db),
+                                           (doc_number, doc_title, project_number, issue_date, doc_type), user_id)
+
+        print(f"Документ '{doc_title}' (ID: {doc_id}) успешно добавлен пользователем {user_id}")
+        return doc_id
+
+    def _create_document(self, db, resolve_type, row, user_id):
+        doc_number, doc_title, project_number, _issue_date, doc_type = row
+        document = self.crud.create_document(db, self.schemas.DocumentCreate(
+            doc_number=doc_number,
+            title=doc_title,
+            project_id=project_number or self.legacy.NO_PROJECT_ID,
+            document_type_id=resolve_type(doc_type),
+        ), changed_by=user_id)
+        return document.id
+
+    def _existing_doc_numbers(self, doc_numbers):
+        document = self.models.Document
+        with self._session() as db:
+            return {doc_number for doc_number, in db.query(document.doc_number).filter(document.doc_number.in_(doc_numbers))}
+
+    def _export_fields(self, doc_ids):
+        # Дата выпуска в схеме бэкенда не хранится
+        document, document_type = self.models.Document, self.models.DocumentType
+        with self._session() as db:
+            rows = db.query(document.id, document_type.name).outerjoin(
+                document_type, document_type.id == document.document_type_id
+            ).filter(document.id.in_(doc_ids))
+            return {doc_id: (None, type_name) for doc_id, type_name in rows}
+
+    def _insert_documents(self, rows, user_id):
+        with self._session() as db:
+            resolve_type = self.legacy.DocumentTypeResolver(db)
+            for row in rows:
+                self._create_document(db, resolve_type, row, user_id)
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_document_by_id(self, doc_id):
+        """Строка реестра документа по ID"""
+        if not isinstance(doc_id, int) or doc_id <= 0:
+            print("Ошибка: ID документа должен быть положительным целым числом")
+            return None
+        return next(self._register_rows(document_id=doc_id), None)
 
-        # Проверяем, существует ли документ
-        cursor.execute('SELECT id, status FROM documents WHERE id = ?', (doc_id,))
-        doc = cursor.fetchone()
-        if not doc:
-            print(f"Документ с ID {doc_id} не найден")
-            conn.close()
-            return False
+    def _register_rows(self, keyword=None, document_id=None):
+        def day(value):
+            return value.strftime('%Y-%m-%d') if value else None
 
-        # Проверяем статус документа
-        if doc[1] != 'отправлен':
-            print(f"Документ с ID {doc_id} не был отправлен, невозможно зафиксировать возврат")
-            conn.close()
+        with self._session() as db:
+            for row in self.crud.get_document_register(db, query_str=keyword, document_id=document_id,
+                                                       yield_per=BATCH_SIZE):
+                yield (row.id, row.doc_number, row.title, row.project_id, self.legacy.status_label(row.status),
+                       day(row.last_shipment_date), row.last_shipment_recipient, row.shipped_by,
+                       day(row.last_return_date), row.returned_by)
+
+    def ship_document(self, doc_id, recipient, shipment_date=None, notes=None, user_id=None):
+        """Отправка документа"""
+        error = self._validate_shipment(doc_id, recipient, shipment_date)
+        if error:
+            print(f"Ошибка: {error}")
             return False
 
-        # Обновляем статус документа
-        cursor.execute('UPDATE documents SET status = ? WHERE id = ?', ('возвращен', doc_id))
+        try:
+            with self._session() as db:
+                if not self.crud.get_document(db, doc_id):
+                    print(f"Документ с ID {doc_id} не найден")
+                    return False
+                self.crud.create_document_shipment(db, self.schemas.DocumentShipmentCreate(
+                    document_id=doc_id,
+                    recipient=recipient,
+                    shipment_date=self.legacy.parse_date(shipment_date) or datetime.now(),
+                    notes=notes,
+                ), changed_by=user_id)
+        except self.crud.InvalidDocumentTransition as e:
+            print(f"Документ с ID {doc_id}: {e}")
+            return False
 
-        # Добавляем запись о возврате
-        cursor.execute('''
-            INSERT INTO returns (doc_id, return_date, returned_by, condition, notes)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (doc_id, return_date, user_id, condition, notes))
+        print(f"Документ с ID {doc_id} отправлен получателю '{recipient}' пользователем {user_id}")
+        return True
 
-        conn.commit()
-        conn.close()
+    def return_document(self, doc_id, condition=None, notes=None, user_id=None):
+        """Возврат документа"""
+        try:
+            with self._session() as db:
+                if not self.crud.get_document(db, doc_id):
+                    print(f"Документ с ID {doc_id} не найден")
+                    return False
+                self.crud.create_document_return(db, self.schemas.DocumentReturnCreate(
+                    document_id=doc_id,
+                    return_date=datetime.now(),
+                    condition=condition or self.legacy.DEFAULT_RETURN_CONDITION,
+                    notes=notes,
+                ), changed_by=user_id)
+        except self.crud.InvalidDocumentTransition as e:
+            print(f"Документ с ID {doc_id}: {e}")
+            return False
 
         print(f"Документ с ID {doc_id} возвращен пользователем {user_id}")
         return True
 
-    def search_documents(self, keyword):
-        """Поиск документов по ключевому слову"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
 
-        # Используем подзапросы для получения последней отправки и возврата для каждого документа
-        # А также информацию о пользователях
-        cursor.execute('''
-            SELECT
-                d.id,
-                d.doc_number,
-                d.doc_title,
-                d.project_number,
-                d.status,
-                (SELECT s.shipment_date FROM shipments s WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as shipment_date,
-                (SELECT s.recipient FROM shipments s WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as recipient,
-                (SELECT u.full_name FROM shipments s JOIN users u ON s.shipped_by = u.id WHERE s.doc_id = d.id ORDER BY s.id DESC LIMIT 1) as shipped_by_name,
-                (SELECT r.return_date FROM returns r WHERE r.doc_id = d.id ORDER BY r.id DESC LIMIT 1) as return_date,
-                (SELECT u.full_name FROM returns r JOIN users u ON r.returned_by = u.id WHERE r.doc_id = d.id ORDER BY r.id DESC LIMIT 1) as returned_by_name
-            FROM documents d
-            WHERE d.doc_number LIKE ? OR d.doc_title LIKE ? OR d.project_number LIKE ?
-            ORDER BY d.id
-        ''', (f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'))
-
-        docs = cursor.fetchall()
-        conn.close()
-
-        return docs
-
-
-def run_cli_interface():
+def print_documents(docs, empty_message):
+    """Вывод строк реестра таблицей"""
+    if not docs:
+        print(empty_message)
+        return
+    print(f"{'ID':<5} {'Номер':<15} {'Наименование':<30} {'Проект':<15} {'Статус':<15} {'Отправлен':<12} {'Получатель':<20} {'Отправил':<15} {'Возвращен':<12} {'Вернул':<15}")
+    print("-" * 150)
+    for doc in docs:
+        doc_id, doc_number, doc_title, project_number, status, shipment_date, recipient, shipped_by_name, return_date, returned_by_name = doc
+        print(f"{doc_id:<5} {doc_number:<15} {doc_title[:29]:<30} {project_number or '':<15} {status:<15} {shipment_date or '':<12} {recipient or '':<20} {shipped_by_name or '':<15} {return_date or '':<12} {returned_by_name or '':<15}")
+
+
+def run_cli_interface(system=None):
     """Запуск CLI-интерфейса системы учета документов"""
-    system = DocTrackingSystem()
-    
+    system = system or DocTrackingSystem()
+    try:
+        _run_menu(system)
+    finally:
+        system.close()
+
+
+def _run_menu(system):
     # Регистрируем или авторизуем пользователя
     print("=== Авторизация ===")
     username = input("Введите ваше имя пользователя (или создайте новое): ") or "default_user"
     full_name = input("Введите ваше полное имя: ") or username
-    
-    # Проверяем, существует ли пользователь, если нет - создаем
-    with sqlite3.connect(system.db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        
-        if user:
-            user_id = user[0]
-            print(f"Добро пожаловать обратно, {full_name} (ID: {user_id})!")
-        else:
-            cursor.execute('INSERT INTO users (username, full_name) VALUES (?, ?)', (username, full_name))
-            user_id = cursor.lastrowid
-            conn.commit()
-            print(f"Пользователь {full_name} успешно зарегистрирован с ID: {user_id}")
+
+    user_id = system.login(username, full_name)
+    if user_id is None:
+        return
 
     while True:
         print("\n=== Система учета документов ПТО ===")
@@ -300,9 +662,11 @@ def run_cli_interface():
         print("3. Зафиксировать возврат документа")
         print("4. Просмотреть все документы")
         print("5. Найти документ")
-        print("6. Выход")
+        print("6. Загрузить документы из CSV")
+        print("7. Выгрузить реестр в CSV")
+        print("8. Выход")
 
-        choice = input("Выберите действие (1-6): ")
+        choice = input("Выберите действие (1-8): ")
 
         if choice == '1':
             print("\n--- Добавление документа ---")
@@ -339,41 +703,64 @@ def run_cli_interface():
 
         elif choice == '4':
             print("\n--- Все документы ---")
-            docs = system.list_documents()
-
-            if docs:
-                print(f"{'ID':<5} {'Номер':<15} {'Наименование':<30} {'Проект':<15} {'Статус':<15} {'Отправлен':<12} {'Получатель':<20} {'Отправил':<15} {'Возвращен':<12} {'Вернул':<15}")
-                print("-" * 150)
-                for doc in docs:
-                    doc_id, doc_number, doc_title, project_number, status, shipment_date, recipient, shipped_by_name, return_date, returned_by_name = doc
-                    print(f"{doc_id:<5} {doc_number:<15} {doc_title[:29]:<30} {project_number or '':<15} {status:<15} {shipment_date or '':<12} {recipient or '':<20} {shipped_by_name or '':<15} {return_date or '':<12} {returned_by_name or '':<15}")
-            else:
-                print("Документов нет в системе")
+            print_documents(system.list_documents(), "Документов нет в системе")
 
         elif choice == '5':
             print("\n--- Поиск документов ---")
             keyword = input("Введите ключевое слово для поиска: ")
-            docs = system.search_documents(keyword)
-
-            if docs:
-                print(f"{'ID':<5} {'Номер':<15} {'Наименование':<30} {'Проект':<15} {'Статус':<15} {'Отправлен':<12} {'Получатель':<20} {'Отправил':<15} {'Возвращен':<12} {'Вернул':<15}")
-                print("-" * 150)
-                for doc in docs:
-                    doc_id, doc_number, doc_title, project_number, status, shipment_date, recipient, shipped_by_name, return_date, returned_by_name = doc
-                    print(f"{doc_id:<5} {doc_number:<15} {doc_title[:29]:<30} {project_number or '':<15} {status:<15} {shipment_date or '':<12} {recipient or '':<20} {shipped_by_name or '':<15} {return_date or '':<12} {returned_by_name or '':<15}")
-            else:
-                print("Документы не найдены")
+            print_documents(system.search_documents(keyword), "Документы не найдены")
 
         elif choice == '6':
+            print("\n--- Загрузка документов ---")
+            path = input("Путь к CSV файлу: ")
+            try:
+                system.import_documents(path, user_id=user_id)
+            except OSError as e:
+                print(f"Ошибка: не удалось прочитать файл: {e}")
+
+        elif choice == '7':
+            print("\n--- Выгрузка реестра ---")
+            path = input("Путь к CSV файлу: ")
+            try:
+                system.export_documents(path)
+            except OSError as e:
+                print(f"Ошибка: не удалось записать файл: {e}")
+
+        elif choice == '8':
             print("Выход из системы...")
             break
         else:
-            print("Некорректный выбор. Пожалуйста, выберите число от 1 до 6.")
+            print("Некорректный выбор. Пожалуйста, выберите число от 1 до 8.")
 
 
 def main():
-    """Основная функция для запуска CLI-интерфейса"""
-    run_cli_interface()
+    """Основная функция: CLI-интерфейс или пакетная загрузка/выгрузка"""
+    parser = argparse.ArgumentParser(description="Система учета документов ПТО")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--db", default="pto_docs.db", help="файл базы реестра ПТО")
+    source.add_argument("--backend", nargs="?", const="", metavar="DATABASE_URL",
+                        help="работать с базой бэкенда (по умолчанию DATABASE_URL или src/backend-python/strod_service_tech.db)")
+    commands = parser.add_subparsers(dest="command")
+    import_parser = commands.add_parser("import", help="загрузить документы из CSV")
+    import_parser.add_argument("path")
+    export_parser = commands.add_parser("export", help="выгрузить реестр в CSV")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--search", help="только документы, найденные по ключевому слову")
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        system = BackendDocTrackingSystem(args.backend or None)
+    else:
+        system = DocTrackingSystem(args.db)
+
+    if args.command is None:
+        run_cli_interface(system)
+        return
+    with system:
+        if args.command == "import":
+            system.import_documents(args.path)
+        else:
+            system.export_documents(args.path, args.search)
 
 
 if __name__ == "__main__":
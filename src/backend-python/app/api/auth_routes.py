@@ -1,68 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Request
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import timedelta
-import json
+from datetime import datetime, timedelta
 
 from .. import crud, crud_user, auth, schemas, database
 from ..auth import get_current_user as get_current_user_auth
+from ..permissions import Permission, require, permission_names
+from ..profiler import ProfiledRoute
 
-router = APIRouter(prefix="/auth", tags=["authentication"])
+router = APIRouter(prefix="/auth", tags=["authentication"], route_class=ProfiledRoute)
 
 security = HTTPBearer()
 
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    """Регистрация нового пользователя"""
+def register_user(user: schemas.UserRegister, db: Session = Depends(database.get_db)):
+    """
+    Регистрация нового пользователя.
+
+    Эндпоинт доступен без авторизации, поэтому is_admin и права из запроса
+    не принимаются: пользователь получает права по умолчанию, роли назначает
+    администратор.
+    """
     try:
-        db_user = crud_user.create_user(db, user)
+        db_user = crud_user.create_user(db, schemas.UserCreate(**user.model_dump()))
         return db_user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/login", response_model=schemas.Token)
-def login_user(login_data: schemas.UserLogin, db: Session = Depends(database.get_db)):
-    """Вход пользователя в систему"""
-    user = crud_user.authenticate_user(db, login_data.username, login_data.password)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Неверное имя пользователя или пароль",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    if not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Аккаунт пользователя деактивирован",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Пытаемся преобразовать permissions из строки обратно в словарь
-    permissions_dict = {}
-    try:
-        permissions_dict = json.loads(user.permissions) if user.permissions else {}
-    except (json.JSONDecodeError, TypeError):
-        # Если не получается распарсить, используем пустой словарь
-        permissions_dict = {}
-    
-    # Создаем JWT токен
+def _build_token_response(db: Session, user, db_session, refresh_token_id: str) -> schemas.Token:
+    """Сформировать пару access/refresh токенов для сессии пользователя"""
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={
             "sub": user.username,
             "user_id": user.id,
             "is_admin": user.is_admin,
-            "permissions": permissions_dict
+            # Права компилируются в битовую маску один раз при выдаче токена
+            "perms": crud_user.get_user_permission_mask(db, user),
+            "sid": db_session.id
         },
         expires_delta=access_token_expires
     )
+    refresh_token = auth.create_refresh_token(
+        data={
+            "sub": user.username,
+            "user_id": user.id,
+            "sid": db_session.id,
+            "jti": refresh_token_id
+        },
+        expires_delta=db_session.expires_at - datetime.utcnow()
+    )
     
-    token_data = schemas.Token(
+    return schemas.Token(
         access_token=access_token,
+        refresh_token=refresh_token,
         token_type="bearer",
         user=schemas.UserResponse(
             id=user.id,
@@ -77,20 +71,71 @@ def login_user(login_data: schemas.UserLogin, db: Session = Depends(database.get
             updated_at=user.updated_at
         )
     )
+
+
+@router.post("/login", response_model=schemas.Token)
+def login_user(login_data: schemas.UserLogin, request: Request, db: Session = Depends(database.get_db)):
+    """Вход пользователя в систему"""
+    user = crud_user.authenticate_user(db, login_data.username, login_data.password)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверное имя пользователя или пароль",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return token_data
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Аккаунт пользователя деактивирован",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Создаем серверную сессию, к которой привязываются access и refresh токены
+    refresh_token_id = auth.generate_token_id()
+    db_session = crud_user.create_user_session(
+        db,
+        user_id=user.id,
+        token_id=refresh_token_id,
+        expires_at=datetime.utcnow() + timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS),
+        user_agent=request.headers.get("user-agent"),
+        ip_address=request.client.host if request.client else None
+    )
+    
+    return _build_token_response(db, user, db_session, refresh_token_id)
 
 
 @router.post("/refresh", response_model=schemas.Token)
 def refresh_token(refresh_token: str = Form(...), db: Session = Depends(database.get_db)):
-    """Обновление access токена с использованием refresh токена"""
+    """Обновление токенов с ротацией refresh токена"""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Неверный refresh токен",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
     try:
         # Проверяем refresh токен
         payload = auth.verify_refresh_token(refresh_token)
         
+        session_id = payload.get("sid")
+        token_id = payload.get("jti")
+        if session_id is None or token_id is None:
+            raise invalid_token
+        
+        db_session = crud_user.get_user_session(db, session_id)
+        if not db_session or db_session.is_revoked or db_session.expires_at < datetime.utcnow():
+            raise invalid_token
+        
+        # Повторное использование уже замененного refresh токена означает его утечку:
+        # отзываем всю сессию
+        if db_session.session_token != token_id:
+            crud_user.revoke_user_session(db, db_session.id)
+            # Ответ с ошибкой откатывает транзакцию запроса, отзыв фиксируем явно
+            db.commit()
+            raise invalid_token
+        
         # Получаем пользователя из базы данных
-        user_id = payload.get("user_id")
-        user = crud_user.get_user(db, user_id)
+        user = crud_user.get_user(db, db_session.user_id)
         
         if not user:
             raise HTTPException(
@@ -106,59 +151,28 @@ def refresh_token(refresh_token: str = Form(...), db: Session = Depends(database
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Пытаемся преобразовать permissions из строки обратно в словарь
-        permissions_dict = {}
-        try:
-            permissions_dict = json.loads(user.permissions) if user.permissions else {}
-        except (json.JSONDecodeError, TypeError):
-            # Если не получается распарсить, используем пустой словарь
-            permissions_dict = {}
-        
-        # Создаем новый access токен
-        access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = auth.create_access_token(
-            data={
-                "sub": user.username,
-                "user_id": user.id,
-                "is_admin": user.is_admin,
-                "permissions": permissions_dict
-            },
-            expires_delta=access_token_expires
+        # Выдаем новый refresh токен, старый становится недействительным
+        new_token_id = auth.generate_token_id()
+        db_session = crud_user.rotate_user_session(
+            db,
+            db_session,
+            token_id=new_token_id,
+            expires_at=datetime.utcnow() + timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS)
         )
         
-        # Возвращаем новый токен (без нового refresh токена для простоты)
-        token_data = schemas.Token(
-            access_token=access_token,
-            token_type="bearer",
-            user=schemas.UserResponse(
-                id=user.id,
-                username=user.username,
-                email=user.email,
-                full_name=user.full_name,
-                position=user.position,
-                department=user.department,
-                is_active=user.is_active,
-                is_admin=user.is_admin,
-                created_at=user.created_at,
-                updated_at=user.updated_at
-            )
-        )
-        
-        return token_data
+        return _build_token_response(db, user, db_session, new_token_id)
     except HTTPException:
         raise
     except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Неверный refresh токен",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise invalid_token
 
 
 @router.post("/logout")
-def logout_user(current_user: dict = Depends(get_current_user_auth)):
-    """Выход пользователя из системы"""
-    # В реальной реализации здесь может быть инвалидация токена
+def logout_user(current_user: dict = Depends(get_current_user_auth), db: Session = Depends(database.get_db)):
+    """Выход пользователя из системы (отзыв текущей сессии)"""
+    session_id = current_user.get("session_id")
+    if session_id is not None:
+        crud_user.revoke_user_session(db, session_id)
     return {"message": f"Пользователь {current_user['username']} успешно вышел из системы"}
 
 
@@ -448,4 +462,183 @@ def update_user_permissions(
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
     updated_user = crud_user.update_user_permissions(db, user_id, permissions)
-    return {"message": f"Права доступа пользователя {updated_user.username} обновлены", "user": updated_user}
\ No newline at end of file
+    return {"message": f"Права доступа пользователя {updated_user.username} обновлены", "user": updated_user}
+
+
+@router.get("/sessions", response_model=list[schemas.UserSessionResponse])
+def read_sessions(
+    user_id: Optional[int] = None,
+    active_only: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_user_auth),
+    db: Session = Depends(database.get_db)
+):
+    """Получить список сессий пользователей (только для администраторов)"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для просмотра сессий"
+        )
+    
+    return crud_user.get_user_sessions(db, user_id=user_id, active_only=active_only, skip=skip, limit=limit)
+
+
+@router.delete("/sessions/{session_id}")
+def revoke_session(
+    session_id: int,
+    current_user: dict = Depends(get_current_user_auth),
+    db: Session = Depends(database.get_db)
+):
+    """Отозвать сессию пользователя (только для администраторов)"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для отзыва сессии"
+        )
+    
+    db_session = crud_user.revoke_user_session(db, session_id)
+    if not db_session:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    
+    return {"message": f"Сессия {session_id} отозвана"}
+
+
+@router.post("/users/{user_id}/sessions/revoke")
+def revoke_user_sessions(
+    user_id: int,
+    current_user: dict = Depends(get_current_user_auth),
+    db: Session = Depends(database.get_db)
+):
+    """Отозвать все сессии пользователя (только для администраторов)"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав для отзыва сессий"
+        )
+    
+    user = crud_user.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    
+    revoked_ids = crud_user.revoke_user_sessions_for_user(db, user_id)
+    return {"message": f"Отозвано сессий пользователя {user.username}: {len(revoked_ids)}", "session_ids": revoked_ids}
+
+
+def _role_response(db_role) -> schemas.RoleResponse:
+    """Преобразовать модель роли в схему ответа"""
+    return schemas.RoleResponse(
+        id=db_role.id,
+        name=db_role.name,
+        description=db_role.description,
+        permissions=[item.permission for item in db_role.permissions]
+    )
+
+
+@router.get("/permissions", response_model=list[str])
+def read_permissions(current_user: dict = Depends(get_current_user_auth)):
+    """Получить список всех прав доступа"""
+    return [name.lower() for name in Permission.__members__]
+
+
+@router.get("/me/permissions", response_model=list[str])
+def read_my_permissions(current_user: dict = Depends(get_current_user_auth)):
+    """Получить права текущего пользователя (из токена)"""
+    return permission_names(current_user.get("permission_mask", 0))
+
+
+@router.get("/roles", response_model=list[schemas.RoleResponse])
+def read_roles(
+    skip: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Получить список ролей"""
+    return [_role_response(db_role) for db_role in crud_user.get_roles(db, skip=skip, limit=limit)]
+
+
+@router.post("/roles", response_model=schemas.RoleResponse)
+def create_role(
+    role: schemas.RoleCreate,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Создать роль"""
+    try:
+        db_role = crud_user.create_role(db, role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _role_response(db_role)
+
+
+@router.put("/roles/{role_id}", response_model=schemas.RoleResponse)
+def update_role(
+    role_id: int,
+    role_update: schemas.RoleUpdate,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Обновить роль (новые права вступают в силу при обновлении токена)"""
+    try:
+        db_role = crud_user.update_role(db, role_id, role_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db_role:
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+    return _role_response(db_role)
+
+
+@router.delete("/roles/{role_id}")
+def delete_role(
+    role_id: int,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Удалить роль"""
+    db_role = crud_user.delete_role(db, role_id)
+    if not db_role:
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+    return {"message": f"Роль {db_role.name} удалена"}
+
+
+@router.get("/users/{user_id}/roles", response_model=list[schemas.RoleResponse])
+def read_user_roles(
+    user_id: int,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Получить роли пользователя"""
+    return [_role_response(db_role) for db_role in crud_user.get_user_roles(db, user_id)]
+
+
+@router.post("/users/{user_id}/roles/{role_id}")
+def assign_user_role(
+    user_id: int,
+    role_id: int,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Назначить роль пользователю"""
+    user = crud_user.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    db_role = crud_user.get_role(db, role_id)
+    if not db_role:
+        raise HTTPException(status_code=404, detail="Роль не найдена")
+    
+    crud_user.assign_role_to_user(db, user_id, role_id)
+    return {"message": f"Пользователю {user.username} назначена роль {db_role.name}"}
+
+
+@router.delete("/users/{user_id}/roles/{role_id}")
+def remove_user_role(
+    user_id: int,
+    role_id: int,
+    current_user: dict = Depends(require(Permission.USERS_MANAGE)),
+    db: Session = Depends(database.get_db)
+):
+    """Снять роль с пользователя"""
+    if not crud_user.remove_role_from_user(db, user_id, role_id):
+        raise HTTPException(status_code=404, detail="Назначение роли не найдено")
+    return {"message": "Роль снята с пользователя"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -6,21 +6,29 @@ import os
 import shutil
 from pathlib import Path
 
-from ..database import get_db
-from .. import schemas, crud_construction_remarks, crud
-from ..auth import get_current_user, get_current_active_user
+from ..database import get_db, get_read_db
+from .. import schemas, models, crud_construction_remarks, crud
+from ..permissions import Permission, require
+from ..conditional import (
+    check_if_match, entity_etag, entity_last_modified, is_not_modified, list_validators,
+    not_modified, set_validators, validator_headers
+)
+from ..metrics import record_upload
+from ..profiler import ProfiledRoute
+from ..serialization import list_response
 
 router = APIRouter(
     prefix="/construction-remarks",
     tags=["construction-remarks"],
     responses={404: {"description": "Not found"}},
+    route_class=ProfiledRoute,
 )
 
 
 @router.post("/", response_model=schemas.ConstructionRemark)
 async def create_construction_remark(
     remark: schemas.ConstructionRemarkCreate,
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_WRITE)),
     db: Session = Depends(get_db)
 ):
     """Создать новое замечание от строительного контроля"""
@@ -41,15 +49,59 @@ async def create_construction_remark(
         )
     
     # Создаем замечание
-    remark.created_by = current_user.username
+    remark.created_by = current_user["username"]
     db_remark = crud_construction_remarks.create_construction_remark(db, remark)
     return db_remark
 
 
+# Не больше объектов в одном запросе сводки
+MAX_SUMMARY_OBJECTS = 1000
+
+
+@router.get("/summary", response_model=List[schemas.RemarkSummary])
+async def get_remarks_summaries(
+    project_object_ids: List[int] = Query(..., description="ID объектов проекта (параметр повторяется)"),
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
+):
+    """Сводки по замечаниям нескольких объектов проекта (счетчики remark_counters)"""
+    if len(project_object_ids) > MAX_SUMMARY_OBJECTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {MAX_SUMMARY_OBJECTS} объектов в одном запросе"
+        )
+    return crud_construction_remarks.get_remarks_summaries(db, project_object_ids)
+
+
+@router.get("/overdue", response_model=List[schemas.OverdueRemark])
+async def get_overdue_remarks(
+    skip: int = 0,
+    limit: int = 100,
+    project_object_id: Optional[int] = None,
+    assigned_to: Optional[str] = None,
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
+):
+    """Получить просроченные замечания постранично, сначала просроченные сильнее всего"""
+    now = datetime.utcnow()
+    remarks = crud_construction_remarks.get_overdue_remarks(
+        db, skip=skip, limit=limit, project_object_id=project_object_id, assigned_to=assigned_to, now=now
+    )
+    return [
+        schemas.OverdueRemark(
+            **schemas.ConstructionRemark.model_validate(remark).model_dump(),
+            overdue_days=crud_construction_remarks.overdue_days(remark, now)
+        )
+        for remark in remarks
+    ]
+
+
 @router.get("/{remark_id}", response_model=schemas.ConstructionRemarkWithDetails)
 async def get_construction_remark(
     remark_id: int,
-    current_user=Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    current_user=Depends(require(Permission.REMARKS_READ)),
     db: Session = Depends(get_db)
 ):
     """Получить замечание по ID с деталями"""
@@ -63,6 +115,12 @@ async def get_construction_remark(
     # Добавляем фотографии и историю к замечанию
     remark.photos = crud_construction_remarks.get_remark_photos(db, remark_id)
     remark.history = crud_construction_remarks.get_remark_history(db, remark_id)
+
+    etag = entity_etag(remark, remark.photos, remark.history)
+    last_modified = entity_last_modified(remark)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    set_validators(response, etag, last_modified)
     return remark
 
 
@@ -70,10 +128,13 @@ async def get_construction_remark(
 async def update_construction_remark(
     remark_id: int,
     remark_update: schemas.ConstructionRemarkUpdate,
-    current_user=Depends(get_current_active_user),
+    request: Request,
+    response: Response,
+    current_user=Depends(require(Permission.REMARKS_WRITE)),
     db: Session = Depends(get_db)
 ):
-    """Обновить замечание"""
+    """Обновить замечание (If-Match - защита от одновременного изменения)"""
+    check_if_match(request, db, models.ConstructionRemark, remark_id)
     db_remark = crud_construction_remarks.get_construction_remark(db, remark_id)
     if not db_remark:
         raise HTTPException(
@@ -83,13 +144,14 @@ async def update_construction_remark(
     
     # Обновляем замечание
     updated_remark = crud_construction_remarks.update_construction_remark(db, remark_id, remark_update)
+    set_validators(response, entity_etag(updated_remark), entity_last_modified(updated_remark))
     return updated_remark
 
 
 @router.delete("/{remark_id}")
 async def delete_construction_remark(
     remark_id: int,
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_DELETE)),
     db: Session = Depends(get_db)
 ):
     """Удалить замечание"""
@@ -100,37 +162,38 @@ async def delete_construction_remark(
             detail="Замечание не найдено"
         )
     
-    # Проверяем права (например, только администраторы могут удалять)
-    if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Недостаточно прав для удаления замечания"
-        )
-    
     crud_construction_remarks.delete_construction_remark(db, remark_id)
     return {"message": "Замечание успешно удалено"}
 
 
 @router.get("/", response_model=List[schemas.ConstructionRemark])
 async def get_construction_remarks(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     project_object_id: Optional[int] = None,
     status: Optional[schemas.RemarkStatus] = None,
     priority: Optional[str] = None,
     assigned_to: Optional[str] = None,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
-    """Получить список замечаний с фильтрами"""
-    remarks = crud_construction_remarks.get_construction_remarks(
-        db, skip=skip, limit=limit,
+    """Получить список замечаний с фильтрами (ETag, If-None-Match)"""
+    query = crud_construction_remarks.construction_remarks_query(
+        db,
         project_object_id=project_object_id,
         status=status,
         priority=priority,
         assigned_to=assigned_to
     )
-    return remarks
+    etag, last_modified = list_validators(query, models.ConstructionRemark, f"{skip}:{limit}")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+
+    return list_response(
+        query.offset(skip).limit(limit), schemas.ConstructionRemark,
+        headers=validator_headers(etag, last_modified)
+    )
 
 
 @router.get("/search", response_model=List[schemas.ConstructionRemark])
@@ -139,8 +202,8 @@ async def search_construction_remarks(
     project_object_id: Optional[int] = None,
     status: Optional[schemas.RemarkStatus] = None,
     priority: Optional[str] = None,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
     """Поиск замечаний по различным критериям"""
     remarks = crud_construction_remarks.search_construction_remarks(
@@ -158,8 +221,8 @@ async def get_remarks_by_project_object(
     project_object_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
     """Получить все замечания для конкретного объекта проекта"""
     # Проверяем, существует ли объект проекта
@@ -177,8 +240,8 @@ async def get_remarks_by_project_object(
 @router.get("/project-object/{project_object_id}/summary")
 async def get_remarks_summary_by_project_object(
     project_object_id: int,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
     """Получить сводку по замечаниям для объекта проекта"""
     # Проверяем, существует ли объект проекта
@@ -198,31 +261,21 @@ async def get_remarks_by_status(
     status: schemas.RemarkStatus,
     skip: int = 0,
     limit: int = 100,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
     """Получить все замечания с определенным статусом"""
     remarks = crud_construction_remarks.get_remarks_by_status(db, status)
     return remarks
 
 
-@router.get("/overdue", response_model=List[schemas.ConstructionRemark])
-async def get_overdue_remarks(
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """Получить все просроченные замечания"""
-    remarks = crud_construction_remarks.get_overdue_remarks(db)
-    return remarks
-
-
 # Маршруты для фотографий к замечаниям
 @router.post("/{remark_id}/photos", response_model=schemas.RemarkPhoto)
 async def upload_remark_photo(
     remark_id: int,
     file: UploadFile = File(...),
     description: Optional[str] = Form(None),
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_WRITE)),
     db: Session = Depends(get_db)
 ):
     """Загрузить фотографию к замечанию"""
@@ -254,13 +307,14 @@ async def upload_remark_photo(
         filename=filename,
         file_size=file.file.tell(),  # Размер файла
         description=description,
-        created_by=current_user.username
+        created_by=current_user["username"]
     )
     
     # Сбрасываем указатель файла, чтобы получить правильный размер
     file.file.seek(0)
     photo_create.file_size = len(file.file.read())
     file.file.seek(0)
+    record_upload("remark_photo", photo_create.file_size)
     
     db_photo = crud_construction_remarks.create_remark_photo(db, photo_create)
     return db_photo
@@ -269,7 +323,7 @@ async def upload_remark_photo(
 @router.get("/{remark_id}/photos", response_model=List[schemas.RemarkPhoto])
 async def get_remark_photos(
     remark_id: int,
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_READ)),
     db: Session = Depends(get_db)
 ):
     """Получить все фотографии для замечания"""
@@ -289,7 +343,7 @@ async def get_remark_photos(
 async def update_remark_photo(
     photo_id: int,
     photo_update: schemas.RemarkPhotoUpdate,
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_WRITE)),
     db: Session = Depends(get_db)
 ):
     """Обновить описание фотографии"""
@@ -307,7 +361,7 @@ async def update_remark_photo(
 @router.delete("/photos/{photo_id}")
 async def delete_remark_photo(
     photo_id: int,
-    current_user=Depends(get_current_active_user),
+    current_user=Depends(require(Permission.REMARKS_DELETE)),
     db: Session = Depends(get_db)
 ):
     """Удалить фотографию из замечания"""
@@ -318,13 +372,6 @@ async def delete_remark_photo(
             detail="Фотография не найдена"
         )
     
-    # Проверяем права (например, только администраторы могут удалять)
-    if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Недостаточно прав для удаления фотографии"
-        )
-    
     # Удаляем файл с диска
     if os.path.exists(db_photo.file_path):
         os.remove(db_photo.file_path)
@@ -337,8 +384,8 @@ async def delete_remark_photo(
 @router.get("/{remark_id}/history", response_model=List[schemas.RemarkHistory])
 async def get_remark_history(
     remark_id: int,
-    current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user=Depends(require(Permission.REMARKS_READ)),
+    db: Session = Depends(get_read_db)
 ):
     """Получить историю изменений статуса замечания"""
     # Проверяем, существует ли замечание
@@ -1,39 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session, selectinload
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import json
 
-from .. import crud, models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from .. import cache, crud, crud_document_analytics, models, schemas
+from ..cache import cached_response
+from ..conditional import (
+    check_if_match, entity_etag, entity_last_modified, is_not_modified, list_validators,
+    not_modified, set_validators, validator_headers
+)
+from ..database import get_db, get_read_db
+from ..permissions import Permission, require
+from ..profiler import ProfiledRoute
+from ..serialization import list_response
 
 router = APIRouter(
     prefix="/api/documents",
     tags=["documents"],
     responses={404: {"description": "Not found"}},
+    route_class=ProfiledRoute,
 )
 
 
 @router.get("/types", response_model=List[schemas.DocumentType])
 def get_document_types(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
-    Получить список типов документов
+    Получить список типов документов (кэшируется, поддерживает If-None-Match)
     """
-    types = crud.get_document_types(db, skip=skip, limit=limit)
-    return types
+    return cached_response(
+        request, cache.DOCUMENT_TYPES, f"list:{skip}:{limit}", List[schemas.DocumentType],
+        lambda: crud.get_document_types(db, skip=skip, limit=limit)
+    )
 
 
 @router.post("/types", response_model=schemas.DocumentType)
 def create_document_type(
     doc_type: schemas.DocumentTypeCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
     Создать новый тип документа
@@ -46,7 +57,7 @@ def create_document_type(
 def get_document_type(
     document_type_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
     Получить тип документа по ID
@@ -62,7 +73,7 @@ def update_document_type(
     document_type_id: int,
     doc_type: schemas.DocumentTypeUpdate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
     Обновить тип документа
@@ -77,7 +88,7 @@ def update_document_type(
 def delete_document_type(
     document_type_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_DELETE))
 ):
     """
     Удалить тип документа
@@ -97,21 +108,20 @@ def delete_document_type(
 
 @router.get("/", response_model=List[schemas.Document])
 def get_documents(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     project_id: str = None,
     status: str = None,
     doc_number: str = None,
     title: str = None,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
-    Получить список документов с возможностью фильтрации
+    Получить список документов с возможностью фильтрации (ETag, If-None-Match)
     """
-    # Используем CRUD функцию с eager loading для избежания N+1 проблемы
-    query = db.query(models.Document)\
-        .options(selectinload(models.Document.type))
+    query = db.query(models.Document)
     
     if project_id:
         query = query.filter(models.Document.project_id == project_id)
@@ -121,29 +131,37 @@ def get_documents(
         query = query.filter(models.Document.doc_number.contains(doc_number))
     if title:
         query = query.filter(models.Document.title.contains(title))
-        
-    documents = query.offset(skip).limit(limit).all()
-    return documents
+
+    etag, last_modified = list_validators(query, models.Document, f"{skip}:{limit}")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+
+    return list_response(
+        query.offset(skip).limit(limit), schemas.Document,
+        headers=validator_headers(etag, last_modified)
+    )
 
 
 @router.post("/", response_model=schemas.Document)
 def create_document(
     document: schemas.DocumentCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
     Создать новый документ
     """
-    db_document = crud.create_document(db, document)
+    db_document = crud.create_document(db, document, changed_by=current_user["username"])
     return db_document
 
 
 @router.get("/{document_id}", response_model=schemas.DocumentDetailed)
 def get_document(
     document_id: int,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
     Получить документ по ID с подробной информацией
@@ -157,6 +175,12 @@ def get_document(
         
     if not document:
         raise HTTPException(status_code=404, detail="Документ не найден")
+
+    etag = entity_etag(document, document.shipments, document.returns)
+    last_modified = entity_last_modified(document)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    set_validators(response, etag, last_modified)
     return document
 
 
@@ -164,15 +188,20 @@ def get_document(
 def update_document(
     document_id: int,
     document: schemas.DocumentUpdate,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
-    Обновить документ
+    Обновить документ. С заголовком If-Match изменение выполняется, только
+    если документ не менялся с момента получения (иначе 412)
     """
+    check_if_match(request, db, models.Document, document_id)
     db_document = crud.update_document(db, document_id, document)
     if not db_document:
         raise HTTPException(status_code=404, detail="Документ не найден")
+    set_validators(response, entity_etag(db_document), entity_last_modified(db_document))
     return db_document
 
 
@@ -180,7 +209,7 @@ def update_document(
 def delete_document(
     document_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_DELETE))
 ):
     """
     Удалить документ
@@ -200,11 +229,95 @@ def delete_document(
     return {"message": "Документ успешно удален"}
 
 
+@router.post("/shipments/bulk", response_model=schemas.DocumentBulkResult)
+def create_document_shipments_bulk(
+    bulk: schemas.DocumentShipmentBulkCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
+):
+    """
+    Отправить пакет документов одному получателю (до 500 документов).
+
+    Документы, которые нельзя отправить (не найдены или уже отправлены),
+    пропускаются; результат содержит исход по каждому документу.
+    """
+    return crud.create_document_shipments_bulk(db, bulk, changed_by=current_user["username"])
+
+
+@router.post("/returns/bulk", response_model=schemas.DocumentBulkResult)
+def create_document_returns_bulk(
+    bulk: schemas.DocumentReturnBulkCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
+):
+    """
+    Зафиксировать возврат пакета документов (до 500 документов).
+
+    Документы, которые не были отправлены, пропускаются; результат содержит
+    исход по каждому документу.
+    """
+    return crud.create_document_returns_bulk(db, bulk, changed_by=current_user["username"])
+
+
+@router.get("/analytics/turnaround", response_model=List[schemas.RecipientTurnaround])
+def get_turnaround_by_recipient(
+    project_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_open: bool = True,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
+):
+    """
+    Сколько документы находятся у получателей: медиана, перцентили и максимум
+    срока от отправки до возврата по каждому получателю (в днях).
+
+    Отправки с date_from (включительно) до date_to; include_open - учитывать
+    невозвращенные документы (срок до текущего момента).
+    """
+    return crud_document_analytics.get_turnaround_by_recipient(
+        db, project_id=project_id, date_from=date_from, date_to=date_to, include_open=include_open
+    )
+
+
+@router.get("/analytics/status-durations", response_model=List[schemas.StatusDuration])
+def get_status_durations(
+    project_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_open: bool = True,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
+):
+    """
+    Сколько документы находятся в каждом статусе (в днях)
+    """
+    return crud_document_analytics.get_status_durations(
+        db, project_id=project_id, date_from=date_from, date_to=date_to, include_open=include_open
+    )
+
+
+@router.get("/{document_id}/history", response_model=List[schemas.DocumentStatusHistory])
+def get_document_status_history(
+    document_id: int,
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
+):
+    """
+    Получить историю статусов документа
+    """
+    document = crud.get_document(db, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Документ не найден")
+
+    return crud.get_document_status_history(db, document_id)
+
+
 @router.get("/{document_id}/shipments", response_model=List[schemas.DocumentShipment])
 def get_document_shipments(
     document_id: int,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
     Получить список отправок для документа
@@ -222,7 +335,7 @@ def create_document_shipment(
     document_id: int,
     shipment: schemas.DocumentShipmentCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
     Создать новую отправку документа
@@ -233,10 +346,9 @@ def create_document_shipment(
         raise HTTPException(status_code=404, detail="Документ не найден")
     
     # Проверим, что документ еще не отправлен
-    if document.status == "shipped":
-        raise HTTPException(status_code=400, detail="Документ уже отправлен")
-    elif document.status == "returned":
-        raise HTTPException(status_code=400, detail="Документ уже был возвратом и не может быть отправлен снова")
+    denied = crud.shipment_denied_reason(document)
+    if denied:
+        raise HTTPException(status_code=400, detail=denied)
     
     # Создадим отправку
     shipment_data = schemas.DocumentShipmentCreate(
@@ -246,15 +358,15 @@ def create_document_shipment(
         notes=shipment.notes
     )
     
-    db_shipment = crud.create_document_shipment(db, shipment_data)
+    db_shipment = crud.create_document_shipment(db, shipment_data, changed_by=current_user["username"])
     return db_shipment
 
 
 @router.get("/{document_id}/returns", response_model=List[schemas.DocumentReturn])
 def get_document_returns(
     document_id: int,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
     Получить список возвратов для документа
@@ -272,7 +384,7 @@ def create_document_return(
     document_id: int,
     return_obj: schemas.DocumentReturnCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.DOCUMENTS_WRITE))
 ):
     """
     Создать новый возврат документа
@@ -283,8 +395,9 @@ def create_document_return(
         raise HTTPException(status_code=404, detail="Документ не найден")
     
     # Проверим, что документ был отправлен
-    if document.status != "shipped":
-        raise HTTPException(status_code=400, detail="Документ не был отправлен и не может быть возвращен")
+    denied = crud.return_denied_reason(document)
+    if denied:
+        raise HTTPException(status_code=400, detail=denied)
     
     # Создадим возврат
     return_data = schemas.DocumentReturnCreate(
@@ -294,7 +407,7 @@ def create_document_return(
         notes=return_obj.notes
     )
     
-    db_return = crud.create_document_return(db, return_data)
+    db_return = crud.create_document_return(db, return_data, changed_by=current_user["username"])
     return db_return
 
 
@@ -303,8 +416,8 @@ def search_documents(
     query: str = None,
     project_id: str = None,
     status: str = None,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.DOCUMENTS_READ))
 ):
     """
     Поиск документов по различным критериям
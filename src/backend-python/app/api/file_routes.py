@@ -1,40 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File, Form
 from sqlalchemy.orm import Session, selectinload
 from typing import List
 import os
 from datetime import datetime
 import shutil
 
-from .. import crud, models, schemas
+from .. import cache, crud, models, schemas
+from ..cache import cached_response
+from ..conditional import (
+    check_if_match, entity_etag, entity_last_modified, is_not_modified, list_validators,
+    not_modified, set_validators, validator_headers
+)
 from ..database import get_db
-from ..auth import get_current_user
+from ..permissions import Permission, require
+from ..metrics import record_upload
+from ..profiler import ProfiledRoute
+from ..serialization import list_response
 
 router = APIRouter(
     prefix="/api/files",
     tags=["files"],
     responses={404: {"description": "Not found"}},
+    route_class=ProfiledRoute,
 )
 
 
 @router.get("/categories", response_model=List[schemas.FileCategory])
 def get_file_categories(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
-    Получить список категорий файлов
+    Получить список категорий файлов (кэшируется, поддерживает If-None-Match)
     """
-    categories = crud.get_file_categories(db, skip=skip, limit=limit)
-    return categories
+    return cached_response(
+        request, cache.FILE_CATEGORIES, f"list:{skip}:{limit}", List[schemas.FileCategory],
+        lambda: crud.get_file_categories(db, skip=skip, limit=limit)
+    )
 
 
 @router.post("/categories", response_model=schemas.FileCategory)
 def create_file_category(
     category: schemas.FileCategoryCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_WRITE))
 ):
     """
     Создать новую категорию файлов
@@ -47,7 +59,7 @@ def create_file_category(
 def get_file_category(
     category_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить категорию файлов по ID
@@ -63,7 +75,7 @@ def update_file_category(
     category_id: int,
     category: schemas.FileCategoryUpdate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_WRITE))
 ):
     """
     Обновить категорию файлов
@@ -78,7 +90,7 @@ def update_file_category(
 def delete_file_category(
     category_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_DELETE))
 ):
     """
     Удалить категорию файлов
@@ -98,26 +110,32 @@ def delete_file_category(
 
 @router.get("/", response_model=List[schemas.UploadedFile])
 def get_uploaded_files(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     section_id: str = None,
     project_id: str = None,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
-    Получить список загруженных файлов с возможностью фильтрации
+    Получить список загруженных файлов с возможностью фильтрации (ETag, If-None-Match)
     """
-    query = db.query(models.UploadedFile)\
-        .options(selectinload(models.UploadedFile.category))
+    query = db.query(models.UploadedFile)
     
     if section_id:
         query = query.filter(models.UploadedFile.section_id == section_id)
     if project_id:
         query = query.filter(models.UploadedFile.project_id == project_id)
-        
-    files = query.offset(skip).limit(limit).all()
-    return files
+
+    etag, last_modified = list_validators(query, models.UploadedFile, f"{skip}:{limit}")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+
+    return list_response(
+        query.offset(skip).limit(limit), schemas.UploadedFile,
+        headers=validator_headers(etag, last_modified)
+    )
 
 
 @router.post("/", response_model=schemas.UploadedFile)
@@ -129,7 +147,7 @@ def upload_file(
     project_id: str = Form(None),
     description: str = Form(None),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_WRITE))
 ):
     """
     Загрузить новый файл
@@ -153,6 +171,7 @@ def upload_file(
     # Сохраняем файл
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    record_upload("file", file_size)
     
     # Создаем запись о файле в базе данных
     file_create = schemas.UploadedFileCreate(
@@ -176,8 +195,10 @@ def upload_file(
 @router.get("/{file_id}", response_model=schemas.UploadedFile)
 def get_uploaded_file(
     file_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить информацию о загруженном файле по ID
@@ -185,6 +206,11 @@ def get_uploaded_file(
     file = crud.get_uploaded_file(db, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="Файл не найден")
+
+    etag, last_modified = entity_etag(file), entity_last_modified(file)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    set_validators(response, etag, last_modified)
     return file
 
 
@@ -192,15 +218,19 @@ def get_uploaded_file(
 def update_uploaded_file(
     file_id: int,
     file_update: schemas.UploadedFileUpdate,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_WRITE))
 ):
     """
-    Обновить информацию о загруженном файле
+    Обновить информацию о загруженном файле (If-Match - защита от одновременного изменения)
     """
+    check_if_match(request, db, models.UploadedFile, file_id)
     db_file = crud.update_uploaded_file(db, file_id, file_update)
     if not db_file:
         raise HTTPException(status_code=404, detail="Файл не найден")
+    set_validators(response, entity_etag(db_file), entity_last_modified(db_file))
     return db_file
 
 
@@ -208,7 +238,7 @@ def update_uploaded_file(
 def delete_uploaded_file(
     file_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_DELETE))
 ):
     """
     Удалить загруженный файл
@@ -229,7 +259,7 @@ def delete_uploaded_file(
 def download_file(
     file_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Скачать файл
@@ -253,7 +283,7 @@ def get_material_requests(
     section_id: str = None,
     project_id: str = None,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить список запросов на материалы
@@ -276,7 +306,7 @@ def get_material_requests(
 def create_material_request(
     request: schemas.MaterialRequestCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_WRITE))
 ):
     """
     Создать новый запрос на материалы
@@ -302,7 +332,7 @@ def create_material_request(
 def get_material_request(
     request_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить запрос на материалы по ID
@@ -318,7 +348,7 @@ def update_material_request(
     request_id: int,
     request_update: schemas.MaterialRequestUpdate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.MATERIALS_MANAGE))
 ):
     """
     Обновить запрос на материалы
@@ -342,7 +372,7 @@ def get_material_stocks(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить список остатков материалов
@@ -355,7 +385,7 @@ def get_material_stocks(
 def get_material_stock(
     stock_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить остаток материала по ID
@@ -370,7 +400,7 @@ def get_material_stock(
 def get_material_stock_by_material(
     material_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить остаток материала по ID материала
@@ -385,7 +415,7 @@ def get_material_stock_by_material(
 def create_material_stock(
     stock: schemas.MaterialStockCreate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.MATERIALS_MANAGE))
 ):
     """
     Создать новую запись об остатке материала
@@ -399,7 +429,7 @@ def update_material_stock(
     stock_id: int,
     stock_update: schemas.MaterialStockUpdate,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.MATERIALS_MANAGE))
 ):
     """
     Обновить остаток материала
@@ -413,7 +443,7 @@ def update_material_stock(
 @router.get("/low-stock-materials")
 def get_low_stock_materials(
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Получить список материалов с низким уровнем запасов
@@ -426,7 +456,7 @@ def get_low_stock_materials(
 def check_material_threshold(
     material_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.FILES_READ))
 ):
     """
     Проверить, достигнут ли минимальный порог для материала
@@ -1,33 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime, timedelta
 import json
 
-from .. import crud, models, schemas
-from ..database import get_db
-from ..auth import get_current_user
-from ..utils.material_checker import check_materials_for_work, reserve_materials_for_gpr_work, update_material_usage, initialize_material_stocks
+from .. import cache, crud, models, schemas, events
+from ..cache import cached_response
+from ..conditional import (
+    check_if_match, entity_etag, entity_last_modified, is_not_modified, list_validators,
+    not_modified, set_validators, validator_headers
+)
+from ..database import get_db, get_read_db
+from ..permissions import Permission, require
+from ..utils.material_checker import check_materials_for_work, enqueue_material_check, reserve_materials_for_gpr_work, update_material_usage, initialize_material_stocks
+from ..profiler import ProfiledRoute
+from ..serialization import list_response, loads_json_field
 
 router = APIRouter(
     prefix="/api/gpr",
     tags=["gpr"],
     responses={404: {"description": "Not found"}},
+    route_class=ProfiledRoute,
 )
 
 
+def _publish_gpr_event(db: Session, db_record: models.GPRRecord, event: str):
+    """Уведомить подписчиков записи ГПР об изменении (после фиксации транзакции)"""
+    events.publish_on_commit(db, events.gpr_topic(db_record.id), event, {
+        "id": db_record.id,
+        "customer_id": db_record.customer_id,
+        "object_id": db_record.object_id,
+        "work_type": db_record.work_type,
+        "volume_plan": db_record.volume_plan,
+        "volume_fact": db_record.volume_fact,
+        "volume_remainder": db_record.volume_remainder,
+        "progress": db_record.progress,
+    })
+
+
 @router.get("/records", response_model=List[schemas.GPRRecord])
 def get_gpr_records(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.GPR_READ))
 ):
     """
-    Получить список записей ГПР
+    Получить список записей ГПР (ETag, If-None-Match)
     """
-    records = crud.get_gpr_records(db, skip=skip, limit=limit)
-    return records
+    query = db.query(models.GPRRecord)
+    etag, last_modified = list_validators(query, models.GPRRecord, f"{skip}:{limit}")
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    return list_response(
+        query.offset(skip).limit(limit), schemas.GPRRecord,
+        headers=validator_headers(etag, last_modified),
+        converters={"daily_data": loads_json_field}
+    )
 
 
 @router.post("/records", response_model=schemas.GPRRecord)
@@ -35,7 +65,7 @@ def create_gpr_record(
     record: schemas.GPRRecordCreate,
     check_materials: bool = True,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_WRITE))
 ):
     """
     Создать новую запись ГПР
@@ -57,14 +87,12 @@ def create_gpr_record(
         daily_data=json.dumps(record.daily_data) if record.daily_data else "{}"
     )
     db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
+    db.flush()
+    _publish_gpr_event(db, db_record, "gpr.created")
     
-    # Проверяем наличие материалов для выполнения работ
+    # Проверка материалов и запросы на закупку выполняются в фоне после COMMIT
     if check_materials:
-        material_check_result = check_materials_for_work(db, db_record.id)
-        if material_check_result.get("needs_order"):
-            print(f"Предупреждение: для выполнения работ по записи {db_record.id} необходимо заказать материалы")
+        enqueue_material_check(db, db_record.id)
     
     return db_record
 
@@ -73,12 +101,15 @@ def create_gpr_record(
 def update_gpr_record(
     record_id: int,
     record: schemas.GPRRecordUpdate,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_WRITE))
 ):
     """
-    Обновить запись ГПР
+    Обновить запись ГПР (If-Match - защита от одновременного изменения)
     """
+    check_if_match(request, db, models.GPRRecord, record_id)
     db_record = crud.get_gpr_record(db, record_id=record_id)
     if not db_record:
         raise HTTPException(status_code=404, detail="Запись ГПР не найдена")
@@ -99,11 +130,9 @@ def update_gpr_record(
         update_data['volume_remainder'] = volume_remainder
         update_data['progress'] = progress
         
-        # Если увеличивается объем работ, проверяем наличие материалов
+        # Если увеличивается объем работ, проверяем наличие материалов (в фоне)
         if 'volume_plan' in update_data and volume_plan > db_record.volume_plan:
-            material_check_result = check_materials_for_work(db, record_id)
-            if material_check_result.get("needs_order"):
-                print(f"Предупреждение: для выполнения увеличенного объема работ по записи {record_id} необходимо заказать материалы")
+            enqueue_material_check(db, record_id)
     
     # Если обновляются ежедневные данные, преобразуем в JSON
     if 'daily_data' in update_data:
@@ -112,8 +141,9 @@ def update_gpr_record(
     for field, value in update_data.items():
         setattr(db_record, field, value)
     
-    db.commit()
-    db.refresh(db_record)
+    db.flush()
+    _publish_gpr_event(db, db_record, "gpr.updated")
+    set_validators(response, entity_etag(db_record), entity_last_modified(db_record))
     return db_record
 
 
@@ -121,7 +151,7 @@ def update_gpr_record(
 def delete_gpr_record(
     record_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_DELETE))
 ):
     """
     Удалить запись ГПР
@@ -131,7 +161,8 @@ def delete_gpr_record(
         raise HTTPException(status_code=404, detail="Запись ГПР не найдена")
     
     db.delete(record)
-    db.commit()
+    db.flush()
+    _publish_gpr_event(db, record, "gpr.deleted")
     return {"message": "Запись ГПР успешно удалена"}
 
 
@@ -139,7 +170,7 @@ def delete_gpr_record(
 def check_materials_for_gpr_record(
     record_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_READ))
 ):
     """
     Проверить наличие материалов для выполнения работ по ГПР записи
@@ -152,7 +183,7 @@ def check_materials_for_gpr_record(
 def reserve_materials_for_gpr_record(
     record_id: int,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.MATERIALS_MANAGE))
 ):
     """
     Зарезервировать материалы для выполнения работ по ГПР записи
@@ -169,7 +200,7 @@ def update_gpr_fact(
     record_id: int,
     volume_fact: float,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_WRITE))
 ):
     """
     Обновить фактический объем выполненных работ и использовать материалы
@@ -191,8 +222,8 @@ def update_gpr_fact(
     if db_record.volume_plan > 0:
         db_record.progress = round((db_record.volume_fact / db_record.volume_plan) * 100, 2)
     
-    db.commit()
-    db.refresh(db_record)
+    db.flush()
+    _publish_gpr_event(db, db_record, "gpr.updated")
     
     # Обновляем использование материалов
     if volume_diff > 0:
@@ -206,7 +237,7 @@ def generate_weekly_report(
     week_start_date: str,
     created_by: str,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user = Depends(require(Permission.GPR_WRITE))
 ):
     """
     Сгенерировать недельный отчет
@@ -244,7 +275,7 @@ def generate_weekly_report(
         created_by=created_by
     )
     db.add(weekly_report)
-    db.commit()
+    db.flush()
     
     return {
         "week_start_date": week_start,
@@ -256,8 +287,8 @@ def generate_weekly_report(
 @router.get("/weekly-report/{week_start_date}")
 def get_weekly_report(
     week_start_date: str,
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user = Depends(require(Permission.GPR_READ))
 ):
     """
     Получить недельный отчет за определенную неделю
@@ -276,4 +307,56 @@ def get_weekly_report(
         "week_start_date": report.week_start_date,
         "report_data": json.loads(report.report_data),
         "created_by": report.created_by
-    }
\ No newline at end of file
+    }
+
+
+# Справочники для форм клиента (кэшируются, поддерживают If-None-Match)
+@router.get("/materials", response_model=List[schemas.Material])
+def get_materials(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user = Depends(require(Permission.GPR_READ))
+):
+    """
+    Получить список материалов
+    """
+    return cached_response(
+        request, cache.MATERIALS, f"list:{skip}:{limit}", List[schemas.Material],
+        lambda: crud.get_materials(db, skip=skip, limit=limit)
+    )
+
+
+@router.get("/customers", response_model=List[schemas.Customer])
+def get_customers(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user = Depends(require(Permission.GPR_READ))
+):
+    """
+    Получить список заказчиков
+    """
+    return cached_response(
+        request, cache.CUSTOMERS, f"list:{skip}:{limit}", List[schemas.Customer],
+        lambda: crud.get_customers(db, skip=skip, limit=limit)
+    )
+
+
+@router.get("/objects", response_model=List[schemas.ProjectObject])
+def get_project_objects(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user = Depends(require(Permission.GPR_READ))
+):
+    """
+    Получить список объектов проекта
+    """
+    return cached_response(
+        request, cache.PROJECT_OBJECTS, f"list:{skip}:{limit}", List[schemas.ProjectObject],
+        lambda: crud.get_project_objects(db, skip=skip, limit=limit)
+    )
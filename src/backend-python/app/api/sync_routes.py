@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from .. import crud_sync, schemas
+from ..auth import get_current_user
+from ..database import get_read_db
+from ..profiler import ProfiledRoute
+
+router = APIRouter(prefix="/api/sync", tags=["sync"], route_class=ProfiledRoute)
+
+
+@router.get("", response_model=schemas.SyncResponse)
+def sync_changes(
+    since: Optional[str] = None,
+    limit: int = Query(crud_sync.SYNC_PAGE_SIZE, ge=1, le=crud_sync.SYNC_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Изменения документов, отправок, возвратов, замечаний, фотографий,
+    записей ГПР и остатков после токена since.
+
+    Без since возвращается текущий токен и full_resync=true: клиент
+    сохраняет токен, загружает списки полностью и дальше запрашивает
+    только изменения. При has_more=true запрос повторяется с новым токеном.
+    Ответ 410 - журнал за этот период удален, нужна полная загрузка.
+    """
+    entities = crud_sync.allowed_entities(current_user.get("permission_mask", 0))
+
+    if since is None:
+        token = crud_sync.get_current_token(db)
+        return {"token": str(token), "full_resync": True}
+
+    try:
+        since_id = int(since)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный токен синхронизации")
+
+    try:
+        token, has_more, changes = crud_sync.get_changes(db, since_id, entities, limit=limit)
+    except crud_sync.SyncTokenExpired:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Токен синхронизации устарел, требуется полная загрузка"
+        )
+    return {"token": str(token), "has_more": has_more, "changes": changes}
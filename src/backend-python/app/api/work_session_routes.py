@@ -5,10 +5,11 @@ from datetime import date
 
 from .. import crud_work_session, schemas
 from ..auth import get_current_user, get_current_active_user
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..crud_user import get_user
+from ..profiler import ProfiledRoute
 
-router = APIRouter(prefix="/work-sessions", tags=["work-sessions"])
+router = APIRouter(prefix="/work-sessions", tags=["work-sessions"], route_class=ProfiledRoute)
 
 
 @router.post("/start", response_model=schemas.WorkSessionResponse)
@@ -92,7 +93,7 @@ def get_my_work_sessions(
 @router.get("/employees", response_model=List[schemas.EmployeeWithWorkInfo])
 def get_all_employees_with_work_info(
     current_user: schemas.UserResponse = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получить информацию о всех сотрудниках с данными о работе
@@ -3,9 +3,16 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
 import os
 import json
+import threading
+import uuid
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from .metrics import timed_bcrypt
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -21,11 +28,13 @@ security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    with timed_bcrypt("verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Generate hash from password"""
-    return pwd_context.hash(password)
+    with timed_bcrypt("hash"):
+        return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -48,10 +57,93 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
+    to_encode.setdefault("jti", generate_token_id())
     to_encode.update({"exp": expire, "token_type": "refresh"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+
+def generate_token_id() -> str:
+    """Generate unique identifier (jti) for refresh token"""
+    return uuid.uuid4().hex
+
+
+class RevokedSessionStore:
+    """
+    In-memory set of revoked session IDs.
+
+    Loaded from user_sessions at startup and updated on logout or user
+    deactivation, so access token checks need no database query. Every
+    process keeps its own copy; revocations are relayed to the other
+    workers over the events backplane (app.events).
+    """
+
+    def __init__(self):
+        # session_id -> session expiry (the entry is useless afterwards)
+        self._revoked: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._relay: Optional[Callable[[str, Any, str], None]] = None
+
+    def set_relay(self, relay: Optional[Callable[[str, Any, str], None]]):
+        """Function that passes revocations to the other processes (app.events)"""
+        self._relay = relay
+
+    def load(self, sessions: Iterable[Tuple[int, datetime]]):
+        """Replace store contents with (session_id, expires_at) pairs"""
+        with self._lock:
+            self._revoked = {session_id: expires_at for session_id, expires_at in sessions}
+
+    def add(self, session_id: int, expires_at: Optional[datetime] = None, relay: bool = True):
+        """Mark session as revoked"""
+        if expires_at is None:
+            expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        with self._lock:
+            self._revoked[session_id] = expires_at
+            self._prune()
+        if relay and self._relay is not None:
+            self._relay("revoke", session_id, expires_at.isoformat())
+
+    def is_revoked(self, session_id: Optional[int]) -> bool:
+        """Check whether session is revoked"""
+        if session_id is None:
+            return False
+        return session_id in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def _prune(self):
+        """Drop entries for sessions that have already expired"""
+        now = datetime.utcnow()
+        expired = [sid for sid, expires_at in self._revoked.items() if expires_at < now]
+        for sid in expired:
+            del self._revoked[sid]
+
+
+# Global revoked session store
+revoked_sessions = RevokedSessionStore()
+
+
+def revoke_on_commit(db: Session, session_id: int, expires_at: Optional[datetime] = None):
+    """
+    Add session to revoked_sessions once the transaction of db commits.
+
+    CRUD functions only flush, so the in-memory store must not get ahead
+    of the database: a rolled back revocation is discarded.
+    """
+    db.info.setdefault("pending_revocations", []).append((session_id, expires_at))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _apply_pending_revocations(session):
+    for session_id, expires_at in session.info.pop("pending_revocations", []):
+        revoked_sessions.add(session_id, expires_at)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_revocations(session):
+    session.info.pop("pending_revocations", None)
+
 def verify_token(token: str, token_type: str = "access"):
     """Verify JWT token and return payload"""
     try:
@@ -83,7 +175,14 @@ def verify_token(token: str, token_type: str = "access"):
 
 def verify_access_token(token: str):
     """Verify access token specifically"""
-    return verify_token(token, "access")
+    payload = verify_token(token, "access")
+    if revoked_sessions.is_revoked(payload.get("sid")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
 
 
 def verify_refresh_token(token: str):
@@ -100,7 +199,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         "username": user_data.get("sub"),
         "user_id": user_data.get("user_id"),
         "is_admin": user_data.get("is_admin", False),
-        "permissions": user_data.get("permissions", {})
+        "permission_mask": user_data.get("perms", 0),
+        "session_id": user_data.get("sid")
     }
 
 
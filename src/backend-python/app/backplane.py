@@ -0,0 +1,262 @@
+"""
+Шина событий между процессами (backplane) для WebSocket уведомлений.
+
+ConnectionManager хранит соединения в памяти процесса, поэтому при
+нескольких воркерах uvicorn событие нужно передать остальным процессам.
+Каждый воркер публикует событие в шину один раз, а получив событие из
+шины, доставляет его только своим локальным соединениям.
+
+Драйверы выбираются переменной REALTIME_BACKPLANE:
+    memory   - в пределах одного процесса (по умолчанию, один воркер)
+    redis    - Redis Pub/Sub (или совместимый сервер), REDIS_URL; нужен пакет redis
+    postgres - PostgreSQL LISTEN/NOTIFY, REALTIME_DATABASE_URL или DATABASE_URL
+
+Все драйверы вызывают on_message из своего потока; переход в цикл событий
+выполняет app.events. Ошибка обработчика пропускает одно сообщение, а
+при потере соединения драйверы Redis и PostgreSQL переподключаются с
+увеличивающейся паузой (до BACKPLANE_RECONNECT_MAX_SECONDS).
+"""
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REALTIME_BACKPLANE = os.getenv("REALTIME_BACKPLANE", "memory").lower()
+ENABLE_REALTIME_SYNC = os.getenv("ENABLE_REALTIME_SYNC", "True").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REALTIME_CHANNEL = os.getenv("REALTIME_CHANNEL", "strod_realtime")
+BACKPLANE_RECONNECT_MAX_SECONDS = float(os.getenv("BACKPLANE_RECONNECT_MAX_SECONDS", "30"))
+
+MessageHandler = Callable[[str], None]
+
+
+def _deliver(on_message: MessageHandler, data: str):
+    """Передать сообщение обработчику; ошибка не останавливает прием следующих"""
+    try:
+        on_message(data)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Ошибка обработки сообщения из шины событий")
+
+
+class _Backoff:
+    """Пауза перед повторным подключением: 1, 2, 4 ... BACKPLANE_RECONNECT_MAX_SECONDS секунд"""
+
+    def __init__(self, maximum: float = BACKPLANE_RECONNECT_MAX_SECONDS):
+        self.maximum = maximum
+        self.delay = 1.0
+
+    def next(self) -> float:
+        delay = min(self.delay, self.maximum)
+        self.delay = min(self.delay * 2, self.maximum)
+        return delay
+
+    def reset(self):
+        self.delay = 1.0
+
+
+class Backplane(ABC):
+    """Интерфейс шины событий между процессами"""
+
+    @abstractmethod
+    def start(self, on_message: MessageHandler):
+        """Начать прием сообщений от других процессов"""
+
+    @abstractmethod
+    def publish(self, data: str):
+        """Отправить сообщение всем процессам. Может блокировать, вызывается вне цикла событий"""
+
+    def stop(self):
+        """Остановить прием сообщений и освободить соединения"""
+
+
+class InMemoryBroker:
+    """
+    Брокер в памяти процесса. Несколько InMemoryBackplane с общим брокером
+    ведут себя как несколько воркеров с общей шиной (используется как
+    локальная замена Redis/PostgreSQL при проверке).
+    """
+
+    def __init__(self):
+        self._handlers: List[MessageHandler] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: MessageHandler):
+        with self._lock:
+            self._handlers.append(handler)
+
+    def unsubscribe(self, handler: MessageHandler):
+        with self._lock:
+            if handler in self._handlers:
+                self._handlers.remove(handler)
+
+    def publish(self, data: str):
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler(data)
+
+
+class InMemoryBackplane(Backplane):
+    """Шина в памяти процесса"""
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        self.broker = broker or InMemoryBroker()
+        self._handler: Optional[MessageHandler] = None
+
+    def start(self, on_message: MessageHandler):
+        self._handler = on_message
+        self.broker.subscribe(on_message)
+
+    def publish(self, data: str):
+        self.broker.publish(data)
+
+    def stop(self):
+        if self._handler is not None:
+            self.broker.unsubscribe(self._handler)
+            self._handler = None
+
+
+class RedisBackplane(Backplane):
+    """Шина на основе Redis Pub/Sub"""
+
+    def __init__(self, url: str = REDIS_URL, channel: str = REALTIME_CHANNEL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Для REALTIME_BACKPLANE=redis необходимо установить пакет redis")
+
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = _Backoff()
+
+    def start(self, on_message: MessageHandler):
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+
+        def handle(message):
+            self._backoff.reset()
+            data = message["data"]
+            _deliver(on_message, data.decode("utf-8") if isinstance(data, bytes) else data)
+
+        self._pubsub.subscribe(**{self.channel: handle})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True,
+                                                  exception_handler=self._on_error)
+
+    def _on_error(self, error: Exception, pubsub, thread):
+        """
+        Ошибка чтения из Redis. Без обработчика поток приема завершился бы;
+        здесь он ждет и продолжает: pubsub переподключается и повторяет
+        подписку при следующем чтении.
+        """
+        delay = self._backoff.next()
+        logger.warning(f"Ошибка приема из канала {self.channel}: {error}; повтор через {delay:.0f} с")
+        time.sleep(delay)
+
+    def publish(self, data: str):
+        self._client.publish(self.channel, data)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+        self._client.close()
+
+
+class PostgresBackplane(Backplane):
+    """Шина на основе PostgreSQL LISTEN/NOTIFY"""
+
+    # Ограничение PostgreSQL на размер payload в NOTIFY
+    MAX_PAYLOAD_BYTES = 7999
+
+    def __init__(self, dsn: str, channel: str = REALTIME_CHANNEL):
+        import psycopg2
+
+        self._psycopg2 = psycopg2
+        # psycopg2 не понимает префикс драйвера SQLAlchemy
+        self.dsn = dsn.replace("postgresql+psycopg2://", "postgresql://")
+        self.channel = channel
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self):
+        conn = self._psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def start(self, on_message: MessageHandler):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._listen, args=(on_message,), daemon=True)
+        self._thread.start()
+
+    def _listen(self, on_message: MessageHandler):
+        """Прослушивать канал до stop(), переподключаясь после ошибок соединения"""
+        backoff = _Backoff()
+        while not self._stop_event.is_set():
+            try:
+                self._listen_once(on_message, backoff)
+            except Exception as e:  # pylint: disable=broad-except
+                delay = backoff.next()
+                logger.warning(f"Прослушивание канала {self.channel} прервано: {e}; "
+                               f"переподключение через {delay:.0f} с")
+                # Уведомления, отправленные до переподключения, не доставляются
+                self._stop_event.wait(delay)
+
+    def _listen_once(self, on_message: MessageHandler, backoff: _Backoff):
+        import select
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            backoff.reset()
+            while not self._stop_event.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _deliver(on_message, notify.payload)
+        finally:
+            conn.close()
+
+    def publish(self, data: str):
+        if len(data.encode("utf-8")) > self.MAX_PAYLOAD_BYTES:
+            logger.warning("Событие слишком велико для NOTIFY и доставлено только локально")
+            return
+        with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.closed:
+                self._publish_conn = self._connect()
+            with self._publish_conn.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, data))
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._publish_conn is not None:
+            self._publish_conn.close()
+            self._publish_conn = None
+
+
+def create_backplane(kind: Optional[str] = None) -> Backplane:
+    """Создать шину событий согласно настройкам окружения"""
+    kind = (kind or REALTIME_BACKPLANE).lower()
+    if not ENABLE_REALTIME_SYNC or kind == "memory":
+        return InMemoryBackplane()
+    if kind == "redis":
+        return RedisBackplane()
+    if kind in ("postgres", "postgresql"):
+        from .database import DATABASE_URL
+        return PostgresBackplane(os.getenv("REALTIME_DATABASE_URL", DATABASE_URL))
+    raise ValueError(f"Неизвестный тип шины событий: {kind}")
@@ -0,0 +1,254 @@
+"""
+Кэш ответов для справочных данных (типы документов, категории файлов,
+материалы, заказчики, объекты проекта).
+
+Справочники меняются редко, а клиент загружает их при открытии каждой
+формы. Ответ кэшируется уже сериализованным (JSON) вместе с ETag; повторный
+запрос с If-None-Match получает 304 без тела.
+
+Ключи версионированы по сущности: {сущность}:v{версия}:{вариант запроса}.
+CRUD функции создания, изменения и удаления вызывают invalidate_on_commit,
+и после фиксации транзакции версия сущности увеличивается - все записи
+старой версии становятся недоступны и вытесняются LRU или истекают по TTL.
+
+Драйверы (USE_REDIS_CACHE):
+    False - LRU в памяти процесса; сброс версии передается остальным
+            воркерам через шину событий (app.events)
+    True  - Redis или совместимый сервер (REDIS_URL), общий для всех
+            воркеров; нужен пакет redis
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from .conditional import etag_matches
+from .metrics import Counter, registry
+from .serialization import serialize_validated
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+USE_REDIS_CACHE = os.getenv("USE_REDIS_CACHE", "False").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "strod:cache")
+
+# Сущности справочников
+DOCUMENT_TYPES = "document_types"
+FILE_CATEGORIES = "file_categories"
+MATERIALS = "materials"
+CUSTOMERS = "customers"
+PROJECT_OBJECTS = "project_objects"
+
+cache_requests_total = registry.register(Counter(
+    "cache_requests_total", "Обращения к кэшу справочников", ("entity", "result")))
+
+
+class CacheDriver(ABC):
+    """Интерфейс хранилища кэша"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Значение по ключу (None - нет или истекло)"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: int):
+        """Сохранить значение на ttl секунд"""
+
+    @abstractmethod
+    def get_version(self, entity: str) -> int:
+        """Текущая версия сущности (отрицательная - кэш недоступен)"""
+
+    @abstractmethod
+    def bump_version(self, entity: str) -> int:
+        """Увеличить версию сущности"""
+
+    # Версии общие для всех воркеров (не нужно передавать сброс через шину)
+    shared = False
+
+
+class LRUCacheDriver(CacheDriver):
+    """Кэш в памяти процесса с вытеснением давно не использованных записей"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_version(self, entity: str) -> int:
+        return self._versions.get(entity, 0)
+
+    def bump_version(self, entity: str) -> int:
+        with self._lock:
+            version = self._versions.get(entity, 0) + 1
+            self._versions[entity] = version
+            # Записи старых версий больше не будут прочитаны
+            stale_prefix = f"{entity}:"
+            for key in [key for key in self._entries if key.startswith(stale_prefix)]:
+                del self._entries[key]
+            return version
+
+
+class RedisCacheDriver(CacheDriver):
+    """Кэш в Redis; при недоступности сервера запросы идут в БД"""
+
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = CACHE_KEY_PREFIX):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Для USE_REDIS_CACHE=True необходимо установить пакет redis")
+
+        self._redis_error = redis.RedisError
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._client.get(f"{self.prefix}:{key}")
+        except self._redis_error as e:
+            logger.warning(f"Кэш Redis недоступен: {e}")
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        try:
+            self._client.set(f"{self.prefix}:{key}", value, ex=ttl)
+        except self._redis_error as e:
+            logger.warning(f"Кэш Redis недоступен: {e}")
+
+    def get_version(self, entity: str) -> int:
+        try:
+            value = self._client.get(f"{self.prefix}:version:{entity}")
+        except self._redis_error as e:
+            logger.warning(f"Кэш Redis недоступен: {e}")
+            # Без версии кэш не используется (см. ReferenceCache.get_or_load)
+            return -1
+        return int(value) if value is not None else 0
+
+    def bump_version(self, entity: str) -> int:
+        try:
+            return int(self._client.incr(f"{self.prefix}:version:{entity}"))
+        except self._redis_error as e:
+            logger.error(f"Не удалось сбросить кэш {entity} в Redis: {e}")
+            return -1
+
+
+def create_cache_driver() -> CacheDriver:
+    """Создать драйвер кэша по настройке USE_REDIS_CACHE"""
+    if USE_REDIS_CACHE:
+        return RedisCacheDriver()
+    return LRUCacheDriver()
+
+
+class ReferenceCache:
+    """Кэш сериализованных ответов справочников с версиями по сущностям"""
+
+    def __init__(self, driver: CacheDriver, ttl: int = CACHE_TTL_SECONDS):
+        self.driver = driver
+        self.ttl = ttl
+        self._relay: Optional[Callable[[str, Any, str], None]] = None
+
+    def set_relay(self, relay: Optional[Callable[[str, Any, str], None]]):
+        """Функция передачи сброса версии остальным процессам (app.events)"""
+        self._relay = relay
+
+    def get_or_load(self, entity: str, variant: str, load: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """Тело ответа и ETag из кэша или из load()"""
+        version = self.driver.get_version(entity) if self.ttl > 0 else -1
+        if version < 0:
+            cache_requests_total.inc(entity=entity, result="bypass")
+            body = load()
+            return body, _etag(body)
+
+        key = f"{entity}:v{version}:{variant}"
+        cached = self.driver.get(key)
+        if cached is not None:
+            cache_requests_total.inc(entity=entity, result="hit")
+            etag, _, body = cached.partition(b"\n")
+            return body, etag.decode("ascii")
+
+        cache_requests_total.inc(entity=entity, result="miss")
+        body = load()
+        etag = _etag(body)
+        self.driver.set(key, etag.encode("ascii") + b"\n" + body, self.ttl)
+        return body, etag
+
+    def invalidate(self, entity: str, relay: bool = True):
+        """Увеличить версию сущности; записи старой версии больше не используются"""
+        self.driver.bump_version(entity)
+        if relay and not self.driver.shared and self._relay is not None:
+            self._relay("cache", entity, "")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+reference_cache = ReferenceCache(create_cache_driver())
+
+
+def invalidate_on_commit(db: Session, entity: str):
+    """
+    Сбросить кэш сущности после фиксации транзакции db.
+
+    Сброс до COMMIT позволил бы параллельному запросу снова закэшировать
+    старые данные под новой версией.
+    """
+    db.info.setdefault("pending_cache_invalidations", set()).add(entity)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _invalidate_pending(session):
+    for entity in session.info.pop("pending_cache_invalidations", ()):
+        reference_cache.invalidate(entity)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("pending_cache_invalidations", None)
+
+
+def cached_response(request: Request, entity: str, variant: str, response_type, load: Callable[[], Any]) -> Response:
+    """
+    Ответ справочника из кэша с поддержкой ETag/304.
+
+    response_type - тип ответа для сериализации (например List[schemas.DocumentType]),
+    load - функция получения данных из БД при промахе кэша. Данные читаются
+    из основной БД (get_db): реплика с задержкой могла бы сохранить в кэш
+    старые данные под новой версией.
+    """
+    body, etag = reference_cache.get_or_load(entity, variant, lambda: serialize_validated(response_type, load()))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,288 @@
+"""
+Сжатие ответов (gzip, brotli, zstd) по заголовку Accept-Encoding.
+
+Списки документов и замечаний - повторяющийся русский текст, который
+сжимается в 5-10 раз; для планшетов на мобильной связи это основная
+экономия времени загрузки.
+
+CompressionMiddleware:
+    - выбирает кодировку по q-значениям Accept-Encoding; при равном
+      приоритете предпочитает br, затем zstd, затем gzip (br и zstd -
+      при установленных пакетах brotli и zstandard)
+    - сжимает только текстовые типы (JSON, HTML, CSS, JS, XML, SVG);
+      файлы, архивы и изображения и ответы с Content-Encoding (в том числе
+      предварительно сжатая статика) передаются как есть
+    - ответ из одного блока меньше COMPRESSION_MIN_SIZE не сжимается
+    - потоковые ответы (экспорт) сжимаются по мере поступления частей:
+      после каждой части выполняется flush, клиент получает данные сразу
+    - сильный ETag при сжатии становится слабым (W/), сравнение в
+      If-None-Match слабое, поэтому 304 продолжает работать
+
+PrecompressedStaticFiles отдает файл.br / файл.gz рядом с исходным
+(см. precompress_static.py), если клиент принимает такую кодировку.
+"""
+import os
+import stat
+import zlib
+from mimetypes import guess_type
+from typing import Dict, Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Для динамических ответов: высокие уровни brotli слишком дороги по CPU
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int = GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int = ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Кодировки в порядке предпочтения сервера
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS["br"] = _BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdEncoder
+ENCODERS["gzip"] = _GzipEncoder
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Кодировки из Accept-Encoding с их q-значениями"""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header: Optional[str], available=ENCODERS) -> Optional[str]:
+    """Лучшая доступная кодировка для Accept-Encoding (None - без сжатия)"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for name in available:
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith("+json")
+
+
+class CompressionMiddleware:
+    """ASGI middleware сжатия ответов с учетом потоковой передачи"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None or scope.get("method") == "HEAD":
+            await self.app(scope, receive, _VaryingSend(send))
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["vary"] = f"{vary}, Accept-Encoding"
+
+
+def _should_compress(headers: MutableHeaders, status: int) -> bool:
+    if status < 200 or status in (204, 304):
+        return False
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", "").lower():
+        return False
+    return is_compressible(headers.get("content-type", ""))
+
+
+class _VaryingSend:
+    """Без сжатия: только Vary для сжимаемых ответов (для кэшей и прокси)"""
+
+    def __init__(self, send):
+        self.send = send
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if is_compressible(headers.get("content-type", "")):
+                _add_vary(headers)
+        await self.send(message)
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if not _should_compress(headers, message["status"]):
+                self.passthrough = True
+                await self.send(message)
+                return
+            _add_vary(headers)
+            # Решение о сжатии откладывается до первой части тела
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            start, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.encoder = ENCODERS[self.encoding]()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["content-encoding"] = self.encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["etag"] = f"W/{etag}"
+            if more_body:
+                # Длина заранее неизвестна: chunked передача
+                del headers["content-length"]
+                await self.send(start)
+            else:
+                data = self.encoder.compress(body) + self.encoder.finish()
+                headers["content-length"] = str(len(data))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": data})
+                return
+
+        if more_body:
+            data = self.encoder.compress(body) + self.encoder.flush()
+        else:
+            data = self.encoder.compress(body) + self.encoder.finish()
+        if data or not more_body:
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, отдающие файл.br или файл.gz, если клиент принимает сжатие"""
+
+    SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope):
+        accepted = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in self.SUFFIXES:
+            if accepted.get(encoding, accepted.get("*", 0.0)) <= 0:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            response = self.file_response(full_path, stat_result, scope)
+            if response.status_code == 304:
+                return response
+            response.headers["content-type"] = guess_type(path)[0] or "text/plain"
+            response.headers["content-encoding"] = encoding
+            _add_vary(response.headers)
+            return response
+
+        response = await super().get_response(path, scope)
+        _add_vary(response.headers)
+        return response
@@ -0,0 +1,167 @@
+"""
+Условные HTTP запросы: ETag, Last-Modified, If-None-Match, If-Match.
+
+Для отдельной записи слабый ETag вычисляется из значений ее колонок
+(включая updated_at), поэтому меняется при любом изменении записи,
+даже если два изменения пришлись на одну секунду (точность
+CURRENT_TIMESTAMP в SQLite). Для списка ETag строится по агрегату
+count/max(updated_at)/max(created_at)/max(id) с теми же фильтрами и по
+последней строке журнала изменений (change_log) этого типа записей, без
+загрузки строк. Агрегат по времени не различает два изменения в одну
+секунду, поэтому ETag списка меняется только вместе с журналом: списки
+записей, изменения которых в журнал не попадают, условными не делаются.
+Запрос с совпадающим If-None-Match получает 304 до загрузки и
+сериализации данных.
+
+If-Match на PUT защищает от потери изменений: если запись изменилась
+после того, как клиент ее получил, возвращается 412. Без заголовка
+If-Match запросы обрабатываются как раньше.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import Query, Session
+
+from .models.sync import TRACKED_TABLES, ChangeLog
+
+
+def _digest(parts: Iterable) -> str:
+    return hashlib.sha1(repr(tuple(parts)).encode("utf-8")).hexdigest()[:20]
+
+
+def _row_values(obj) -> tuple:
+    return tuple(getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs)
+
+
+def entity_etag(obj, *related) -> str:
+    """
+    Слабый ETag записи; related - списки связанных записей, входящих в ответ.
+
+    ETag с related имеет вид W/"<запись>.<связанные>"; If-Match сравнивает
+    только часть записи, поэтому ETag подробного ответа подходит для PUT.
+    """
+    tag = _digest((type(obj).__name__, _row_values(obj)))
+    if related:
+        tag += "." + _digest(tuple(_row_values(item) for item in items) for items in related)
+    return f'W/"{tag}"'
+
+
+def entity_last_modified(obj) -> Optional[datetime]:
+    """Время последнего изменения записи (updated_at или created_at)"""
+    return getattr(obj, "updated_at", None) or getattr(obj, "created_at", None)
+
+
+def list_validators(query: Query, model, variant: str) -> Tuple[str, Optional[datetime]]:
+    """
+    ETag и Last-Modified списка по запросу с фильтрами (без offset/limit).
+
+    variant отличает страницы и сортировки одного набора фильтров. Таблица
+    model должна отслеживаться журналом изменений (TRACKED_TABLES):
+    номер последней записи журнала меняется при каждом изменении.
+    """
+    entity = TRACKED_TABLES[model.__tablename__]
+    last_change = select(func.max(ChangeLog.id)).where(
+        ChangeLog.entity == entity
+    ).scalar_subquery()
+    count, max_updated, max_created, max_id, last_change_id = query.with_entities(
+        func.count(model.id), func.max(model.updated_at), func.max(model.created_at), func.max(model.id),
+        last_change
+    ).order_by(None).one()
+    last_modified = max(
+        (value for value in (max_updated, max_created) if isinstance(value, datetime)),
+        default=None,
+    )
+    etag = f'W/"{_digest((model.__tablename__, variant, count, max_updated, max_created, max_id, last_change_id))}"'
+    return etag, last_modified
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _entity_part(tag: str) -> str:
+    return _opaque(tag).strip('"').split(".", 1)[0]
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Слабое сравнение ETag со списком из заголовка (If-None-Match, If-Match)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(candidate) for candidate in header.split(",")}
+
+
+def _http_date(value: datetime) -> str:
+    # SQLite возвращает CURRENT_TIMESTAMP без часового пояса (UTC)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Клиент имеет актуальную версию (If-None-Match, иначе If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # Last-Modified передается с точностью до секунды
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None):
+    """Добавить ETag/Last-Modified в ответ эндпоинта"""
+    response.headers.update(validator_headers(etag, last_modified))
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, last_modified))
+
+
+def check_if_match(request: Request, db: Session, model, entity_id: int):
+    """
+    Проверить If-Match перед изменением записи.
+
+    Запись читается с блокировкой (SELECT ... FOR UPDATE там, где СУБД ее
+    поддерживает), чтобы параллельный PUT не прошел проверку до фиксации
+    этого. Запрос выполняется только при наличии заголовка; отсутствие
+    записи обрабатывает эндпоинт (404). Несовпадение ETag - 412.
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    current = db.query(model).filter(model.id == entity_id).with_for_update().first()
+    if current is None:
+        if if_match.strip() == "*":
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Запись не найдена")
+        return
+    if if_match.strip() == "*":
+        return
+    current_tag = _entity_part(entity_etag(current))
+    if current_tag not in {_entity_part(tag) for tag in if_match.split(",")}:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Запись была изменена другим пользователем. Обновите данные и повторите изменение"
+        )
@@ -1,8 +1,8 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, or_, select
 from typing import List, Optional
 from datetime import datetime
-from . import models, schemas
+from . import cache, models, schemas, events
 
 
 def get_gpr_records(db: Session, skip: int = 0, limit: int = 100):
@@ -37,8 +37,8 @@ def create_material(db: Session, material: schemas.MaterialCreate):
     """Создать новый материал"""
     db_material = models.Material(**material.dict())
     db.add(db_material)
-    db.commit()
-    db.refresh(db_material)
+    db.flush()
+    cache.invalidate_on_commit(db, cache.MATERIALS)
     return db_material
 
 
@@ -49,8 +49,8 @@ def update_material(db: Session, material_id: int, material_update: schemas.Mate
         update_data = material_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_material, field, value)
-        db.commit()
-        db.refresh(db_material)
+        db.flush()
+        cache.invalidate_on_commit(db, cache.MATERIALS)
     return db_material
 
 
@@ -59,7 +59,8 @@ def delete_material(db: Session, material_id: int):
     db_material = get_material(db, material_id)
     if db_material:
         db.delete(db_material)
-        db.commit()
+        db.flush()
+        cache.invalidate_on_commit(db, cache.MATERIALS)
     return db_material
 
 
@@ -82,8 +83,8 @@ def create_customer(db: Session, customer: schemas.CustomerCreate):
     """Создать нового заказчика"""
     db_customer = models.Customer(**customer.dict())
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    db.flush()
+    cache.invalidate_on_commit(db, cache.CUSTOMERS)
     return db_customer
 
 
@@ -94,8 +95,8 @@ def update_customer(db: Session, customer_id: int, customer_update: schemas.Cust
         update_data = customer_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_customer, field, value)
-        db.commit()
-        db.refresh(db_customer)
+        db.flush()
+        cache.invalidate_on_commit(db, cache.CUSTOMERS)
     return db_customer
 
 
@@ -104,7 +105,8 @@ def delete_customer(db: Session, customer_id: int):
     db_customer = get_customer(db, customer_id)
     if db_customer:
         db.delete(db_customer)
-        db.commit()
+        db.flush()
+        cache.invalidate_on_commit(db, cache.CUSTOMERS)
     return db_customer
 
 
@@ -127,8 +129,8 @@ def create_project_object(db: Session, project_object: schemas.ProjectObjectCrea
     """Создать новый объект проекта"""
     db_project_object = models.ProjectObject(**project_object.dict())
     db.add(db_project_object)
-    db.commit()
-    db.refresh(db_project_object)
+    db.flush()
+    cache.invalidate_on_commit(db, cache.PROJECT_OBJECTS)
     return db_project_object
 
 
@@ -139,8 +141,8 @@ def update_project_object(db: Session, object_id: int, project_object_update: sc
         update_data = project_object_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_project_object, field, value)
-        db.commit()
-        db.refresh(db_project_object)
+        db.flush()
+        cache.invalidate_on_commit(db, cache.PROJECT_OBJECTS)
     return db_project_object
 
 
@@ -149,7 +151,8 @@ def delete_project_object(db: Session, object_id: int):
     db_project_object = get_project_object(db, object_id)
     if db_project_object:
         db.delete(db_project_object)
-        db.commit()
+        db.flush()
+        cache.invalidate_on_commit(db, cache.PROJECT_OBJECTS)
     return db_project_object
 
 
@@ -165,8 +168,8 @@ def get_document_types(db: Session, skip: int = 0, limit: int = 100):
 def create_document_type(db: Session, document_type: schemas.DocumentTypeCreate):
     db_document_type = models.DocumentType(**document_type.model_dump())
     db.add(db_document_type)
-    db.commit()
-    db.refresh(db_document_type)
+    db.flush()
+    cache.invalidate_on_commit(db, cache.DOCUMENT_TYPES)
     return db_document_type
 
 
@@ -175,8 +178,8 @@ def update_document_type(db: Session, document_type_id: int, document_type: sche
     if db_document_type:
         for key, value in document_type.model_dump().items():
             setattr(db_document_type, key, value)
-        db.commit()
-        db.refresh(db_document_type)
+        db.flush()
+        cache.invalidate_on_commit(db, cache.DOCUMENT_TYPES)
     return db_document_type
 
 
@@ -184,7 +187,8 @@ def delete_document_type(db: Session, document_type_id: int):
     db_document_type = get_document_type(db, document_type_id)
     if db_document_type:
         db.delete(db_document_type)
-        db.commit()
+        db.flush()
+        cache.invalidate_on_commit(db, cache.DOCUMENT_TYPES)
     return db_document_type
 
 
@@ -216,11 +220,33 @@ def get_documents(
     return query.offset(skip).limit(limit).all()
 
 
-def create_document(db: Session, document: schemas.DocumentCreate):
-    db_document = models.Document(**document.model_dump(), status="in_office")
+def _publish_document_event(db: Session, db_document: models.Document, event: str, **extra):
+    """Уведомить подписчиков проекта об изменении документа (после фиксации транзакции)"""
+    data = {
+        "id": db_document.id,
+        "doc_number": db_document.doc_number,
+        "title": db_document.title,
+        "project_id": db_document.project_id,
+        "document_type_id": db_document.document_type_id,
+        "status": db_document.status,
+    }
+    data.update(extra)
+    events.publish_on_commit(db, events.documents_topic(db_document.project_id), event, data)
+
+
+def create_document(db: Session, document: schemas.DocumentCreate, changed_by: Optional[str] = None):
+    db_document = models.Document(**document.model_dump(), status=models.DocumentStatus.IN_OFFICE.value)
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    db.flush()
+    db.add(models.DocumentStatusHistory(
+        document_id=db_document.id,
+        old_status=None,
+        new_status=db_document.status,
+        changed_by=changed_by,
+        changed_at=datetime.utcnow()
+    ))
+    db.flush()
+    _publish_document_event(db, db_document, "document.created")
     return db_document
 
 
@@ -229,8 +255,8 @@ def update_document(db: Session, document_id: int, document: schemas.DocumentUpd
     if db_document:
         for key, value in document.model_dump(exclude_unset=True).items():
             setattr(db_document, key, value)
-        db.commit()
-        db.refresh(db_document)
+        db.flush()
+        _publish_document_event(db, db_document, "document.updated")
     return db_document
 
 
@@ -238,7 +264,8 @@ def delete_document(db: Session, document_id: int):
     db_document = get_document(db, document_id)
     if db_document:
         db.delete(db_document)
-        db.commit()
+        db.flush()
+        _publish_document_event(db, db_document, "document.deleted")
     return db_document
 
 
@@ -269,6 +296,181 @@ def search_documents(
     return db_query.all()
 
 
+def get_document_register(
+    db: Session,
+    query_str: Optional[str] = None,
+    document_id: Optional[int] = None,
+    yield_per: int = 500
+):
+    """
+    Реестр документов (как в реестре ПТО): документ, последняя отправка
+    и последний возврат с пользователями, выполнившими их. Строки читаются
+    частями по yield_per, поэтому выгрузка всего реестра не держит его в памяти.
+    """
+    shipped = aliased(models.DocumentStatusHistory)
+    returned = aliased(models.DocumentStatusHistory)
+    document = models.Document
+    stmt = (
+        select(
+            document.id,
+            document.doc_number,
+            document.title,
+            document.project_id,
+            document.status,
+            document.last_shipment_date,
+            document.last_shipment_recipient,
+            shipped.changed_by.label("shipped_by"),
+            document.last_return_date,
+            returned.changed_by.label("returned_by"),
+        )
+        .outerjoin(shipped, shipped.shipment_id == document.last_shipment_id)
+        .outerjoin(returned, returned.return_id == document.last_return_id)
+        .order_by(document.id)
+    )
+    if query_str:
+        stmt = stmt.where(or_(
+            document.doc_number.contains(query_str),
+            document.title.contains(query_str),
+            document.project_id.contains(query_str)
+        ))
+    if document_id is not None:
+        stmt = stmt.where(document.id == document_id)
+    return db.execute(stmt.execution_options(yield_per=yield_per))
+
+
+# Последняя отправка и последний возврат документа (денормализованные поля)
+def _lock_document(db: Session, document_id: int):
+    """Документ с блокировкой строки: параллельные отправки/возвраты одного документа выполняются по очереди"""
+    return db.query(models.Document).filter(models.Document.id == document_id).with_for_update().first()
+
+
+def _set_last_shipment(document: models.Document, shipment: Optional[models.DocumentShipment]):
+    document.last_shipment_id = shipment.id if shipment else None
+    document.last_shipment_date = shipment.shipment_date if shipment else None
+    document.last_shipment_recipient = shipment.recipient if shipment else None
+
+
+def _set_last_return(document: models.Document, return_obj: Optional[models.DocumentReturn]):
+    document.last_return_id = return_obj.id if return_obj else None
+    document.last_return_date = return_obj.return_date if return_obj else None
+    document.last_return_condition = return_obj.condition if return_obj else None
+
+
+def _refresh_last_shipment(db: Session, document_id: int):
+    """Пересчитать последнюю отправку документа (после изменения или удаления отправки)"""
+    document = _lock_document(db, document_id)
+    if document:
+        shipment = (db.query(models.DocumentShipment)
+                    .filter(models.DocumentShipment.document_id == document_id)
+                    .order_by(models.DocumentShipment.id.desc())
+                    .first())
+        _set_last_shipment(document, shipment)
+
+
+def _refresh_last_return(db: Session, document_id: int):
+    """Пересчитать последний возврат документа (после изменения или удаления возврата)"""
+    document = _lock_document(db, document_id)
+    if document:
+        return_obj = (db.query(models.DocumentReturn)
+                      .filter(models.DocumentReturn.document_id == document_id)
+                      .order_by(models.DocumentReturn.id.desc())
+                      .first())
+        _set_last_return(document, return_obj)
+
+
+# Автомат состояний документа (models.DOCUMENT_TRANSITIONS)
+class InvalidDocumentTransition(ValueError):
+    """Переход документа в статус, недопустимый из текущего"""
+
+
+def transition_denied_reason(document: models.Document, new_status: str) -> Optional[str]:
+    """Причина, по которой документ нельзя перевести в new_status (None - можно)"""
+    if new_status in models.DOCUMENT_TRANSITIONS.get(document.status, ()):
+        return None
+    if new_status == models.DocumentStatus.SHIPPED and document.status == models.DocumentStatus.SHIPPED:
+        return "Документ уже отправлен"
+    if new_status == models.DocumentStatus.RETURNED:
+        return "Документ не был отправлен и не может быть возвращен"
+    return f"Переход документа из статуса {document.status} в {new_status} недопустим"
+
+
+def shipment_denied_reason(document: models.Document) -> Optional[str]:
+    """Причина, по которой документ нельзя отправить (None - можно)"""
+    return transition_denied_reason(document, models.DocumentStatus.SHIPPED.value)
+
+
+def return_denied_reason(document: models.Document) -> Optional[str]:
+    """Причина, по которой возврат документа нельзя зафиксировать (None - можно)"""
+    return transition_denied_reason(document, models.DocumentStatus.RETURNED.value)
+
+
+def _check_transition(document: models.Document, new_status: str):
+    denied = transition_denied_reason(document, new_status)
+    if denied:
+        raise InvalidDocumentTransition(denied)
+
+
+def _change_document_status(
+    db: Session,
+    document: models.Document,
+    new_status: str,
+    changed_at: datetime,
+    changed_by: Optional[str] = None,
+    **details
+):
+    """Перевести документ в new_status и записать переход в историю статусов"""
+    _check_transition(document, new_status)
+    db.add(models.DocumentStatusHistory(
+        document_id=document.id,
+        old_status=document.status,
+        new_status=new_status,
+        changed_by=changed_by,
+        changed_at=changed_at,
+        **details
+    ))
+    document.status = new_status
+    document.updated_at = datetime.utcnow()
+
+
+def get_document_status_history(db: Session, document_id: int):
+    return db.query(models.DocumentStatusHistory).filter(
+        models.DocumentStatusHistory.document_id == document_id
+    ).order_by(models.DocumentStatusHistory.id).all()
+
+
+def _bulk_documents(db: Session, document_ids: List[int], denied_reason):
+    """
+    Проверка документов пакета: все документы читаются одним запросом IN
+    с блокировкой строк. Возвращает результаты по каждому ID в порядке
+    запроса и список (документ, результат) допущенных к операции.
+    """
+    documents = {
+        document.id: document
+        for document in db.query(models.Document)
+        .filter(models.Document.id.in_(set(document_ids)))
+        .with_for_update()
+    }
+    results, accepted, seen = [], [], set()
+    for document_id in document_ids:
+        document = None
+        if document_id in seen:
+            error = "Документ повторяется в пакете"
+        else:
+            seen.add(document_id)
+            document = documents.get(document_id)
+            error = "Документ не найден" if document is None else denied_reason(document)
+        result = {"document_id": document_id, "success": error is None, "id": None, "error": error}
+        results.append(result)
+        if error is None:
+            accepted.append((document, result))
+    return results, accepted
+
+
+def _bulk_summary(results: List[dict]) -> dict:
+    succeeded = sum(1 for result in results if result["success"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+
 # CRUD операции для отправок документов
 def get_document_shipment(db: Session, shipment_id: int):
     return db.query(models.DocumentShipment).filter(models.DocumentShipment.id == shipment_id).first()
@@ -278,28 +480,87 @@ def get_document_shipments(db: Session, document_id: int):
     return db.query(models.DocumentShipment).filter(models.DocumentShipment.document_id == document_id).all()
 
 
-def create_document_shipment(db: Session, shipment: schemas.DocumentShipmentCreate):
+def create_document_shipment(
+    db: Session,
+    shipment: schemas.DocumentShipmentCreate,
+    changed_by: Optional[str] = None
+):
+    document = _lock_document(db, shipment.document_id)
+    if document:
+        _check_transition(document, models.DocumentStatus.SHIPPED.value)
+
     db_shipment = models.DocumentShipment(**shipment.model_dump())
     db.add(db_shipment)
-    
-    # Обновляем статус документа на "отправлен"
-    document = get_document(db, shipment.document_id)
+    db.flush()
     if document:
-        document.status = "shipped"
-        document.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_shipment)
+        # Обновляем статус документа на "отправлен"; id отправки известен после flush
+        _change_document_status(db, document, models.DocumentStatus.SHIPPED.value,
+            changed_at=db_shipment.shipment_date,
+            changed_by=changed_by,
+            recipient=db_shipment.recipient,
+            shipment_id=db_shipment.id
+        )
+        _set_last_shipment(document, db_shipment)
+        db.flush()
+        _publish_document_event(db, document, "document.shipped",
+            shipment_id=db_shipment.id,
+            recipient=db_shipment.recipient,
+            shipment_date=db_shipment.shipment_date
+        )
     return db_shipment
 
 
+def create_document_shipments_bulk(
+    db: Session,
+    bulk: schemas.DocumentShipmentBulkCreate,
+    changed_by: Optional[str] = None
+):
+    """
+    Отправить пакет документов одному получателю.
+
+    Документы, которые нельзя отправить, пропускаются с ошибкой в
+    результате; остальные отправляются в той же транзакции.
+    """
+    results, accepted = _bulk_documents(db, bulk.document_ids, shipment_denied_reason)
+    shipments = [
+        models.DocumentShipment(
+            document_id=document.id,
+            recipient=bulk.recipient,
+            shipment_date=bulk.shipment_date,
+            notes=bulk.notes
+        )
+        for document, _ in accepted
+    ]
+    db.add_all(shipments)
+    db.flush()
+
+    # Все изменения документов - в одном flush: один UPDATE executemany
+    for (document, result), db_shipment in zip(accepted, shipments):
+        _change_document_status(db, document, models.DocumentStatus.SHIPPED.value,
+            changed_at=db_shipment.shipment_date,
+            changed_by=changed_by,
+            recipient=db_shipment.recipient,
+            shipment_id=db_shipment.id
+        )
+        _set_last_shipment(document, db_shipment)
+        result["id"] = db_shipment.id
+        _publish_document_event(db, document, "document.shipped",
+            shipment_id=db_shipment.id,
+            recipient=db_shipment.recipient,
+            shipment_date=db_shipment.shipment_date
+        )
+    db.flush()
+    return _bulk_summary(results)
+
+
 def update_document_shipment(db: Session, shipment_id: int, shipment: schemas.DocumentShipmentUpdate):
     db_shipment = get_document_shipment(db, shipment_id)
     if db_shipment:
         for key, value in shipment.model_dump(exclude_unset=True).items():
             setattr(db_shipment, key, value)
-        db.commit()
-        db.refresh(db_shipment)
+        db.flush()
+        _refresh_last_shipment(db, db_shipment.document_id)
+        db.flush()
     return db_shipment
 
 
@@ -307,7 +568,9 @@ def delete_document_shipment(db: Session, shipment_id: int):
     db_shipment = get_document_shipment(db, shipment_id)
     if db_shipment:
         db.delete(db_shipment)
-        db.commit()
+        db.flush()
+        _refresh_last_shipment(db, db_shipment.document_id)
+        db.flush()
     return db_shipment
 
 
@@ -320,28 +583,84 @@ def get_document_returns(db: Session, document_id: int):
     return db.query(models.DocumentReturn).filter(models.DocumentReturn.document_id == document_id).all()
 
 
-def create_document_return(db: Session, return_obj: schemas.DocumentReturnCreate):
+def create_document_return(
+    db: Session,
+    return_obj: schemas.DocumentReturnCreate,
+    changed_by: Optional[str] = None
+):
+    document = _lock_document(db, return_obj.document_id)
+    if document:
+        _check_transition(document, models.DocumentStatus.RETURNED.value)
+
     db_return = models.DocumentReturn(**return_obj.model_dump())
     db.add(db_return)
-    
-    # Обновляем статус документа на "возвращен"
-    document = get_document(db, return_obj.document_id)
+    db.flush()
     if document:
-        document.status = "returned"
-        document.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_return)
+        # Обновляем статус документа на "возвращен"
+        _change_document_status(db, document, models.DocumentStatus.RETURNED.value,
+            changed_at=db_return.return_date,
+            changed_by=changed_by,
+            return_id=db_return.id
+        )
+        _set_last_return(document, db_return)
+        db.flush()
+        _publish_document_event(db, document, "document.returned",
+            return_id=db_return.id,
+            return_date=db_return.return_date,
+            condition=db_return.condition
+        )
     return db_return
 
 
+def create_document_returns_bulk(
+    db: Session,
+    bulk: schemas.DocumentReturnBulkCreate,
+    changed_by: Optional[str] = None
+):
+    """
+    Зафиксировать возврат пакета документов.
+
+    Документы, которые не были отправлены, пропускаются с ошибкой в
+    результате; остальные возвращаются в той же транзакции.
+    """
+    results, accepted = _bulk_documents(db, bulk.document_ids, return_denied_reason)
+    returns = [
+        models.DocumentReturn(
+            document_id=document.id,
+            return_date=bulk.return_date,
+            condition=bulk.condition,
+            notes=bulk.notes
+        )
+        for document, _ in accepted
+    ]
+    db.add_all(returns)
+    db.flush()
+
+    for (document, result), db_return in zip(accepted, returns):
+        _change_document_status(db, document, models.DocumentStatus.RETURNED.value,
+            changed_at=db_return.return_date,
+            changed_by=changed_by,
+            return_id=db_return.id
+        )
+        _set_last_return(document, db_return)
+        result["id"] = db_return.id
+        _publish_document_event(db, document, "document.returned",
+            return_id=db_return.id,
+            return_date=db_return.return_date,
+            condition=db_return.condition
+        )
+    db.flush()
+    return _bulk_summary(results)
+
+
 def update_document_return(db: Session, return_id: int, return_obj: schemas.DocumentReturnUpdate):
     db_return = get_document_return(db, return_id)
     if db_return:
         for key, value in return_obj.model_dump(exclude_unset=True).items():
             setattr(db_return, key, value)
-        db.commit()
-        db.refresh(db_return)
+        db.flush()
+        _refresh_last_return(db, db_return.document_id)
+        db.flush()
     return db_return
 
 
@@ -349,7 +668,9 @@ def delete_document_return(db: Session, return_id: int):
     db_return = get_document_return(db, return_id)
     if db_return:
         db.delete(db_return)
-        db.commit()
+        db.flush()
+        _refresh_last_return(db, db_return.document_id)
+        db.flush()
     return db_return
 
 
@@ -365,8 +686,8 @@ def get_file_categories(db: Session, skip: int = 0, limit: int = 100):
 def create_file_category(db: Session, category: schemas.FileCategoryCreate):
     db_category = models.FileCategory(**category.model_dump())
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    db.flush()
+    cache.invalidate_on_commit(db, cache.FILE_CATEGORIES)
     return db_category
 
 
@@ -375,8 +696,8 @@ def update_file_category(db: Session, category_id: int, category: schemas.FileCa
     if db_category:
         for key, value in category.model_dump(exclude_unset=True).items():
             setattr(db_category, key, value)
-        db.commit()
-        db.refresh(db_category)
+        db.flush()
+        cache.invalidate_on_commit(db, cache.FILE_CATEGORIES)
     return db_category
 
 
@@ -384,7 +705,8 @@ def delete_file_category(db: Session, category_id: int):
     db_category = get_file_category(db, category_id)
     if db_category:
         db.delete(db_category)
-        db.commit()
+        db.flush()
+        cache.invalidate_on_commit(db, cache.FILE_CATEGORIES)
     return db_category
 
 
@@ -412,8 +734,7 @@ def create_uploaded_file(db: Session, file: schemas.UploadedFileCreate, user_id:
     
     db_file = models.UploadedFile(**file_data)
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    db.flush()
     return db_file
 
 
@@ -422,8 +743,7 @@ def update_uploaded_file(db: Session, file_id: int, file: schemas.UploadedFileUp
     if db_file:
         for key, value in file.model_dump(exclude_unset=True).items():
             setattr(db_file, key, value)
-        db.commit()
-        db.refresh(db_file)
+        db.flush()
     return db_file
 
 
@@ -431,7 +751,7 @@ def delete_uploaded_file(db: Session, file_id: int):
     db_file = get_uploaded_file(db, file_id)
     if db_file:
         db.delete(db_file)
-        db.commit()
+        db.flush()
     return db_file
 
 
@@ -461,8 +781,7 @@ def create_material_request(db: Session, request: schemas.MaterialRequestCreate,
     
     db_request = models.MaterialRequest(**request_data)
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    db.flush()
     return db_request
 
 
@@ -471,8 +790,7 @@ def update_material_request(db: Session, request_id: int, request: schemas.Mater
     if db_request:
         for key, value in request.model_dump(exclude_unset=True).items():
             setattr(db_request, key, value)
-        db.commit()
-        db.refresh(db_request)
+        db.flush()
     return db_request
 
 
@@ -480,7 +798,7 @@ def delete_material_request(db: Session, request_id: int):
     db_request = get_material_request(db, request_id)
     if db_request:
         db.delete(db_request)
-        db.commit()
+        db.flush()
     return db_request
 
 
@@ -497,11 +815,27 @@ def get_material_stocks(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.MaterialStock).offset(skip).limit(limit).all()
 
 
+def notify_stock_changed(db: Session, db_stock: models.MaterialStock):
+    """Уведомить подписчиков об изменении остатка (и о низком остатке) после фиксации транзакции"""
+    data = {
+        "id": db_stock.id,
+        "material_id": db_stock.material_id,
+        "quantity": db_stock.quantity,
+        "reserved_quantity": db_stock.reserved_quantity,
+        "min_threshold": db_stock.min_threshold,
+        "location": db_stock.location,
+    }
+    events.publish_on_commit(db, events.stock_topic(db_stock.material_id), "stock.updated", data)
+    if db_stock.quantity is not None and db_stock.min_threshold is not None \
+            and db_stock.quantity <= db_stock.min_threshold:
+        events.publish_on_commit(db, events.STOCK_LOW_TOPIC, "stock.low", data)
+
+
 def create_material_stock(db: Session, stock: schemas.MaterialStockCreate):
     db_stock = models.MaterialStock(**stock.model_dump())
     db.add(db_stock)
-    db.commit()
-    db.refresh(db_stock)
+    db.flush()
+    notify_stock_changed(db, db_stock)
     return db_stock
 
 
@@ -510,8 +844,8 @@ def update_material_stock(db: Session, stock_id: int, stock: schemas.MaterialSto
     if db_stock:
         for key, value in stock.model_dump(exclude_unset=True).items():
             setattr(db_stock, key, value)
-        db.commit()
-        db.refresh(db_stock)
+        db.flush()
+        notify_stock_changed(db, db_stock)
     return db_stock
 
 
@@ -519,7 +853,7 @@ def delete_material_stock(db: Session, stock_id: int):
     db_stock = get_material_stock(db, stock_id)
     if db_stock:
         db.delete(db_stock)
-        db.commit()
+        db.flush()
     return db_stock
 
 
@@ -1,8 +1,129 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional
-from datetime import datetime
-from . import models, schemas
+from sqlalchemy import and_, or_, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+from . import models, schemas, events
+
+# Статусы, в которых замечание не считается просроченным
+RESOLVED_STATUSES = (schemas.RemarkStatus.FIXED, schemas.RemarkStatus.VERIFIED, schemas.RemarkStatus.CLOSED)
+# Открытые статусы: условие IN по ним использует индекс (status, deadline)
+OPEN_STATUSES = tuple(status for status in schemas.RemarkStatus if status not in RESOLVED_STATUSES)
+
+SECONDS_PER_DAY = 86400.0
+# Замечаний за одну выборку проверки просрочки
+OVERDUE_SCAN_BATCH_SIZE = 500
+
+# Ключ строки remark_counters с признаком просрочки: (объект, статус, приоритет, просрочено)
+CounterKey = Tuple[int, str, str, bool]
+
+
+def _status_value(status) -> str:
+    return getattr(status, "value", status) or schemas.RemarkStatus.NEW.value
+
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Срок в UTC без часового пояса (в БД сроки хранятся так же)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def is_remark_overdue(db_remark: models.ConstructionRemark, now: Optional[datetime] = None) -> bool:
+    """Срок замечания прошел, а замечание не исправлено"""
+    deadline = _utc_naive(db_remark.deadline)
+    if deadline is None or _status_value(db_remark.status) in {status.value for status in RESOLVED_STATUSES}:
+        return False
+    return deadline < (now or datetime.utcnow())
+
+
+def _counter_key(db_remark: models.ConstructionRemark) -> CounterKey:
+    return (
+        db_remark.project_object_id,
+        _status_value(db_remark.status),
+        db_remark.priority or "normal",
+        bool(db_remark.is_overdue),
+    )
+
+
+def _add_to_counter(db: Session, key: CounterKey, delta: int):
+    """Изменить счетчик одним UPSERT (строка создается при первом замечании с таким ключом)"""
+    project_object_id, status, priority, overdue = key
+    overdue_delta = delta if overdue else 0
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    counters = models.RemarkCounter.__table__
+    stmt = dialect.insert(counters).values(
+        project_object_id=project_object_id, status=status, priority=priority,
+        count=max(delta, 0), overdue_count=max(overdue_delta, 0)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[counters.c.project_object_id, counters.c.status, counters.c.priority],
+        set_={"count": counters.c.count + delta, "overdue_count": counters.c.overdue_count + overdue_delta},
+    ))
+
+
+def _move_counters(db: Session, old_key: Optional[CounterKey], new_key: Optional[CounterKey]):
+    """Перенести замечание из строки счетчиков old_key в new_key (None - создание или удаление)"""
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _add_to_counter(db, old_key, -1)
+    if new_key is not None:
+        _add_to_counter(db, new_key, 1)
+
+
+def _lock_remark(db: Session, remark_id: int):
+    """Замечание с блокировкой строки: параллельные изменения одного замечания не расходятся со счетчиками"""
+    return db.query(models.ConstructionRemark).filter(
+        models.ConstructionRemark.id == remark_id
+    ).with_for_update().populate_existing().first()
+
+
+def overdue_days(db_remark: models.ConstructionRemark, now: Optional[datetime] = None) -> float:
+    """На сколько дней просрочено замечание (0 - срок не прошел или не задан)"""
+    deadline = _utc_naive(db_remark.deadline)
+    if deadline is None:
+        return 0.0
+    return round(max(((now or datetime.utcnow()) - deadline).total_seconds(), 0.0) / SECONDS_PER_DAY, 2)
+
+
+def _remark_event_data(db_remark: models.ConstructionRemark, **extra) -> Dict:
+    data = {
+        "id": db_remark.id,
+        "remark_number": db_remark.remark_number,
+        "title": db_remark.title,
+        "status": db_remark.status,
+        "priority": db_remark.priority,
+        "assigned_to": db_remark.assigned_to,
+        "deadline": db_remark.deadline,
+        "project_object_id": db_remark.project_object_id,
+    }
+    data.update(extra)
+    return data
+
+
+def _publish_remark_event(db: Session, db_remark: models.ConstructionRemark, event: str, **extra):
+    """Уведомить подписчиков объекта об изменении замечания (после фиксации транзакции)"""
+    data = _remark_event_data(db_remark, **extra)
+    events.publish_on_commit(db, events.remarks_topic(db_remark.project_object_id), event, data)
+
+
+def _escalate_overdue(db: Session, remarks: List[models.ConstructionRemark], now: Optional[datetime] = None):
+    """
+    Эскалация просроченных замечаний: событие remark.overdue подписчикам
+    объекта и исполнителю (assigned_to - имя пользователя) во все его соединения.
+    """
+    now = now or datetime.utcnow()
+    usernames = {db_remark.assigned_to for db_remark in remarks if db_remark.assigned_to}
+    user_ids = dict(
+        db.query(models.User.username, models.User.id).filter(models.User.username.in_(usernames)).all()
+    ) if usernames else {}
+    for db_remark in remarks:
+        data = _remark_event_data(db_remark, overdue_days=overdue_days(db_remark, now))
+        events.publish_on_commit(db, events.remarks_topic(db_remark.project_object_id), "remark.overdue", data)
+        user_id = user_ids.get(db_remark.assigned_to)
+        if user_id is not None:
+            events.publish_to_user_on_commit(db, user_id, "remark.overdue", data)
 
 
 def get_construction_remark(db: Session, remark_id: int):
@@ -15,16 +136,14 @@ def get_construction_remark_by_number(db: Session, remark_number: str):
     return db.query(models.ConstructionRemark).filter(models.ConstructionRemark.remark_number == remark_number).first()
 
 
-def get_construction_remarks(
-    db: Session, 
-    skip: int = 0, 
-    limit: int = 100, 
-    project_object_id: Optional[int] = None, 
+def construction_remarks_query(
+    db: Session,
+    project_object_id: Optional[int] = None,
     status: Optional[schemas.RemarkStatus] = None,
     priority: Optional[str] = None,
     assigned_to: Optional[str] = None
 ):
-    """Получить список замечаний с фильтрами"""
+    """Запрос замечаний с фильтрами (без offset/limit)"""
     query = db.query(models.ConstructionRemark)
     
     if project_object_id:
@@ -35,16 +154,30 @@ def get_construction_remarks(
         query = query.filter(models.ConstructionRemark.priority == priority)
     if assigned_to:
         query = query.filter(models.ConstructionRemark.assigned_to == assigned_to)
-        
+    return query
+
+
+def get_construction_remarks(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 100, 
+    project_object_id: Optional[int] = None, 
+    status: Optional[schemas.RemarkStatus] = None,
+    priority: Optional[str] = None,
+    assigned_to: Optional[str] = None
+):
+    """Получить список замечаний с фильтрами"""
+    query = construction_remarks_query(db, project_object_id, status, priority, assigned_to)
     return query.offset(skip).limit(limit).all()
 
 
 def create_construction_remark(db: Session, remark: schemas.ConstructionRemarkCreate):
     """Создать новое замечание"""
     db_remark = models.ConstructionRemark(**remark.dict())
+    db_remark.is_overdue = is_remark_overdue(db_remark)
     db.add(db_remark)
-    db.commit()
-    db.refresh(db_remark)
+    db.flush()
+    _move_counters(db, None, _counter_key(db_remark))
     
     # Создаем запись в истории после того, как замечание сохранено
     history_entry = models.RemarkHistory(
@@ -55,22 +188,29 @@ def create_construction_remark(db: Session, remark: schemas.ConstructionRemarkCr
         changed_by=remark.created_by
     )
     db.add(history_entry)
-    db.commit()
+    db.flush()
     
+    _publish_remark_event(db, db_remark, "remark.created")
+    if db_remark.is_overdue:
+        _escalate_overdue(db, [db_remark])
     return db_remark
 
 
 def update_construction_remark(db: Session, remark_id: int, remark_update: schemas.ConstructionRemarkUpdate):
     """Обновить замечание"""
-    db_remark = get_construction_remark(db, remark_id)
+    db_remark = _lock_remark(db, remark_id)
     if db_remark:
         # Сохраняем старый статус для истории
         old_status = db_remark.status
+        old_key = _counter_key(db_remark)
+        was_overdue = db_remark.is_overdue
         
         # Обновляем замечание
         update_data = remark_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_remark, field, value)
+        db_remark.is_overdue = is_remark_overdue(db_remark)
+        _move_counters(db, old_key, _counter_key(db_remark))
         
         # Если статус изменился, создаем запись в истории
         if 'status' in update_data and old_status != update_data['status']:
@@ -83,17 +223,23 @@ def update_construction_remark(db: Session, remark_id: int, remark_update: schem
             )
             db.add(history_entry)
         
-        db.commit()
-        db.refresh(db_remark)
+        db.flush()
+        _publish_remark_event(db, db_remark, "remark.updated")
+        # Срок перенесен в прошлое или замечание открыто повторно после срока
+        if db_remark.is_overdue and not was_overdue:
+            _escalate_overdue(db, [db_remark])
     return db_remark
 
 
 def delete_construction_remark(db: Session, remark_id: int):
     """Удалить замечание"""
-    db_remark = get_construction_remark(db, remark_id)
+    db_remark = _lock_remark(db, remark_id)
     if db_remark:
+        old_key = _counter_key(db_remark)
         db.delete(db_remark)
-        db.commit()
+        db.flush()
+        _move_counters(db, old_key, None)
+        _publish_remark_event(db, db_remark, "remark.deleted")
     return db_remark
 
 
@@ -143,8 +289,9 @@ def create_remark_photo(db: Session, photo: schemas.RemarkPhotoCreate):
     """Создать новую фотографию для замечания"""
     db_photo = models.RemarkPhoto(**photo.dict())
     db.add(db_photo)
-    db.commit()
-    db.refresh(db_photo)
+    db.flush()
+    if db_photo.remark is not None:
+        _publish_remark_event(db, db_photo.remark, "remark.photo_added", photo_id=db_photo.id)
     return db_photo
 
 
@@ -155,8 +302,7 @@ def update_remark_photo(db: Session, photo_id: int, photo_update: schemas.Remark
         update_data = photo_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_photo, field, value)
-        db.commit()
-        db.refresh(db_photo)
+        db.flush()
     return db_photo
 
 
@@ -164,8 +310,11 @@ def delete_remark_photo(db: Session, photo_id: int):
     """Удалить фотографию"""
     db_photo = get_remark_photo(db, photo_id)
     if db_photo:
+        db_remark = db_photo.remark
         db.delete(db_photo)
-        db.commit()
+        db.flush()
+        if db_remark is not None:
+            _publish_remark_event(db, db_remark, "remark.photo_deleted", photo_id=photo_id)
     return db_photo
 
 
@@ -178,8 +327,7 @@ def create_remark_history(db: Session, history: schemas.RemarkHistoryCreate):
     """Создать запись в истории изменения замечания"""
     db_history = models.RemarkHistory(**history.dict())
     db.add(db_history)
-    db.commit()
-    db.refresh(db_history)
+    db.flush()
     return db_history
 
 
@@ -197,35 +345,135 @@ def get_remarks_by_status(db: Session, status: schemas.RemarkStatus):
     ).all()
 
 
-def get_overdue_remarks(db: Session):
-    """Получить все просроченные замечания"""
-    from sqlalchemy import and_
-    return db.query(models.ConstructionRemark).filter(
-        and_(
-            models.ConstructionRemark.deadline < datetime.utcnow(),
-            models.ConstructionRemark.status != schemas.RemarkStatus.FIXED,
-            models.ConstructionRemark.status != schemas.RemarkStatus.CLOSED,
-            models.ConstructionRemark.status != schemas.RemarkStatus.VERIFIED
+def get_overdue_remarks(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    project_object_id: Optional[int] = None,
+    assigned_to: Optional[str] = None,
+    now: Optional[datetime] = None
+):
+    """Получить просроченные замечания, сначала просроченные сильнее всего"""
+    remarks = models.ConstructionRemark
+    query = db.query(remarks).filter(
+        remarks.status.in_(OPEN_STATUSES),
+        remarks.deadline < (now or datetime.utcnow())
+    )
+    if project_object_id:
+        query = query.filter(remarks.project_object_id == project_object_id)
+    if assigned_to:
+        query = query.filter(remarks.assigned_to == assigned_to)
+    return query.order_by(remarks.deadline, remarks.id).offset(skip).limit(limit).all()
+
+
+def get_remarks_summaries(db: Session, project_object_ids: Iterable[int]) -> List[Dict]:
+    """
+    Сводки по замечаниям нескольких объектов проекта одним чтением remark_counters.
+
+    Сводки возвращаются в порядке project_object_ids; у объектов без замечаний - нули.
+    """
+    project_object_ids = list(dict.fromkeys(project_object_ids))
+    summaries = {
+        object_id: {"project_object_id": object_id, "total": 0, "overdue": 0, "by_status": {}, "by_priority": {}}
+        for object_id in project_object_ids
+    }
+    if not project_object_ids:
+        return []
+    counters = db.execute(
+        select(models.RemarkCounter).where(
+            models.RemarkCounter.project_object_id.in_(project_object_ids),
+            models.RemarkCounter.count > 0
         )
-    ).all()
+    ).scalars()
+    for counter in counters:
+        summary = summaries[counter.project_object_id]
+        summary["total"] += counter.count
+        summary["overdue"] += counter.overdue_count
+        summary["by_status"][counter.status] = summary["by_status"].get(counter.status, 0) + counter.count
+        summary["by_priority"][counter.priority] = summary["by_priority"].get(counter.priority, 0) + counter.count
+    return list(summaries.values())
 
 
 def get_remarks_summary_by_project_object(db: Session, project_object_id: int):
     """Получить сводку по замечаниям для объекта проекта"""
-    from sqlalchemy import func
-    
-    summary = db.query(
-        models.ConstructionRemark.status,
-        func.count(models.ConstructionRemark.id).label('count')
-    ).filter(
-        models.ConstructionRemark.project_object_id == project_object_id
-    ).group_by(
-        models.ConstructionRemark.status
+    summary = get_remarks_summaries(db, [project_object_id])[0]
+    del summary["project_object_id"]
+    return summary
+
+
+def scan_overdue_remarks(
+    db: Session,
+    since: Optional[datetime],
+    now: Optional[datetime] = None,
+    batch_size: int = OVERDUE_SCAN_BATCH_SIZE
+) -> int:
+    """
+    Отметить замечания, срок которых наступил в [since, now), учесть их
+    в overdue_count и эскалировать исполнителям.
+
+    Выборка идет по индексу (status, deadline), поэтому стоимость зависит
+    от числа замечаний со сроком в интервале, а не от числа всех замечаний.
+    Без since проверяются все замечания с прошедшим сроком (первый запуск).
+    Возвращает число отмеченных замечаний.
+    """
+    now = now or datetime.utcnow()
+    remarks = models.ConstructionRemark
+    query = db.query(remarks).filter(
+        remarks.status.in_(OPEN_STATUSES),
+        remarks.deadline < now,
+        remarks.is_overdue.is_(False)
+    )
+    if since is not None:
+        query = query.filter(remarks.deadline >= since)
+
+    flagged = 0
+    while True:
+        # Отмеченные замечания выпадают из условия, следующая выборка - следующие по сроку
+        batch = query.order_by(remarks.deadline, remarks.id).limit(batch_size).with_for_update().all()
+        if not batch:
+            return flagged
+        for db_remark in batch:
+            old_key = _counter_key(db_remark)
+            db_remark.is_overdue = True
+            _move_counters(db, old_key, _counter_key(db_remark))
+        db.flush()
+        _escalate_overdue(db, batch, now)
+        flagged += len(batch)
+
+
+def rebuild_remark_counters(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Пересчитать is_overdue и remark_counters по всем замечаниям (восстановление счетчиков).
+
+    Возвращает число строк счетчиков.
+    """
+    now = now or datetime.utcnow()
+    remarks = models.ConstructionRemark
+    # Обновляются только замечания, у которых признак изменился
+    db.execute(update(remarks).where(
+        remarks.is_overdue.is_(True),
+        or_(remarks.deadline.is_(None), remarks.deadline >= now, remarks.status.in_(RESOLVED_STATUSES))
+    ).values(is_overdue=False))
+    db.execute(update(remarks).where(
+        remarks.is_overdue.is_(False), remarks.deadline < now, remarks.status.notin_(RESOLVED_STATUSES)
+    ).values(is_overdue=True))
+    db.execute(delete(models.RemarkCounter))
+    rows = db.execute(
+        select(
+            remarks.project_object_id, remarks.status, remarks.priority,
+            func.count(remarks.id), func.count(remarks.id).filter(remarks.is_overdue.is_(True))
+        ).group_by(remarks.project_object_id, remarks.status, remarks.priority)
     ).all()
-    
-    return {
-        'total': db.query(models.ConstructionRemark).filter(
-            models.ConstructionRemark.project_object_id == project_object_id
-        ).count(),
-        'by_status': {item.status.value: item.count for item in summary}
-    }
\ No newline at end of file
+    values: Dict[Tuple[int, str, str], List[int]] = {}
+    for project_object_id, status, priority, count, overdue_count in rows:
+        totals = values.setdefault((project_object_id, _status_value(status), priority or "normal"), [0, 0])
+        totals[0] += count
+        totals[1] += overdue_count
+    if values:
+        db.execute(models.RemarkCounter.__table__.insert(), [
+            {"project_object_id": key[0], "status": key[1], "priority": key[2],
+             "count": count, "overdue_count": overdue_count}
+            for key, (count, overdue_count) in values.items()
+        ])
+    db.flush()
+    return len(values)
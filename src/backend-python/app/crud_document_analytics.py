@@ -0,0 +1,147 @@
+"""
+Аналитика по истории статусов документов (document_status_history).
+
+Период - время между переходом документа в статус и следующим переходом
+(оконная функция LEAD по документу в порядке записи переходов: даты
+отправок и возвратов могут вводиться задним числом); для текущего статуса
+период открыт до текущего момента. Перцентили считаются в SQL методом ближайшего ранга
+(ROW_NUMBER и COUNT по окну), поэтому запросы одинаково работают в SQLite
+и PostgreSQL без выгрузки всей истории в приложение.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Float, case, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+SECONDS_PER_DAY = 86400.0
+PERCENTILES = (50, 75, 90)
+
+
+def _seconds_between(db: Session, start, end):
+    """Длительность между двумя временными выражениями в секундах"""
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * SECONDS_PER_DAY
+    return func.extract("epoch", end - start)
+
+
+def _status_periods(
+    db: Session,
+    project_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_open: bool = True
+):
+    """Подзапрос периодов: статус, получатель, начало, длительность (с), открыт ли период"""
+    history = models.DocumentStatusHistory
+    periods = select(
+        history.document_id,
+        history.new_status.label("status"),
+        history.recipient,
+        history.changed_at.label("started_at"),
+        func.lead(history.changed_at).over(
+            partition_by=history.document_id,
+            order_by=history.id
+        ).label("ended_at"),
+    )
+    if project_id:
+        periods = periods.join(models.Document, models.Document.id == history.document_id)\
+            .where(models.Document.project_id == project_id)
+    periods = periods.subquery("periods")
+
+    now = literal(datetime.utcnow(), models.DocumentStatusHistory.changed_at.type)
+    ended_at = func.coalesce(periods.c.ended_at, now)
+    conditions = []
+    if date_from:
+        conditions.append(periods.c.started_at >= date_from)
+    if date_to:
+        conditions.append(periods.c.started_at < date_to)
+    if not include_open:
+        conditions.append(periods.c.ended_at.isnot(None))
+
+    # Переход, введенный задним числом раньше предыдущего, дает нулевой период
+    seconds = cast(_seconds_between(db, periods.c.started_at, ended_at), Float)
+    return select(
+        periods.c.status,
+        periods.c.recipient,
+        case((seconds < 0, 0.0), else_=seconds).label("seconds"),
+        case((periods.c.ended_at.is_(None), 1), else_=0).label("is_open"),
+    ).where(*conditions).subquery("durations")
+
+
+def _duration_stats(durations, group_column):
+    """Число периодов, открытые, среднее, максимум и перцентили длительности по group_column"""
+    ranked = select(
+        group_column.label("group_key"),
+        durations.c.seconds,
+        durations.c.is_open,
+        func.row_number().over(partition_by=group_column, order_by=durations.c.seconds).label("rank"),
+        func.count().over(partition_by=group_column).label("total"),
+    ).subquery("ranked")
+
+    columns = [
+        ranked.c.group_key,
+        func.count().label("periods"),
+        func.sum(ranked.c.is_open).label("open"),
+        func.avg(ranked.c.seconds).label("avg_seconds"),
+        func.max(ranked.c.seconds).label("max_seconds"),
+    ]
+    for percentile in PERCENTILES:
+        # Ближайший ранг: ceil(p / 100 * total) в целочисленной арифметике
+        nearest_rank = (percentile * ranked.c.total + 99) // 100
+        columns.append(
+            func.max(case((ranked.c.rank == nearest_rank, ranked.c.seconds))).label(f"p{percentile}_seconds")
+        )
+    return select(*columns).group_by(ranked.c.group_key)
+
+
+def _days(seconds) -> Optional[float]:
+    return round(seconds / SECONDS_PER_DAY, 2) if seconds is not None else None
+
+
+def _stats_row(row) -> dict:
+    return {
+        "periods": row.periods,
+        "open": int(row.open or 0),
+        "avg_days": _days(row.avg_seconds),
+        "median_days": _days(row.p50_seconds),
+        "p75_days": _days(row.p75_seconds),
+        "p90_days": _days(row.p90_seconds),
+        "max_days": _days(row.max_seconds),
+    }
+
+
+def get_turnaround_by_recipient(
+    db: Session,
+    project_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_open: bool = True
+) -> List[dict]:
+    """
+    Сколько документы находятся у каждого получателя: периоды в статусе
+    "отправлен" (от отправки до возврата) по получателям, начиная с самых
+    долгих по медиане.
+    """
+    durations = _status_periods(db, project_id, date_from, date_to, include_open)
+    shipped = select(durations).where(durations.c.status == models.DocumentStatus.SHIPPED.value).subquery("shipped")
+    stats = _duration_stats(shipped, shipped.c.recipient).subquery("stats")
+    rows = db.execute(
+        select(stats).order_by(stats.c.p50_seconds.desc(), stats.c.group_key)
+    ).all()
+    return [{"recipient": row.group_key, **_stats_row(row)} for row in rows]
+
+
+def get_status_durations(
+    db: Session,
+    project_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    include_open: bool = True
+) -> List[dict]:
+    """Сколько документы находятся в каждом статусе"""
+    durations = _status_periods(db, project_id, date_from, date_to, include_open)
+    rows = db.execute(_duration_stats(durations, durations.c.status)).all()
+    return [{"status": row.group_key, **_stats_row(row)} for row in rows]
@@ -0,0 +1,134 @@
+"""
+Инкрементальная синхронизация клиентов по журналу изменений (change_log).
+
+Токен синхронизации - id последней обработанной строки журнала. Запрос
+читает страницу журнала после токена (по первичному ключу), сворачивает
+несколько изменений одной записи в одно и загружает текущие версии
+измененных записей одним запросом на тип. Объем работы зависит от числа
+изменений, а не от размера таблиц.
+
+id строки журнала выдается при вставке, а транзакции фиксируются в
+произвольном порядке. В SQLite пишущие транзакции выполняются по одной,
+поэтому строки становятся видимыми в порядке id и токен надежен как есть.
+В PostgreSQL две параллельные транзакции могут получить id 10 и 11 и
+зафиксироваться в обратном порядке: клиент, синхронизировавшийся между
+фиксациями, получит токен 11, и строка 10 после токена уже не попадет.
+Поэтому вне SQLite каждый запрос заново читает SYNC_SAFETY_WINDOW строк
+журнала перед токеном: строки поздно зафиксированных транзакций попадают
+в ответ, уже полученные клиентом изменения повторяются (применение
+upserted/deleted идемпотентно). Окно должно превышать число строк журнала,
+добавляемых за время самой долгой пишущей транзакции.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .permissions import Permission
+
+# Максимальное число строк журнала в одном ответе
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+# Срок хранения журнала; клиент, не синхронизировавшийся дольше, выполняет полную загрузку
+SYNC_RETENTION_DAYS = int(os.getenv("SYNC_RETENTION_DAYS", "30"))
+# Сколько строк журнала перед токеном читать повторно (кроме SQLite, см. выше)
+SYNC_SAFETY_WINDOW = int(os.getenv("SYNC_SAFETY_WINDOW", "200"))
+
+# Сущность -> (модель, схема ответа, право на чтение)
+SYNC_ENTITIES = {
+    "documents": (models.Document, schemas.Document, Permission.DOCUMENTS_READ),
+    "shipments": (models.DocumentShipment, schemas.DocumentShipment, Permission.DOCUMENTS_READ),
+    "returns": (models.DocumentReturn, schemas.DocumentReturn, Permission.DOCUMENTS_READ),
+    "remarks": (models.ConstructionRemark, schemas.ConstructionRemark, Permission.REMARKS_READ),
+    "remark_photos": (models.RemarkPhoto, schemas.RemarkPhoto, Permission.REMARKS_READ),
+    "gpr_records": (models.GPRRecord, schemas.GPRRecord, Permission.GPR_READ),
+    "stocks": (models.MaterialStock, schemas.MaterialStock, Permission.FILES_READ),
+}
+
+
+class SyncTokenExpired(Exception):
+    """Журнал за период после токена уже удален, нужна полная загрузка"""
+
+
+def allowed_entities(permission_mask: int) -> List[str]:
+    """Сущности, доступные пользователю с данными правами"""
+    return [
+        entity for entity, (_, _, permission) in SYNC_ENTITIES.items()
+        if permission_mask & permission == permission
+    ]
+
+
+def get_current_token(db: Session) -> int:
+    """Токен, соответствующий текущему состоянию данных"""
+    return db.query(func.max(models.ChangeLog.id)).scalar() or 0
+
+
+def safety_window(db: Session) -> int:
+    """Число строк журнала перед токеном, читаемых повторно (0 для SQLite)"""
+    if db.get_bind().dialect.name == "sqlite":
+        return 0
+    return max(SYNC_SAFETY_WINDOW, 0)
+
+
+def get_changes(
+    db: Session,
+    since: int,
+    entities: List[str],
+    limit: int = SYNC_PAGE_SIZE
+) -> Tuple[int, bool, Dict[str, dict]]:
+    """
+    Изменения после токена since.
+
+    Возвращает (новый токен, есть ли еще изменения, изменения по сущностям
+    {"upserted": [...], "deleted": [id, ...]}).
+    """
+    oldest = db.query(func.min(models.ChangeLog.id)).scalar()
+    if oldest is not None and since < oldest - 1:
+        raise SyncTokenExpired()
+
+    rows = db.query(
+        models.ChangeLog.id, models.ChangeLog.entity, models.ChangeLog.entity_id, models.ChangeLog.operation
+    ).filter(models.ChangeLog.entity.in_(entities)).order_by(models.ChangeLog.id)
+    page = rows.filter(models.ChangeLog.id > since).limit(limit).all()
+    window = safety_window(db)
+    if window:
+        # Строки перед токеном, которые могли быть зафиксированы после прошлого запроса
+        page = rows.filter(models.ChangeLog.id > since - window, models.ChangeLog.id <= since).all() + page
+
+    if not page:
+        return since, False, {}
+
+    # Последняя операция по каждой записи в пределах страницы
+    latest: Dict[str, Dict[int, str]] = {}
+    for _, entity, entity_id, operation in page:
+        latest.setdefault(entity, {})[entity_id] = operation
+
+    changes = {}
+    for entity, operations in latest.items():
+        model, schema, _ = SYNC_ENTITIES[entity]
+        deleted = sorted(entity_id for entity_id, operation in operations.items() if operation == "delete")
+        changed_ids = [entity_id for entity_id, operation in operations.items() if operation != "delete"]
+        upserted = []
+        if changed_ids:
+            # Записи, удаленные позже этой страницы, отсутствуют и придут как tombstone в следующей
+            rows = db.query(model).filter(model.id.in_(changed_ids)).order_by(model.id).all()
+            upserted = [schema.model_validate(row) for row in rows]
+        changes[entity] = {"upserted": upserted, "deleted": deleted}
+
+    new_rows = sum(1 for row in page if row.id > since)
+    return max(page[-1].id, since), new_rows == limit, changes
+
+
+def prune_change_log(db: Session, retention_days: int = SYNC_RETENTION_DAYS) -> int:
+    """Удалить строки журнала старше срока хранения"""
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    # Последняя строка журнала сохраняется, чтобы токен оставался действительным
+    newest = get_current_token(db)
+    return db.query(models.ChangeLog).filter(
+        models.ChangeLog.changed_at < cutoff,
+        models.ChangeLog.id < newest
+    ).delete(synchronize_session=False)
@@ -1,8 +1,14 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
-from typing import Optional
+from typing import List, Optional
 from . import models, schemas, auth
+from .permissions import (
+    ALL_PERMISSIONS, DEFAULT_PERMISSIONS, DEFAULT_ROLES,
+    compile_permissions, compile_legacy_permissions, parse_legacy_permissions,
+    parse_permission_name, permission_names
+)
 from datetime import datetime
+import json
 
 
 def get_user_by_username(db: Session, username: str):
@@ -49,12 +55,11 @@ def create_user(db: Session, user: schemas.UserCreate):
         hashed_password=hashed_password,
         is_active=user.is_active,
         is_admin=user.is_admin,
-        permissions=str(user.permissions)  # Сохраняем как строку JSON
+        permissions=json.dumps(user.permissions or {})  # Сохраняем как строку JSON
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.flush()
     return db_user
 
 
@@ -68,22 +73,43 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         if "password" in update_data:
             update_data["hashed_password"] = auth.get_password_hash(update_data.pop("password"))
         
+        if update_data.get("permissions") is not None:
+            update_data["permissions"] = json.dumps(update_data["permissions"])
+        
         for field, value in update_data.items():
             if field != "password":
                 setattr(db_user, field, value)
         
-        db.commit()
-        db.refresh(db_user)
+        db.flush()
     
     return db_user
 
 
 def delete_user(db: Session, user_id: int):
-    """Удалить пользователя"""
+    """
+    Удалить пользователя.
+
+    Сессии пользователя не удаляются, а отзываются и отвязываются от него:
+    до истечения они остаются в user_sessions, и отзыв загружается при
+    старте приложения (get_revoked_sessions).
+    """
     db_user = get_user(db, user_id)
     if db_user:
+        now = datetime.utcnow()
+        sessions = db.query(models.UserSession).filter(models.UserSession.user_id == user_id).all()
+        for session in sessions:
+            if session.expires_at < now:
+                db.delete(session)
+                continue
+            if not session.is_revoked:
+                session.is_revoked = True
+                session.revoked_at = now
+            session.user_id = None
         db.delete(db_user)
-        db.commit()
+        db.flush()
+        for session in sessions:
+            if session.expires_at >= now:
+                auth.revoke_on_commit(db, session.id, session.expires_at)
     return db_user
 
 
@@ -104,18 +130,16 @@ def activate_user(db: Session, user_id: int):
     user = get_user(db, user_id)
     if user:
         user.is_active = True
-        db.commit()
-        db.refresh(user)
+        db.flush()
     return user
 
 
 def deactivate_user(db: Session, user_id: int):
-    """Деактивировать пользователя"""
+    """Деактивировать пользователя и отозвать все его сессии"""
     user = get_user(db, user_id)
     if user:
         user.is_active = False
-        db.commit()
-        db.refresh(user)
+        revoke_user_sessions_for_user(db, user_id)
     return user
 
 
@@ -124,8 +148,7 @@ def promote_to_admin(db: Session, user_id: int):
     user = get_user(db, user_id)
     if user:
         user.is_admin = True
-        db.commit()
-        db.refresh(user)
+        db.flush()
     return user
 
 
@@ -134,8 +157,7 @@ def demote_from_admin(db: Session, user_id: int):
     user = get_user(db, user_id)
     if user:
         user.is_admin = False
-        db.commit()
-        db.refresh(user)
+        db.flush()
     return user
 
 
@@ -143,7 +165,222 @@ def update_user_permissions(db: Session, user_id: int, permissions: dict):
     """Обновить права доступа пользователя"""
     user = get_user(db, user_id)
     if user:
-        user.permissions = str(permissions)  # Сохраняем как строку JSON
-        db.commit()
-        db.refresh(user)
-    return user
\ No newline at end of file
+        user.permissions = json.dumps(permissions)  # Сохраняем как строку JSON
+        db.flush()
+    return user
+
+
+# CRUD операции для сессий пользователей (refresh токены)
+def create_user_session(
+    db: Session,
+    user_id: int,
+    token_id: str,
+    expires_at: datetime,
+    user_agent: Optional[str] = None,
+    ip_address: Optional[str] = None
+):
+    """Создать сессию пользователя для нового refresh токена"""
+    db_session = models.UserSession(
+        user_id=user_id,
+        session_token=token_id,
+        expires_at=expires_at,
+        is_revoked=False,
+        user_agent=user_agent,
+        ip_address=ip_address
+    )
+    db.add(db_session)
+    db.flush()
+    return db_session
+
+
+def get_user_session(db: Session, session_id: int):
+    """Получить сессию пользователя по ID"""
+    return db.query(models.UserSession).filter(models.UserSession.id == session_id).first()
+
+
+def get_user_sessions(
+    db: Session,
+    user_id: Optional[int] = None,
+    active_only: bool = True,
+    skip: int = 0,
+    limit: int = 100
+):
+    """Получить список сессий (по всем пользователям или по одному)"""
+    query = db.query(models.UserSession)
+    if user_id is not None:
+        query = query.filter(models.UserSession.user_id == user_id)
+    if active_only:
+        query = query.filter(
+            and_(
+                models.UserSession.is_revoked == False,
+                models.UserSession.expires_at > datetime.utcnow()
+            )
+        )
+    return query.order_by(models.UserSession.id.desc()).offset(skip).limit(limit).all()
+
+
+def rotate_user_session(db: Session, db_session: models.UserSession, token_id: str, expires_at: datetime):
+    """Заменить refresh токен сессии на новый (ротация)"""
+    db_session.session_token = token_id
+    db_session.expires_at = expires_at
+    db_session.last_activity = datetime.utcnow()
+    db.flush()
+    return db_session
+
+
+def revoke_user_session(db: Session, session_id: int):
+    """Отозвать сессию пользователя"""
+    db_session = get_user_session(db, session_id)
+    if db_session and not db_session.is_revoked:
+        db_session.is_revoked = True
+        db_session.revoked_at = datetime.utcnow()
+        db.flush()
+        auth.revoke_on_commit(db, db_session.id, db_session.expires_at)
+    return db_session
+
+
+def revoke_user_sessions_for_user(db: Session, user_id: int):
+    """Отозвать все активные сессии пользователя"""
+    sessions = db.query(models.UserSession).filter(
+        and_(models.UserSession.user_id == user_id, models.UserSession.is_revoked == False)
+    ).all()
+    revoked_at = datetime.utcnow()
+    for db_session in sessions:
+        db_session.is_revoked = True
+        db_session.revoked_at = revoked_at
+    db.flush()
+    for db_session in sessions:
+        auth.revoke_on_commit(db, db_session.id, db_session.expires_at)
+    return [db_session.id for db_session in sessions]
+
+
+def get_revoked_sessions(db: Session):
+    """Получить (id, expires_at) отозванных, но еще не истекших сессий"""
+    return db.query(models.UserSession.id, models.UserSession.expires_at).filter(
+        and_(
+            models.UserSession.is_revoked == True,
+            models.UserSession.expires_at > datetime.utcnow()
+        )
+    ).all()
+
+
+# CRUD операции для ролей и прав доступа
+def get_role(db: Session, role_id: int):
+    """Получить роль по ID"""
+    return db.query(models.Role).filter(models.Role.id == role_id).first()
+
+
+def get_role_by_name(db: Session, name: str):
+    """Получить роль по названию"""
+    return db.query(models.Role).filter(models.Role.name == name).first()
+
+
+def get_roles(db: Session, skip: int = 0, limit: int = 100):
+    """Получить список ролей"""
+    return db.query(models.Role).offset(skip).limit(limit).all()
+
+
+def _set_role_permissions(db_role: models.Role, permissions: List[str]):
+    """Заменить набор прав роли (имена проверяются)"""
+    names = sorted({parse_permission_name(name).name.lower() for name in permissions})
+    db_role.permissions = [models.RolePermission(permission=name) for name in names]
+
+
+def create_role(db: Session, role: schemas.RoleCreate):
+    """Создать роль"""
+    if get_role_by_name(db, role.name):
+        raise ValueError("Роль с таким названием уже существует")
+    
+    db_role = models.Role(name=role.name, description=role.description)
+    _set_role_permissions(db_role, role.permissions)
+    db.add(db_role)
+    db.flush()
+    return db_role
+
+
+def update_role(db: Session, role_id: int, role_update: schemas.RoleUpdate):
+    """Обновить описание и набор прав роли"""
+    db_role = get_role(db, role_id)
+    if db_role:
+        if role_update.description is not None:
+            db_role.description = role_update.description
+        if role_update.permissions is not None:
+            _set_role_permissions(db_role, role_update.permissions)
+        db.flush()
+    return db_role
+
+
+def delete_role(db: Session, role_id: int):
+    """Удалить роль вместе с ее назначениями"""
+    db_role = get_role(db, role_id)
+    if db_role:
+        db.query(models.UserRole).filter(models.UserRole.role_id == role_id).delete()
+        db.delete(db_role)
+        db.flush()
+    return db_role
+
+
+def get_user_roles(db: Session, user_id: int):
+    """Получить роли пользователя"""
+    return db.query(models.Role).join(
+        models.UserRole, models.UserRole.role_id == models.Role.id
+    ).filter(models.UserRole.user_id == user_id).all()
+
+
+def assign_role_to_user(db: Session, user_id: int, role_id: int):
+    """Назначить роль пользователю"""
+    existing = db.query(models.UserRole).filter(
+        and_(models.UserRole.user_id == user_id, models.UserRole.role_id == role_id)
+    ).first()
+    if existing:
+        return existing
+    
+    db_user_role = models.UserRole(user_id=user_id, role_id=role_id)
+    db.add(db_user_role)
+    db.flush()
+    return db_user_role
+
+
+def remove_role_from_user(db: Session, user_id: int, role_id: int):
+    """Снять роль с пользователя"""
+    db_user_role = db.query(models.UserRole).filter(
+        and_(models.UserRole.user_id == user_id, models.UserRole.role_id == role_id)
+    ).first()
+    if db_user_role:
+        db.delete(db_user_role)
+        db.flush()
+    return db_user_role
+
+
+def get_user_permission_mask(db: Session, user: models.User) -> int:
+    """
+    Скомпилировать права пользователя в битовую маску.
+
+    Маска вшивается в access токен, поэтому вызывается только при входе
+    и обновлении токена.
+    """
+    if user.is_admin:
+        return int(ALL_PERMISSIONS)
+    
+    rows = db.query(models.UserRole.role_id, models.RolePermission.permission).outerjoin(
+        models.RolePermission, models.RolePermission.role_id == models.UserRole.role_id
+    ).filter(models.UserRole.user_id == user.id).all()
+    
+    if rows:
+        mask = compile_permissions(row.permission for row in rows if row.permission)
+    else:
+        # Пользователь без ролей получает права по умолчанию
+        mask = int(DEFAULT_PERMISSIONS)
+    
+    return mask | compile_legacy_permissions(parse_legacy_permissions(user.permissions))
+
+
+def ensure_default_roles(db: Session):
+    """Создать роли по умолчанию, если их еще нет"""
+    for name, (description, mask) in DEFAULT_ROLES.items():
+        if not get_role_by_name(db, name):
+            create_role(db, schemas.RoleCreate(
+                name=name,
+                description=description,
+                permissions=permission_names(mask)
+            ))
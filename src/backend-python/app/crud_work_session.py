@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from datetime import datetime, date
+from sqlalchemy import and_
+from datetime import datetime, date, time, timedelta
 from typing import List
 from .models.work_session import WorkSession
 from .models.user import User
@@ -10,8 +10,7 @@ def create_work_session(db: Session, user_id: int) -> WorkSession:
     """Создание новой сессии работы"""
     work_session = WorkSession(user_id=user_id, start_time=datetime.now())
     db.add(work_session)
-    db.commit()
-    db.refresh(work_session)
+    db.flush()
     return work_session
 
 
@@ -21,8 +20,7 @@ def end_work_session(db: Session, user_id: int) -> WorkSession:
     if active_session:
         active_session.end_time = datetime.now()
         active_session.is_active = False
-        db.commit()
-        db.refresh(active_session)
+        db.flush()
         return active_session
     return None
 
@@ -48,10 +46,13 @@ def get_all_work_sessions(db: Session, skip: int = 0, limit: int = 100) -> List[
 
 def get_work_sessions_for_date(db: Session, user_id: int, target_date: date) -> List[WorkSession]:
     """Получение сессий работы за определенную дату"""
+    # Диапазон вместо func.date(start_time): условие использует индекс (user_id, start_time)
+    day_start = datetime.combine(target_date, time.min)
     return db.query(WorkSession).filter(
         and_(
             WorkSession.user_id == user_id,
-            func.date(WorkSession.start_time) == target_date
+            WorkSession.start_time >= day_start,
+            WorkSession.start_time < day_start + timedelta(days=1)
         )
     ).all()
 
@@ -1,29 +1,271 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Dict, List, Optional
+import itertools
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # Получаем URL базы данных из переменных окружения, если доступно
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./strod_service_tech.db")
 
-if "postgresql" in DATABASE_URL.lower():
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=20,
-        max_overflow=0,
-        pool_pre_ping=True,
-    )
-else:
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Пересоздавать соединения старше указанного времени, с (-1 - не пересоздавать)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_ECHO = os.getenv("DB_ECHO", "False").lower() == "true"
+
+# Настройки SQLite
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Реплики для чтения (через запятую); пусто - все запросы идут в основную БД
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Сколько секунд после записи чтения клиента идут в основную БД (read-your-writes)
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+# Через сколько секунд повторно пробовать недоступную реплику
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.rstrip("/").endswith(":memory:") or url.rstrip("/") in ("sqlite:", "sqlite://")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Настройка каждого нового соединения SQLite.
+
+    В режиме WAL читатели не блокируются пишущей транзакцией, поэтому
+    загрузка пакета документов не останавливает остальных пользователей.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        # Отрицательное значение cache_size задается в килобайтах
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None, **overrides) -> Engine:
+    """
+    Создать движок SQLAlchemy с настройками пула и СУБД.
+
+    Единая точка создания движков для приложения, скриптов инициализации
+    и корневого config.py. Параметры пула берутся из переменных окружения
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE;
+    overrides передаются в create_engine и имеют приоритет.
+    """
+    url = url or DATABASE_URL
+    options = {"echo": DB_ECHO}
+
+    if url.lower().startswith("sqlite"):
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+        if not _is_sqlite_memory(url):
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    options.update(overrides)
+    db_engine = create_engine(url, **options)
+
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
 
+class _ModelBase:
+    # Серверные значения (created_at, updated_at) возвращаются из INSERT/UPDATE
+    # через RETURNING, где СУБД его поддерживает, вместо отдельного SELECT (refresh)
+    __mapper_args__ = {"eager_defaults": True}
+
+
+Base = declarative_base(cls=_ModelBase)
+
+
+class ReadReplicaRouter:
+    """
+    Выбор сессии для чтения: реплики по кругу, недоступная реплика
+    пропускается DB_REPLICA_RETRY_SECONDS секунд, при отсутствии доступных
+    реплик используется основная БД. Клиент, недавно выполнивший запись,
+    читает из основной БД, чтобы увидеть свои изменения несмотря на
+    задержку репликации.
+    """
+
+    def __init__(self, replica_urls: List[str], sticky_seconds: float, retry_seconds: float):
+        self.replicas = [
+            sessionmaker(autocommit=False, autoflush=False, bind=create_db_engine(url))
+            for url in replica_urls
+        ]
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(self.replicas)
+        self._next_replica = itertools.count()
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Счетчики для мониторинга
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.replica_failures = 0
 
-def get_db():
+    def mark_write(self, key: Optional[str]):
+        """Запомнить, что клиент выполнил запись"""
+        if not key or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[key] = now + self.sticky_seconds
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {k: v for k, v in self._recent_writes.items() if v > now}
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        """Клиент недавно выполнял запись и должен читать из основной БД"""
+        if not key:
+            return False
+        until = self._recent_writes.get(key)
+        return until is not None and until > time.monotonic()
+
+    def open_read_session(self, key: Optional[str] = None) -> Session:
+        if self.replicas:
+            if self.is_sticky(key):
+                self.sticky_reads += 1
+            else:
+                db = self._open_replica_session()
+                if db is not None:
+                    self.replica_reads += 1
+                    return db
+        self.primary_reads += 1
+        db = SessionLocal()
+        db.info["read_only"] = True
+        return db
+
+    def _open_replica_session(self) -> Optional[Session]:
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            index = next(self._next_replica) % len(self.replicas)
+            if self._down_until[index] > now:
+                continue
+            db = self.replicas[index]()
+            db.info["read_only"] = True
+            try:
+                # Берем соединение сразу, чтобы недоступная реплика обнаружилась до выполнения запроса
+                db.connection()
+                return db
+            except DBAPIError as e:
+                db.close()
+                self._down_until[index] = now + self.retry_seconds
+                self.replica_failures += 1
+                logger.warning(f"Реплика БД #{index} недоступна, чтение переключено на основную БД: {e}")
+        return None
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": len(self.replicas),
+            "replicas_down": sum(1 for until in self._down_until if until > now),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "replica_failures": self.replica_failures,
+        }
+
+
+read_router = ReadReplicaRouter(DATABASE_REPLICA_URLS, DB_READ_YOUR_WRITES_SECONDS, DB_REPLICA_RETRY_SECONDS)
+
+
+@event.listens_for(Session, "before_flush")
+def _forbid_read_only_flush(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise RuntimeError("Попытка записи через сессию только для чтения (get_read_db)")
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _track_commit(session):
+    if session.info.pop("has_writes", False):
+        read_router.mark_write(session.info.get("client_key"))
+
+
+def _client_key(request: Optional[Request]) -> Optional[str]:
+    """Ключ клиента для read-your-writes: токен авторизации или адрес клиента"""
+    if request is None:
+        return None
+    authorization = request.headers.get("authorization")
+    if authorization:
+        return authorization
+    return request.client.host if request.client else None
+
+
+def get_db(request: Request = None):
+    """
+    Сессия основной БД (для запросов с записью).
+
+    CRUD функции только выполняют flush; транзакция фиксируется один раз
+    в UnitOfWorkMiddleware перед отправкой успешного ответа и
+    откатывается при ошибке. Без запроса (скрипты) фиксирует при выходе.
+    """
     db = SessionLocal()
+    db.info["client_key"] = _client_key(request)
+    if request is not None:
+        request.state.db_session = db
+    try:
+        yield db
+        if request is None:
+            db.commit()
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request = None):
+    """Сессия для чтения: реплика, если настроена и клиент недавно не писал"""
+    db = read_router.open_read_session(_client_key(request))
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
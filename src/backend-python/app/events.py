@@ -0,0 +1,286 @@
+"""
+Публикация доменных событий в темы WebSocket.
+
+CRUD функции выполняются синхронно (в пуле потоков FastAPI или прямо в
+цикле событий), поэтому publish_event передает сообщение в цикл событий
+приложения потокобезопасно. Вне запущенного приложения (скрипты) события
+не публикуются; отдельный воркер outbox отправляет их только в шину
+(start_publisher).
+
+Событие доставляется локальным подписчикам сразу и один раз отправляется
+в шину (app.backplane); остальные воркеры доставляют его своим
+соединениям, а собственные сообщения из шины воркер пропускает. Через
+шину же передаются сброс версий справочников (reference_cache) и отзыв
+сессий (auth.revoked_sessions), которые каждый процесс хранит у себя.
+
+Темы:
+    object:{id}:remarks        - замечания по объекту проекта
+    documents:project:{id}     - документы проекта (создание, изменение, отправка, возврат)
+    stock:material:{id}        - изменение остатков материала
+    stock:low                  - остаток материала опустился до минимального порога
+    gpr:{id}                   - запись ГПР
+
+События пользователю (publish_to_user_on_commit, например эскалация
+просроченного замечания исполнителю) доставляются всем его соединениям
+без подписки; в сообщении тема user:{id}.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from .auth import revoked_sessions
+from .backplane import Backplane
+from .cache import reference_cache
+from .metrics import domain_events_total
+from .permissions import Permission
+from .websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Цикл событий приложения, устанавливается при старте
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+# Шина событий между процессами
+_backplane: Optional[Backplane] = None
+# Идентификатор текущего процесса в шине
+ORIGIN_ID = uuid.uuid4().hex
+
+# Права, необходимые для подписки на темы (по первому сегменту темы)
+TOPIC_PERMISSIONS = {
+    "object": Permission.REMARKS_READ,
+    "documents": Permission.DOCUMENTS_READ,
+    "stock": Permission.FILES_READ,
+    "gpr": Permission.GPR_READ,
+}
+
+
+def set_event_loop(loop: Optional[asyncio.AbstractEventLoop]):
+    """Запомнить цикл событий, в котором работает ConnectionManager"""
+    global _event_loop
+    _event_loop = loop
+
+
+def start(loop: asyncio.AbstractEventLoop, backplane: Backplane):
+    """Подключить процесс к шине событий (при старте приложения)"""
+    global _backplane
+    set_event_loop(loop)
+    _backplane = backplane
+    backplane.start(_on_backplane_message)
+    manager.set_relay(_relay)
+    reference_cache.set_relay(_relay)
+    revoked_sessions.set_relay(_relay)
+
+
+def start_publisher(backplane: Backplane):
+    """
+    Подключить к шине процесс без WebSocket соединений (python -m app.outbox).
+
+    Сообщения из шины такой процесс не принимает, а свои события,
+    сбросы справочников и отзывы сессий отправляет процессам приложения.
+    """
+    global _backplane
+    _backplane = backplane
+    reference_cache.set_relay(_relay)
+    revoked_sessions.set_relay(_relay)
+
+
+def stop():
+    """Отключиться от шины событий (при остановке приложения)"""
+    global _backplane
+    manager.set_relay(None)
+    reference_cache.set_relay(None)
+    revoked_sessions.set_relay(None)
+    if _backplane is not None:
+        _backplane.stop()
+        _backplane = None
+    set_event_loop(None)
+
+
+def _in_event_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _backplane_publish(backplane: Backplane, data: str):
+    try:
+        backplane.publish(data)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning(f"Не удалось отправить событие в шину: {e}")
+
+
+def _relay(kind: str, target: Any, payload: str):
+    """Отправить уже доставленное локально сообщение остальным процессам"""
+    backplane = _backplane
+    if backplane is None:
+        return
+    data = json.dumps({"origin": ORIGIN_ID, "kind": kind, "target": target, "payload": payload})
+
+    loop = _event_loop
+    if loop is not None and _in_event_loop(loop):
+        # Публикация может обращаться к сети, не блокируем цикл событий
+        loop.run_in_executor(None, _backplane_publish, backplane, data)
+    else:
+        _backplane_publish(backplane, data)
+
+
+def _on_backplane_message(data: str):
+    """Получено сообщение из шины (вызывается из потока драйвера)"""
+    loop = _event_loop
+    if loop is None or loop.is_closed():
+        return
+    if _in_event_loop(loop):
+        _dispatch(data)
+    else:
+        loop.call_soon_threadsafe(_dispatch, data)
+
+
+def _dispatch(data: str):
+    """Доставить сообщение из шины локальным соединениям"""
+    try:
+        envelope = json.loads(data)
+    except (json.JSONDecodeError, TypeError):
+        logger.warning("Получено некорректное сообщение из шины событий")
+        return
+    if envelope.get("origin") == ORIGIN_ID:
+        return
+
+    kind, target, payload = envelope.get("kind"), envelope.get("target"), envelope.get("payload")
+    if kind == "topic":
+        manager.publish_nowait(target, payload)
+    elif kind == "user":
+        manager.deliver_to_user(target, payload)
+    elif kind == "all":
+        manager.deliver_to_all(payload)
+    elif kind == "cache":
+        # Справочник изменен в другом процессе
+        reference_cache.invalidate(target, relay=False)
+    elif kind == "revoke":
+        # Сессия отозвана в другом процессе: ее access токены больше не принимаются
+        try:
+            expires_at = datetime.fromisoformat(payload)
+        except (TypeError, ValueError):
+            expires_at = None
+        revoked_sessions.add(target, expires_at, relay=False)
+
+
+def topic_permission(topic: str) -> Optional[Permission]:
+    """Получить право, необходимое для подписки на тему (None - неизвестная тема)"""
+    return TOPIC_PERMISSIONS.get(topic.split(":", 1)[0])
+
+
+def remarks_topic(project_object_id: int) -> str:
+    return f"object:{project_object_id}:remarks"
+
+
+def documents_topic(project_id: str) -> str:
+    return f"documents:project:{project_id}"
+
+
+def stock_topic(material_id: int) -> str:
+    return f"stock:material:{material_id}"
+
+
+def gpr_topic(record_id: int) -> str:
+    return f"gpr:{record_id}"
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+STOCK_LOW_TOPIC = "stock:low"
+
+
+def build_event(topic: str, event: str, data: Dict[str, Any]) -> str:
+    """Сформировать сериализованное сообщение о событии"""
+    return json.dumps({
+        "type": "event",
+        "topic": topic,
+        "event": event,
+        "data": data,
+        "timestamp": datetime.utcnow().isoformat()
+    }, default=str)
+
+
+def deliver_local_user(user_id: int, message: str):
+    """Доставить сообщение соединениям пользователя в текущем процессе"""
+    loop = _event_loop
+    if loop is None or loop.is_closed():
+        return
+
+    if _in_event_loop(loop):
+        manager.deliver_to_user(user_id, message)
+    else:
+        loop.call_soon_threadsafe(manager.deliver_to_user, user_id, message)
+
+
+def deliver_local(topic: str, message: str):
+    """Доставить сообщение подписчикам темы в текущем процессе"""
+    loop = _event_loop
+    if loop is None or loop.is_closed():
+        return
+
+    if _in_event_loop(loop):
+        manager.publish_nowait(topic, message)
+    else:
+        loop.call_soon_threadsafe(manager.publish_nowait, topic, message)
+
+
+def publish_on_commit(db: Session, topic: str, event: str, data: Dict[str, Any]):
+    """
+    Опубликовать событие после фиксации транзакции сессии db.
+
+    CRUD функции только выполняют flush, поэтому событие откладывается до
+    COMMIT и отбрасывается при откате, чтобы подписчики не увидели изменений,
+    которых нет в базе.
+    """
+    db.info.setdefault("pending_events", []).append((topic, event, data))
+
+
+def publish_to_user_on_commit(db: Session, user_id: int, event: str, data: Dict[str, Any]):
+    """Отправить событие пользователю после фиксации транзакции сессии db (см. publish_on_commit)"""
+    db.info.setdefault("pending_user_events", []).append((user_id, event, data))
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending_events(session):
+    for topic, event, data in session.info.pop("pending_events", []):
+        publish_event(topic, event, data)
+    for user_id, event, data in session.info.pop("pending_user_events", []):
+        publish_user_event(user_id, event, data)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session):
+    session.info.pop("pending_events", None)
+    session.info.pop("pending_user_events", None)
+
+
+def publish_event(topic: str, event: str, data: Dict[str, Any]):
+    """Опубликовать событие в тему. Вызывается после фиксации транзакции"""
+    try:
+        message = build_event(topic, event, data)
+        domain_events_total.inc(event=event)
+        deliver_local(topic, message)
+        _relay("topic", topic, message)
+    except Exception as e:  # pylint: disable=broad-except
+        # Ошибка уведомления не должна ломать уже выполненную операцию
+        logger.warning(f"Не удалось опубликовать событие {event} в тему {topic}: {e}")
+
+
+def publish_user_event(user_id: int, event: str, data: Dict[str, Any]):
+    """Отправить событие всем соединениям пользователя (во всех процессах). Вызывается после фиксации транзакции"""
+    try:
+        message = build_event(user_topic(user_id), event, data)
+        domain_events_total.inc(event=event)
+        deliver_local_user(user_id, message)
+        _relay("user", user_id, message)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning(f"Не удалось отправить событие {event} пользователю {user_id}: {e}")
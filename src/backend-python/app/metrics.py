@@ -0,0 +1,361 @@
+"""
+Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+Счетчики и гистограммы обновляются в местах событий (middleware запросов,
+загрузка файлов, bcrypt, доменные события), а состояние пула соединений БД,
+WebSocket и пула потоков снимается в момент запроса метрик, поэтому
+на горячем пути нет лишней работы. Формат совместим с Prometheus
+text exposition 0.0.4; отдельная библиотека не требуется.
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from .profiler import route_template
+
+# Границы гистограммы длительности запросов, с
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bcrypt занимает сотни миллисекунд; границы смещены вверх
+BCRYPT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Текущие значения: (имя, метки, значение)"""
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    """Текущее значение, которое может расти и уменьшаться"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам (накопительные счетчики le)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> [счетчики корзин..., сумма, количество]
+        self._values: Dict[tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, state[-2]
+            yield f"{self.name}_count", labels, state[-1]
+
+
+class _Collected(_Metric):
+    """Метрика, значения которой вычисляются при каждом запросе /metrics"""
+
+    def __init__(self, name: str, documentation: str, kind: str, collect: Callable[[], Iterable[Tuple[Dict, float]]]):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._collect():
+            yield self.name, labels, value
+
+
+class MetricsRegistry:
+    """Набор метрик и их вывод в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collected(self, name: str, documentation: str, kind: str = "gauge"):
+        """Декоратор: функция возвращает пары (метки, значение) на момент запроса"""
+        def decorator(collect):
+            self.register(_Collected(name, documentation, kind, collect))
+            return collect
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Число HTTP запросов", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Длительность обработки HTTP запроса", ("method", "route")))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "Число HTTP запросов в обработке"))
+http_requests_in_progress.set(0)
+
+# Загрузка файлов
+upload_bytes_total = registry.register(Counter(
+    "upload_bytes_total", "Объем загруженных файлов, байт", ("kind",)))
+uploads_total = registry.register(Counter(
+    "uploads_total", "Число загруженных файлов", ("kind",)))
+
+# Хеширование паролей
+bcrypt_in_progress = registry.register(Gauge(
+    "bcrypt_operations_in_progress", "Число выполняемых операций bcrypt (хеширование и проверка паролей)"))
+bcrypt_in_progress.set(0)
+bcrypt_duration_seconds = registry.register(Histogram(
+    "bcrypt_duration_seconds", "Длительность операции bcrypt", ("operation",), buckets=BCRYPT_BUCKETS))
+
+# Доменные события
+domain_events_total = registry.register(Counter(
+    "domain_events_total", "Опубликованные доменные события", ("event",)))
+material_requests_created_total = registry.register(Counter(
+    "material_requests_created_total", "Запросы на закупку, созданные MaterialNotificationService", ("reason",)))
+
+
+@registry.collected("db_pool_size", "Размер пула соединений БД")
+def _db_pool_size():
+    for name, pool in _db_pools():
+        if hasattr(pool, "size"):
+            yield {"engine": name}, pool.size()
+
+
+@registry.collected("db_pool_checked_out", "Соединения БД, выданные из пула")
+def _db_pool_checked_out():
+    for name, pool in _db_pools():
+        if hasattr(pool, "checkedout"):
+            yield {"engine": name}, pool.checkedout()
+
+
+@registry.collected("db_pool_overflow", "Соединения БД сверх pool_size (отрицательное значение - свободные места в пуле)")
+def _db_pool_overflow():
+    for name, pool in _db_pools():
+        if hasattr(pool, "overflow"):
+            yield {"engine": name}, pool.overflow()
+
+
+def _db_pools():
+    from .database import engine, read_router
+
+    yield "primary", engine.pool
+    for index, replica in enumerate(read_router.replicas):
+        yield f"replica{index}", replica.kw["bind"].pool
+
+
+@registry.collected("db_reads_total", "Сессии чтения по источнику (get_read_db)", kind="counter")
+def _db_reads():
+    from .database import read_router
+
+    stats = read_router.get_stats()
+    yield {"target": "replica"}, stats["replica_reads"]
+    yield {"target": "primary"}, stats["primary_reads"]
+    yield {"target": "sticky"}, stats["sticky_reads"]
+
+
+@registry.collected("websocket_connections", "Открытые WebSocket соединения")
+def _websocket_connections():
+    from .websocket_manager import manager
+
+    yield {}, len(manager.active_connections)
+
+
+@registry.collected("websocket_users", "Пользователи с открытыми WebSocket соединениями")
+def _websocket_users():
+    from .websocket_manager import manager
+
+    yield {}, len(manager.user_connections)
+
+
+@registry.collected("websocket_events_total", "События WebSocket соединений", kind="counter")
+def _websocket_events():
+    from .websocket_manager import manager
+
+    stats = manager.get_stats()
+    for key in ("connections_opened", "reaped_connections", "auth_failures", "auth_timeouts",
+                "dropped_messages", "slow_consumer_disconnects"):
+        yield {"event": key}, stats.get(key, 0)
+
+
+@registry.collected("threadpool_busy_threads", "Занятые потоки пула для синхронных эндпоинтов")
+def _threadpool_busy():
+    statistics = _threadpool_statistics()
+    if statistics is not None:
+        yield {}, statistics.borrowed_tokens
+
+
+@registry.collected("threadpool_waiting_tasks", "Задачи, ожидающие свободный поток (в т.ч. проверки паролей bcrypt)")
+def _threadpool_waiting():
+    statistics = _threadpool_statistics()
+    if statistics is not None:
+        yield {}, statistics.tasks_waiting
+
+
+@registry.collected("threadpool_size", "Размер пула потоков для синхронных эндпоинтов")
+def _threadpool_size():
+    statistics = _threadpool_statistics()
+    if statistics is not None:
+        yield {}, statistics.total_tokens
+
+
+def _threadpool_statistics():
+    import anyio
+
+    try:
+        return anyio.to_thread.current_default_thread_limiter().statistics()
+    except RuntimeError:
+        # Вне цикла событий (например, вызов из скрипта)
+        return None
+
+
+def record_upload(kind: str, size: int):
+    """Учесть загруженный файл"""
+    uploads_total.inc(kind=kind)
+    upload_bytes_total.inc(size, kind=kind)
+
+
+@contextmanager
+def timed_bcrypt(operation: str):
+    """Учесть операцию bcrypt: число выполняемых и длительность"""
+    bcrypt_in_progress.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        bcrypt_duration_seconds.observe(time.perf_counter() - started, operation=operation)
+        bcrypt_in_progress.dec()
+
+
+class MetricsMiddleware:
+    """ASGI middleware: число, длительность и статус HTTP запросов по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec()
+            method = scope.get("method", "")
+            route = route_template(scope)
+            http_requests_total.inc(method=method, route=route, status=status_code)
+            http_request_duration_seconds.observe(time.perf_counter() - started, method=method, route=route)
+
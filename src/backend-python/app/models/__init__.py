@@ -1,9 +1,14 @@
 from .gpr import GPRRecord, WeeklyReport, Material, Customer, ProjectObject
-from .documents import Document, DocumentType, DocumentShipment, DocumentReturn
+from .documents import (
+    Document, DocumentType, DocumentShipment, DocumentReturn, DocumentStatus, DocumentStatusHistory, DOCUMENT_TRANSITIONS,
+    LegacyDocumentMap
+)
 from .files import FileCategory, UploadedFile, MaterialRequest, MaterialStock
-from .user import User, UserSession
+from .user import User, UserSession, Role, RolePermission, UserRole
 from .work_session import WorkSession
-from .construction_remarks import ConstructionRemark, RemarkPhoto, RemarkHistory, add_remarks_relationship
+from .sync import ChangeLog
+from .outbox import OutboxJob, ScanWatermark
+from .construction_remarks import ConstructionRemark, RemarkCounter, RemarkPhoto, RemarkHistory, add_remarks_relationship
 
 # Добавляем связь к модели ProjectObject
 add_remarks_relationship()
\ No newline at end of file
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import false, func
 from datetime import datetime
 from typing import Optional
 from enum import Enum
@@ -32,6 +32,7 @@ class ConstructionRemark(Base):
     priority = Column(String, default="normal", index=True)  # Приоритет: low, normal, high, critical
     assigned_to = Column(String, index=True, nullable=True)  # Кому назначено
     deadline = Column(DateTime, nullable=True)  # Срок исправления
+    is_overdue = Column(Boolean, default=False, server_default=false(), nullable=False)  # Учтено в remark_counters как просроченное
     created_by = Column(String, index=True, nullable=False)  # Кто создал
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -41,6 +42,28 @@ class ConstructionRemark(Base):
     photos = relationship("RemarkPhoto", back_populates="remark")
     history = relationship("RemarkHistory", back_populates="remark")
 
+    __table_args__ = (
+        # Просроченные замечания: открытые статусы и срок в диапазоне
+        Index("ix_construction_remarks_status_deadline", "status", "deadline"),
+    )
+
+
+class RemarkCounter(Base):
+    """
+    Счетчики замечаний объекта проекта по статусу и приоритету.
+
+    Поддерживаются функциями создания, изменения и удаления замечаний
+    в той же транзакции; сводки по объектам читаются отсюда без GROUP BY
+    по construction_remarks. overdue_count - замечания с is_overdue.
+    """
+    __tablename__ = "remark_counters"
+
+    project_object_id = Column(Integer, ForeignKey("project_objects.id"), primary_key=True)
+    status = Column(String, primary_key=True)  # Значение RemarkStatus
+    priority = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    overdue_count = Column(Integer, nullable=False, default=0)
+
 
 class RemarkPhoto(Base):
     """
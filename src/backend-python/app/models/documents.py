@@ -1,11 +1,27 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
 from typing import Optional
+from enum import Enum
 from ..database import Base
 
 
+class DocumentStatus(str, Enum):
+    """Статусы жизненного цикла документа"""
+    IN_OFFICE = "in_office"  # В ПТО
+    SHIPPED = "shipped"      # Отправлен получателю
+    RETURNED = "returned"    # Возвращен в ПТО
+
+
+# Допустимые переходы между статусами документа
+DOCUMENT_TRANSITIONS = {
+    DocumentStatus.IN_OFFICE.value: {DocumentStatus.SHIPPED.value},
+    DocumentStatus.SHIPPED.value: {DocumentStatus.RETURNED.value},
+    DocumentStatus.RETURNED.value: {DocumentStatus.SHIPPED.value},  # Повторная отправка
+}
+
+
 class DocumentType(Base):
     """
     Модель для справочника типов документов
@@ -34,10 +50,20 @@ class Document(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Последняя отправка и последний возврат (денормализация для реестра,
+    # поддерживается CRUD функциями отправок и возвратов)
+    last_shipment_id = Column(Integer, nullable=True)
+    last_shipment_date = Column(DateTime, nullable=True)
+    last_shipment_recipient = Column(String, nullable=True)
+    last_return_id = Column(Integer, nullable=True)
+    last_return_date = Column(DateTime, nullable=True)
+    last_return_condition = Column(String, nullable=True)
+
     # Связи
     type = relationship("DocumentType", back_populates="documents")
     shipments = relationship("DocumentShipment", back_populates="document")
     returns = relationship("DocumentReturn", back_populates="document")
+    status_history = relationship("DocumentStatusHistory", back_populates="document", cascade="all, delete-orphan")
 
 
 class DocumentShipment(Base):
@@ -47,7 +73,7 @@ class DocumentShipment(Base):
     __tablename__ = "document_shipments"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
     recipient = Column(String, nullable=False)           # Получатель
     shipment_date = Column(DateTime, nullable=False)     # Дата отправки
     notes = Column(Text, nullable=True)                  # Примечания
@@ -64,7 +90,7 @@ class DocumentReturn(Base):
     __tablename__ = "document_returns"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True, nullable=False)
     return_date = Column(DateTime, nullable=False)       # Дата возврата
     condition = Column(String, nullable=False)           # Состояние документа при возврате
     notes = Column(Text, nullable=True)                  # Примечания
@@ -74,5 +100,49 @@ class DocumentReturn(Base):
     document = relationship("Document", back_populates="returns")
 
 
+class DocumentStatusHistory(Base):
+    """
+    Модель для хранения истории статусов документа (переходы автомата состояний)
+    """
+    __tablename__ = "document_status_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    old_status = Column(String, nullable=True)           # Предыдущий статус (None - документ создан)
+    new_status = Column(String, nullable=False)          # Новый статус
+    recipient = Column(String, index=True, nullable=True)  # Получатель (для отправки)
+    shipment_id = Column(Integer, nullable=True)         # Отправка, выполнившая переход
+    return_id = Column(Integer, nullable=True)           # Возврат, выполнивший переход
+    changed_by = Column(String, nullable=True)           # Кто изменил
+    changed_at = Column(DateTime, nullable=False)        # Время перехода (дата отправки/возврата)
+    recorded_at = Column(DateTime(timezone=True), server_default=func.now())  # Когда переход записан
+
+    __table_args__ = (
+        # Переходы документа по времени (LEAD по документу в аналитике)
+        Index("ix_document_status_history_document_id_changed_at", "document_id", "changed_at"),
+    )
+
+    # Связи
+    document = relationship("Document", back_populates="status_history")
+
+
+class LegacyDocumentMap(Base):
+    """
+    Соответствие записей реестра ПТО (pto_docs.db) записям бэкенда после переноса
+    """
+    __tablename__ = "legacy_document_map"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)              # documents, shipments, returns
+    legacy_id = Column(Integer, nullable=False)          # ID в pto_docs.db
+    new_id = Column(Integer, nullable=False)             # ID в БД бэкенда
+    migrated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Повторный перенос пропускает уже перенесенные записи
+        UniqueConstraint("entity", "legacy_id", name="uq_legacy_document_map_entity_legacy_id"),
+    )
+
+
 # Добавим связи в DocumentType
 DocumentType.documents = relationship("Document", back_populates="type")
\ No newline at end of file
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class OutboxJob(Base):
+    """
+    Фоновая задача (transactional outbox).
+
+    Строка добавляется в той же транзакции, что и основное изменение,
+    поэтому задача появляется только после успешного COMMIT запроса.
+    Выполняет задачи app.outbox.OutboxWorker.
+    """
+    __tablename__ = "outbox_jobs"
+
+    id = Column(Integer, primary_key=True)
+    job_type = Column(String, nullable=False)                     # Тип задачи (имя обработчика)
+    payload = Column(Text, nullable=False, default="{}")          # Параметры задачи (JSON)
+    idempotency_key = Column(String, unique=True, nullable=True)  # Ключ для исключения повторной постановки
+    status = Column(String, nullable=False, default="pending")    # pending, processing, done, dead
+    attempts = Column(Integer, nullable=False, default=0)         # Число выполненных попыток
+    max_attempts = Column(Integer, nullable=False, default=5)     # После стольких ошибок задача - dead
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # Не раньше этого времени
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Аренда задачи воркером
+    last_error = Column(Text, nullable=True)                      # Ошибка последней попытки
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Выбор задач, готовых к выполнению
+        Index("ix_outbox_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class ScanWatermark(Base):
+    """
+    Отметка периодической фоновой задачи: до какого момента данные уже обработаны.
+
+    Следующий запуск задачи обрабатывает только то, что появилось после
+    отметки (например, замечания, срок которых наступил после прошлой проверки).
+    """
+    __tablename__ = "scan_watermarks"
+
+    name = Column(String, primary_key=True)             # Имя задачи
+    watermark = Column(DateTime, nullable=False)        # Обработано до этого момента (UTC)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
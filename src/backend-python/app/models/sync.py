@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from ..database import Base
+
+
+class ChangeLog(Base):
+    """
+    Журнал изменений для инкрементальной синхронизации клиентов (GET /api/sync).
+
+    Строка добавляется в той же транзакции, что и изменение записи;
+    id служит токеном синхронизации. Для удаленных записей остается
+    строка с operation="delete" (tombstone).
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)                 # Тип записи: documents, shipments, returns, remarks, ...
+    entity_id = Column(Integer, nullable=False)             # ID измененной записи
+    operation = Column(String, nullable=False)              # create, update, delete
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        # Последнее изменение записей одного типа (ETag списков)
+        Index("ix_change_log_entity_id", "entity", "id"),
+    )
+
+
+# Таблицы, изменения которых попадают в журнал, и имена сущностей в ответе /api/sync
+# (files - только для ETag списка файлов, в /api/sync не передаются)
+TRACKED_TABLES = {
+    "documents": "documents",
+    "document_shipments": "shipments",
+    "document_returns": "returns",
+    "construction_remarks": "remarks",
+    "remark_photos": "remark_photos",
+    "uploaded_files": "files",
+    "gpr_records": "gpr_records",
+    "material_stocks": "stocks",
+}
+
+
+def _tracked_entity(obj):
+    return TRACKED_TABLES.get(getattr(obj, "__tablename__", None))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session, flush_context):
+    """Записать изменения отслеживаемых записей в журнал в той же транзакции"""
+    rows = []
+    for objects, operation in ((session.new, "create"), (session.dirty, "update"), (session.deleted, "delete")):
+        for obj in objects:
+            entity = _tracked_entity(obj)
+            if entity is None:
+                continue
+            if operation == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({"entity": entity, "entity_id": obj.id, "operation": operation})
+    if rows:
+        session.connection().execute(ChangeLog.__table__.insert(), rows)
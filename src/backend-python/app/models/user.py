@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import Optional
@@ -36,11 +36,63 @@ class UserSession(Base):
     __tablename__ = "user_sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    session_token = Column(String, unique=True, index=True, nullable=False)  # Токен сессии
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=True)   # NULL - пользователь удален, сессия отозвана
+    session_token = Column(String, unique=True, index=True, nullable=False)  # Идентификатор (jti) актуального refresh токена
     expires_at = Column(DateTime, nullable=False)                             # Время истечения
+    is_revoked = Column(Boolean, default=False, index=True)                   # Отозвана ли сессия
+    revoked_at = Column(DateTime, nullable=True)                              # Когда сессия отозвана
+    user_agent = Column(String, nullable=True)                                # Клиент, открывший сессию
+    ip_address = Column(String, nullable=True)                                # IP адрес клиента
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_activity = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Связи
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+
+class Role(Base):
+    """
+    Модель роли пользователя
+    """
+    __tablename__ = "roles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)     # Название роли
+    description = Column(String, nullable=True)                        # Описание роли
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Связи
+    permissions = relationship("RolePermission", back_populates="role", cascade="all, delete-orphan")
+
+
+class RolePermission(Base):
+    """
+    Модель права доступа, выданного роли
+    """
+    __tablename__ = "role_permissions"
+    __table_args__ = (UniqueConstraint("role_id", "permission", name="uq_role_permission"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    role_id = Column(Integer, ForeignKey("roles.id"), index=True, nullable=False)
+    permission = Column(String, nullable=False)                        # Имя права (см. app.permissions.Permission)
+
+    # Связи
+    role = relationship("Role", back_populates="permissions")
+
+
+class UserRole(Base):
+    """
+    Модель назначения роли пользователю
+    """
+    __tablename__ = "user_roles"
+    __table_args__ = (UniqueConstraint("user_id", "role_id", name="uq_user_role"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    role_id = Column(Integer, ForeignKey("roles.id"), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Связи
+    user = relationship("User")
+    role = relationship("Role")
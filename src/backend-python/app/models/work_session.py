@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Time
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index, Time
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import Optional
@@ -19,5 +19,10 @@ class WorkSession(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Сессии пользователя по времени начала (выборка за день, последние сессии)
+        Index("ix_work_sessions_user_id_start_time", "user_id", "start_time"),
+    )
+
     # Связи
     user = relationship("User")
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""
+Фоновые задачи через transactional outbox.
+
+Побочные действия запроса (проверка материалов, создание запросов на
+закупку, будущие уведомления по почте) не выполняются в обработчике:
+enqueue добавляет строку outbox_jobs в транзакцию запроса, а воркер
+выполняет задачу после COMMIT. Откат запроса отменяет и задачу.
+
+Воркер:
+    - в процессе приложения (OUTBOX_WORKER_ENABLED=True, по умолчанию);
+      запускается при старте и просыпается сразу после COMMIT с новыми задачами
+    - отдельным процессом: python -m app.outbox (тогда в приложении
+      OUTBOX_WORKER_ENABLED=False)
+
+Задача захватывается условным UPDATE (status, attempts), поэтому
+несколько воркеров не выполнят ее одновременно. Результат обработчика и
+отметка done фиксируются одной транзакцией; если аренда истекла и задачу
+перехватил другой воркер, изменения обработчика откатываются. Ошибка
+переводит задачу в pending с экспоненциальной задержкой, после
+max_attempts попыток - в dead. idempotency_key исключает повторную
+постановку одной и той же задачи.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "True").lower() == "true"
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "10"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+# Время, на которое воркер захватывает задачу; по истечении задачу может взять другой воркер
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+# Срок хранения выполненных задач
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+outbox_jobs_total = registry.register(Counter(
+    "outbox_jobs_total", "Выполнение фоновых задач", ("job_type", "result")))
+
+JobHandler = Callable[[Session, Dict[str, Any]], None]
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str):
+    """Декоратор: обработчик задачи типа job_type, вызывается как handler(db, payload)"""
+    def decorator(handler: JobHandler) -> JobHandler:
+        _handlers[job_type] = handler
+        return handler
+    return decorator
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    payload: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None,
+    delay: float = 0,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS
+) -> models.OutboxJob:
+    """
+    Поставить задачу в транзакции сессии db.
+
+    Если задача с тем же idempotency_key уже поставлена, возвращается она.
+    """
+    if idempotency_key:
+        # Задача могла быть поставлена в этой же транзакции (еще без flush)
+        for pending in db.new:
+            if isinstance(pending, models.OutboxJob) and pending.idempotency_key == idempotency_key:
+                return pending
+        existing = db.query(models.OutboxJob).filter(models.OutboxJob.idempotency_key == idempotency_key).first()
+        if existing:
+            return existing
+
+    job = models.OutboxJob(
+        job_type=job_type,
+        payload=json.dumps(payload or {}, default=str),
+        idempotency_key=idempotency_key,
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=_utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    db.info["outbox_enqueued"] = True
+    return job
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _wake_worker(session):
+    if session.info.pop("outbox_enqueued", False):
+        worker.wake()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_wake(session):
+    session.info.pop("outbox_enqueued", None)
+
+
+def retry_delay(attempts: int) -> float:
+    """Задержка перед повторной попыткой: экспоненциальная, со случайным разбросом"""
+    delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _ready_condition(now: datetime):
+    job = models.OutboxJob
+    return or_(
+        and_(job.status == "pending", job.run_after <= now),
+        # Воркер, захвативший задачу, завершился, не освободив ее
+        and_(job.status == "processing", job.locked_until < now),
+    )
+
+
+class OutboxWorker:
+    """Выборка и выполнение задач outbox_jobs"""
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def run_pending(self) -> int:
+        """Выполнить готовые задачи (не более batch_size); возвращает число обработанных"""
+        processed = 0
+        while processed < self.batch_size:
+            job = self._claim()
+            if job is None:
+                break
+            self._execute(*job)
+            processed += 1
+        return processed
+
+    def _claim(self):
+        db = self.session_factory()
+        try:
+            now = _utcnow()
+            candidates = db.query(models.OutboxJob.id).filter(_ready_condition(now))\
+                .order_by(models.OutboxJob.id).limit(self.batch_size).all()
+            for (job_id,) in candidates:
+                claimed = db.query(models.OutboxJob).filter(
+                    models.OutboxJob.id == job_id, _ready_condition(now)
+                ).update({
+                    models.OutboxJob.status: "processing",
+                    models.OutboxJob.attempts: models.OutboxJob.attempts + 1,
+                    models.OutboxJob.locked_until: now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                }, synchronize_session=False)
+                if claimed:
+                    job = db.query(models.OutboxJob).filter(models.OutboxJob.id == job_id).one()
+                    result = (job.id, job.job_type, job.payload, job.attempts, job.max_attempts)
+                    db.commit()
+                    return result
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def _execute(self, job_id: int, job_type: str, payload: str, attempts: int, max_attempts: int):
+        handler = _handlers.get(job_type)
+        if handler is None:
+            self._fail(job_id, job_type, attempts, max_attempts, f"Неизвестный тип задачи {job_type}", retry=False)
+            return
+
+        db = self.session_factory()
+        try:
+            handler(db, json.loads(payload or "{}"))
+            # Отметка выполнения фиксируется вместе с изменениями обработчика
+            finished = db.query(models.OutboxJob).filter(
+                models.OutboxJob.id == job_id,
+                models.OutboxJob.status == "processing",
+                models.OutboxJob.attempts == attempts
+            ).update({
+                models.OutboxJob.status: "done",
+                models.OutboxJob.locked_until: None,
+                models.OutboxJob.last_error: None,
+                models.OutboxJob.finished_at: _utcnow(),
+            }, synchronize_session=False)
+            if not finished:
+                db.rollback()
+                logger.warning(f"Задача {job_id} ({job_type}) перехвачена другим воркером, результат отменен")
+                return
+            db.commit()
+            outbox_jobs_total.inc(job_type=job_type, result="done")
+        except Exception as e:  # pylint: disable=broad-except
+            db.rollback()
+            logger.exception(f"Ошибка выполнения задачи {job_id} ({job_type})")
+            self._fail(job_id, job_type, attempts, max_attempts, f"{type(e).__name__}: {e}")
+        finally:
+            db.close()
+
+    def _fail(self, job_id: int, job_type: str, attempts: int, max_attempts: int, error: str, retry: bool = True):
+        dead = not retry or attempts >= max_attempts
+        values = {
+            models.OutboxJob.status: "dead" if dead else "pending",
+            models.OutboxJob.locked_until: None,
+            models.OutboxJob.last_error: error[:2000],
+        }
+        if dead:
+            values[models.OutboxJob.finished_at] = _utcnow()
+        else:
+            values[models.OutboxJob.run_after] = _utcnow() + timedelta(seconds=retry_delay(attempts))
+
+        db = self.session_factory()
+        try:
+            db.query(models.OutboxJob).filter(
+                models.OutboxJob.id == job_id,
+                models.OutboxJob.attempts == attempts
+            ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        outbox_jobs_total.inc(job_type=job_type, result="dead" if dead else "retry")
+        if dead:
+            logger.error(f"Задача {job_id} ({job_type}) не выполнена после {attempts} попыток: {error}")
+
+    def wake(self):
+        """Проверить задачи, не дожидаясь интервала опроса (из любого потока)"""
+        loop, wake_event = self._loop, self._wake_event
+        if loop is None or wake_event is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(wake_event.set)
+
+    def start(self):
+        """Запустить воркер в цикле событий приложения"""
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._loop, self._wake_event = None, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        loop, wake_event = self._loop, self._wake_event
+        while True:
+            wake_event.clear()
+            try:
+                # Обработчики выполняют запросы к БД, не блокируем цикл событий
+                processed = await loop.run_in_executor(None, self.run_pending)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Ошибка воркера фоновых задач")
+                processed = 0
+            if processed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(wake_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker = OutboxWorker()
+
+
+def prune_finished_jobs(db: Session, retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """Удалить выполненные задачи старше срока хранения (dead остаются для разбора)"""
+    cutoff = _utcnow() - timedelta(days=retention_days)
+    return db.query(models.OutboxJob).filter(
+        models.OutboxJob.status == "done",
+        models.OutboxJob.finished_at < cutoff
+    ).delete(synchronize_session=False)
+
+
+def main():
+    """Отдельный процесс воркера: python -m app.outbox [--once]"""
+    import argparse
+
+    from . import events
+    from .backplane import InMemoryBackplane, create_backplane
+    # Регистрация обработчиков задач
+    from .utils import document_movements, material_checker, remark_deadlines  # noqa: F401
+
+    parser = argparse.ArgumentParser(description="Воркер фоновых задач (outbox)")
+    parser.add_argument("--once", action="store_true", help="выполнить готовые задачи и завершиться")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # События задач (например, эскалация просроченных замечаний) доставляют процессы приложения
+    backplane = create_backplane()
+    if isinstance(backplane, InMemoryBackplane):
+        logger.warning("Шина событий в памяти процесса: события фоновых задач не дойдут до приложения, "
+                       "задайте REALTIME_BACKPLANE=redis или postgres")
+    events.start_publisher(backplane)
+
+    runner = OutboxWorker()
+    try:
+        while True:
+            processed = runner.run_pending()
+            if args.once and processed < runner.batch_size:
+                break
+            if processed < runner.batch_size:
+                time.sleep(runner.poll_interval)
+    finally:
+        events.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Permission flags, compilation of permission sets into a bitmask and the
+`require` dependency used by API routers.
+
+The bitmask is computed once at login/refresh and embedded in the access
+token, so every permission check is a single bitwise AND without any
+database access.
+"""
+import ast
+import json
+from enum import IntFlag
+from typing import Iterable, Mapping, Optional
+
+from fastapi import Depends, HTTPException, status
+
+from .auth import get_current_user
+
+
+class Permission(IntFlag):
+    """Permission flags. Never reorder: bit positions are stored in tokens."""
+    DOCUMENTS_READ = 1 << 0
+    DOCUMENTS_WRITE = 1 << 1
+    DOCUMENTS_DELETE = 1 << 2
+    FILES_READ = 1 << 3
+    FILES_WRITE = 1 << 4
+    FILES_DELETE = 1 << 5
+    GPR_READ = 1 << 6
+    GPR_WRITE = 1 << 7
+    GPR_DELETE = 1 << 8
+    REMARKS_READ = 1 << 9
+    REMARKS_WRITE = 1 << 10
+    REMARKS_DELETE = 1 << 11
+    MATERIALS_MANAGE = 1 << 12
+    USERS_MANAGE = 1 << 13
+
+
+ALL_PERMISSIONS = Permission(sum(Permission.__members__.values()))
+
+# Permissions of a user without any assigned roles (matches the behaviour
+# before roles existed: any authenticated user could read and edit)
+DEFAULT_PERMISSIONS = (
+    Permission.DOCUMENTS_READ | Permission.DOCUMENTS_WRITE
+    | Permission.FILES_READ | Permission.FILES_WRITE
+    | Permission.GPR_READ | Permission.GPR_WRITE
+    | Permission.REMARKS_READ | Permission.REMARKS_WRITE
+)
+
+# Legacy keys of User.permissions mapped to permission flags
+LEGACY_PERMISSION_KEYS = {
+    "admin": ALL_PERMISSIONS,
+    "manage_users": Permission.USERS_MANAGE,
+    "manage_documents": (
+        Permission.DOCUMENTS_READ | Permission.DOCUMENTS_WRITE | Permission.DOCUMENTS_DELETE
+        | Permission.FILES_READ | Permission.FILES_WRITE | Permission.FILES_DELETE
+    ),
+    "manage_materials": Permission.MATERIALS_MANAGE,
+}
+
+# Roles created at startup if missing
+DEFAULT_ROLES = {
+    "admin": ("Полный доступ", ALL_PERMISSIONS),
+    "employee": ("Сотрудник: чтение и редактирование", DEFAULT_PERMISSIONS),
+}
+
+
+def permission_names(mask: int) -> list:
+    """Decode bitmask into a list of permission names"""
+    return [name.lower() for name, flag in Permission.__members__.items() if mask & flag]
+
+
+def parse_permission_name(name: str) -> Permission:
+    """Convert permission name (e.g. "documents_read") to a flag"""
+    try:
+        return Permission[name.upper()]
+    except KeyError:
+        raise ValueError(f"Неизвестное право доступа: {name}")
+
+
+def compile_permissions(names: Iterable[str]) -> int:
+    """Compile permission names into a bitmask, ignoring unknown names"""
+    mask = 0
+    for name in names:
+        flag = Permission.__members__.get(name.upper())
+        if flag is not None:
+            mask |= flag
+    return mask
+
+
+def parse_legacy_permissions(raw: Optional[str]) -> dict:
+    """
+    Parse User.permissions. New rows are stored as JSON; rows created
+    earlier were stored as str(dict), i.e. a Python repr.
+    """
+    if not raw:
+        return {}
+    try:
+        value = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        try:
+            value = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def compile_legacy_permissions(permissions: Mapping) -> int:
+    """Compile legacy permission dict ({"manage_documents": True, ...}) into a bitmask"""
+    mask = 0
+    for key, enabled in permissions.items():
+        if not enabled:
+            continue
+        if key in LEGACY_PERMISSION_KEYS:
+            mask |= LEGACY_PERMISSION_KEYS[key]
+        else:
+            mask |= compile_permissions([key])
+    return mask
+
+
+def require(permission: Permission):
+    """
+    FastAPI dependency checking that the current user holds `permission`.
+
+    Uses the bitmask from the access token; role changes take effect on the
+    next token refresh.
+    """
+    required = int(permission)
+
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        if current_user.get("permission_mask", 0) & required != required:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Недостаточно прав для выполнения операции"
+            )
+        return current_user
+
+    return dependency
@@ -0,0 +1,390 @@
+"""
+Профилирование HTTP запросов: число SQL запросов, время в БД и медленные запросы.
+
+ProfilerMiddleware создает для каждого запроса RequestProfile и кладет его
+в contextvar; обработчики событий SQLAlchemy (на всех движках) учитывают
+в нем каждое выражение. Контекст копируется в пул потоков, поэтому
+синхронные эндпоинты и зависимости учитываются так же, как асинхронные.
+
+Результаты:
+    - заголовок Server-Timing (db, app) в каждом ответе;
+    - скользящие перцентили длительности и числа запросов по маршрутам
+      и журнал медленных SQL выражений для /debug/profile;
+    - для доли запросов PROFILE_SAMPLE_RATE - профиль cProfile или
+      pyinstrument (PROFILER_BACKEND) вызова эндпоинта.
+"""
+import asyncio
+import cProfile
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Deque, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True").lower() == "true"
+# SQL выражения дольше порога попадают в журнал медленных запросов, мс
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Предупреждение в лог, если запрос к API выполнил больше SQL выражений
+PROFILE_QUERY_WARN = int(os.getenv("PROFILE_QUERY_WARN", "50"))
+# Число последних запросов по маршруту для расчета перцентилей
+PROFILE_WINDOW = int(os.getenv("PROFILE_WINDOW", "1000"))
+# Доля запросов, для которых снимается профиль вызова эндпоинта (0 - отключено)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Профилировщик для выборочных запросов: cprofile или pyinstrument
+PROFILER_BACKEND = os.getenv("PROFILER_BACKEND", "cprofile").lower()
+
+# Сколько самых медленных выражений хранить для запроса и глобально
+REQUEST_SLOWEST_LIMIT = 5
+SLOW_QUERY_LOG_SIZE = 100
+PROFILE_SAMPLES_SIZE = 20
+MAX_PARAMS_LENGTH = 500
+
+
+class RequestProfile:
+    """Статистика БД одного HTTP запроса"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.query_count = 0
+        self.db_time = 0.0
+        # (длительность, выражение, параметры), по убыванию длительности
+        self.slowest: List[tuple] = []
+        # Снимать профиль вызова эндпоинта; отчет профилировщика
+        self.sampled = False
+        self.sample: Optional[str] = None
+
+    @property
+    def route(self) -> str:
+        """Шаблон маршрута (GET /api/documents/{document_id}), известен после маршрутизации"""
+        return f"{self.scope.get('method', '')} {route_template(self.scope)}"
+
+    def add_query(self, duration: float, statement: str, parameters):
+        self.query_count += 1
+        self.db_time += duration
+        if len(self.slowest) < REQUEST_SLOWEST_LIMIT or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement, parameters))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[REQUEST_SLOWEST_LIMIT:]
+
+
+# Эндпоинт -> шаблон пути; заполняется ProfiledRoute при регистрации маршрутов
+_route_paths: Dict[Callable, str] = {}
+# Запросы вне маршрутов API (статика, 404) объединяются, чтобы не плодить метрики
+UNMATCHED_ROUTE = "[unmatched]"
+
+def route_template(scope: dict) -> str:
+    """Шаблон пути маршрута, обработавшего запрос, или UNMATCHED_ROUTE"""
+    return _route_paths.get(scope.get("endpoint")) or UNMATCHED_ROUTE
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Профиль текущего HTTP запроса (None вне запроса)"""
+    return _current_profile.get()
+
+
+def _format_parameters(parameters) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_PARAMS_LENGTH:
+        text = text[:MAX_PARAMS_LENGTH] + "..."
+    return text
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class RouteStats:
+    """Скользящее окно последних запросов одного маршрута"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.db_times: Deque[float] = deque(maxlen=window)
+        self.query_counts: Deque[int] = deque(maxlen=window)
+
+    def add(self, duration: float, profile: RequestProfile, status_code: int):
+        self.count += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.durations.append(duration)
+        self.db_times.append(profile.db_time)
+        self.query_counts.append(profile.query_count)
+
+    def summary(self) -> dict:
+        durations = sorted(self.durations)
+        db_times = sorted(self.db_times)
+        queries = list(self.query_counts)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "duration_ms": {
+                "p50": round(_percentile(durations, 50) * 1000, 2),
+                "p95": round(_percentile(durations, 95) * 1000, 2),
+                "p99": round(_percentile(durations, 99) * 1000, 2),
+                "max": round(durations[-1] * 1000, 2) if durations else 0.0,
+            },
+            "db_ms": {
+                "p50": round(_percentile(db_times, 50) * 1000, 2),
+                "p95": round(_percentile(db_times, 95) * 1000, 2),
+            },
+            "queries": {
+                "avg": round(sum(queries) / len(queries), 2) if queries else 0.0,
+                "max": max(queries) if queries else 0,
+            },
+        }
+
+
+class Profiler:
+    """Хранилище статистики по маршрутам, медленных запросов и профилей"""
+
+    def __init__(self, window: int = PROFILE_WINDOW, slow_query_ms: float = SLOW_QUERY_MS,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, backend: str = PROFILER_BACKEND):
+        self.window = window
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.sample_rate = sample_rate
+        self.backend = _resolve_backend(backend)
+        self.routes: Dict[str, RouteStats] = {}
+        self.slow_queries: Deque[dict] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self.samples: Deque[dict] = deque(maxlen=PROFILE_SAMPLES_SIZE)
+        self._sample_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record_query(self, profile: Optional[RequestProfile], duration: float, statement: str, parameters):
+        if profile is not None:
+            profile.add_query(duration, statement, parameters)
+        if duration >= self.slow_query_seconds:
+            route = profile.route if profile is not None else None
+            self.slow_queries.append({
+                "timestamp": datetime.now().isoformat(),
+                "route": route,
+                "duration_ms": round(duration * 1000, 2),
+                "statement": statement,
+                "parameters": _format_parameters(parameters),
+            })
+            logger.warning(f"Медленный SQL запрос ({duration * 1000:.1f} мс, {route}): {statement[:200]}")
+
+    def record_request(self, profile: RequestProfile, duration: float, status_code: int):
+        with self._lock:
+            stats = self.routes.get(profile.route)
+            if stats is None:
+                stats = self.routes[profile.route] = RouteStats(self.window)
+            stats.add(duration, profile, status_code)
+        if profile.query_count > PROFILE_QUERY_WARN:
+            slowest = profile.slowest[0][1][:200] if profile.slowest else ""
+            logger.warning(
+                f"{profile.route}: {profile.query_count} SQL запросов за один запрос к API "
+                f"({profile.db_time * 1000:.1f} мс в БД), самый долгий: {slowest}"
+            )
+        if profile.sample is not None:
+            self.samples.append({
+                "id": next(self._sample_ids),
+                "timestamp": datetime.now().isoformat(),
+                "route": profile.route,
+                "duration_ms": round(duration * 1000, 2),
+                "queries": profile.query_count,
+                "slowest_queries": [
+                    {"duration_ms": round(d * 1000, 2), "statement": st, "parameters": _format_parameters(pr)}
+                    for d, st, pr in profile.slowest
+                ],
+                "backend": self.backend,
+                "report": profile.sample,
+            })
+
+    def get_sample(self, sample_id: int) -> Optional[dict]:
+        for sample in self.samples:
+            if sample["id"] == sample_id:
+                return sample
+        return None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            routes = {route: stats.summary() for route, stats in self.routes.items()}
+        return {
+            "enabled": PROFILING_ENABLED,
+            "slow_query_ms": self.slow_query_seconds * 1000,
+            "sample_rate": self.sample_rate,
+            "profiler_backend": self.backend,
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["duration_ms"]["p95"], reverse=True)),
+            "slow_queries": list(reversed(self.slow_queries)),
+            "samples": [
+                {key: value for key, value in sample.items() if key != "report"}
+                for sample in reversed(self.samples)
+            ],
+        }
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+        self.slow_queries.clear()
+        self.samples.clear()
+
+
+def _resolve_backend(backend: str) -> str:
+    if backend == "pyinstrument":
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            logger.warning("PROFILER_BACKEND=pyinstrument, но пакет pyinstrument не установлен; используется cProfile")
+            return "cprofile"
+    return backend if backend in ("cprofile", "pyinstrument") else "cprofile"
+
+
+profiler = Profiler()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start_time"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_start_time", None)
+    if PROFILING_ENABLED and started is not None:
+        profiler.record_query(_current_profile.get(), time.perf_counter() - started, statement, parameters)
+
+
+class _Sampler:
+    """Профилировщик одного вызова эндпоинта (cProfile или pyinstrument)"""
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        if backend == "pyinstrument":
+            from pyinstrument import Profiler as InstrumentProfiler
+            self._profiler = InstrumentProfiler(async_mode="enabled")
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.backend == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> str:
+        if self.backend == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=True)
+        self._profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(40)
+        return output.getvalue()
+
+
+def _profiled_call(call: Callable) -> Callable:
+    """Обертка эндпоинта: профилирует вызов, если запрос попал в выборку"""
+    if asyncio.iscoroutinefunction(call):
+        @wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None or not profile.sampled:
+                return await call(*args, **kwargs)
+            sampler = _Sampler(profiler.backend)
+            sampler.start()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.sample = sampler.stop()
+
+        async_wrapper._profiled = True
+        return async_wrapper
+
+    @wraps(call)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None or not profile.sampled:
+            return call(*args, **kwargs)
+        sampler = _Sampler(profiler.backend)
+        sampler.start()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.sample = sampler.stop()
+
+    wrapper._profiled = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Маршрут, эндпоинт которого профилируется в выбранных запросах.
+
+    Синхронные эндпоинты FastAPI выполняет в пуле потоков, а cProfile
+    и pyinstrument профилируют только текущий поток, поэтому профилировщик
+    запускается внутри вызова эндпоинта, а не в middleware. Для асинхронных
+    эндпоинтов в профиль попадает и другая работа цикла событий во время await.
+    """
+
+    def get_route_handler(self) -> Callable:
+        # При include_router маршрут создается заново с полным путем и перезаписывает запись
+        _route_paths[self.endpoint] = self.path_format
+        call = self.dependant.call
+        if call is not None and not getattr(call, "_profiled", False):
+            self.dependant.call = _profiled_call(call)
+        return super().get_route_handler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware: профиль БД запроса, заголовок Server-Timing и статистика маршрутов"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+        profile.sampled = profiler.should_sample()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Фиксация транзакции (UnitOfWorkMiddleware) уже выполнена и учтена
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(profile, elapsed).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            profiler.record_request(profile, time.perf_counter() - started, status_code)
+
+
+def _server_timing(profile: RequestProfile, elapsed: float) -> str:
+    return (
+        f'db;dur={profile.db_time * 1000:.2f};desc="{profile.query_count} queries", '
+        f"app;dur={elapsed * 1000:.2f}"
+    )
@@ -8,7 +8,9 @@ from .documents import (
     Document, DocumentCreate, DocumentUpdate, DocumentDetailed,
     DocumentType, DocumentTypeCreate, DocumentTypeUpdate,
     DocumentShipment, DocumentShipmentCreate, DocumentShipmentUpdate,
-    DocumentReturn, DocumentReturnCreate, DocumentReturnUpdate
+    DocumentReturn, DocumentReturnCreate, DocumentReturnUpdate,
+    DocumentShipmentBulkCreate, DocumentReturnBulkCreate, DocumentBulkItemResult, DocumentBulkResult,
+    DocumentStatusHistory, RecipientTurnaround, StatusDuration
 )
 from .files import (
     FileCategory, FileCategoryCreate, FileCategoryUpdate,
@@ -17,8 +19,9 @@ from .files import (
     MaterialStock, MaterialStockCreate, MaterialStockUpdate
 )
 from .user import (
-    UserBase, UserCreate, UserUpdate, UserResponse,
-    UserLogin, Token, TokenData
+    UserBase, UserCreate, UserRegister, UserUpdate, UserResponse,
+    UserLogin, Token, TokenData, UserSessionResponse,
+    RoleBase, RoleCreate, RoleUpdate, RoleResponse
 )
 from .work_session import (
     WorkSessionBase, WorkSessionCreate, WorkSessionEnd, WorkSessionResponse,
@@ -27,5 +30,6 @@ from .work_session import (
 from .construction_remarks import (
     ConstructionRemark, ConstructionRemarkCreate, ConstructionRemarkUpdate, ConstructionRemarkWithDetails,
     RemarkPhoto, RemarkPhotoCreate, RemarkPhotoUpdate,
-    RemarkHistory, RemarkHistoryCreate, RemarkStatus
-)
\ No newline at end of file
+    RemarkHistory, RemarkHistoryCreate, RemarkStatus, RemarkSummary, OverdueRemark
+)
+from .sync import SyncEntityChanges, SyncResponse
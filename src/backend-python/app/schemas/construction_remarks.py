@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -45,6 +45,7 @@ class ConstructionRemarkUpdate(BaseModel):
 class ConstructionRemark(ConstructionRemarkBase):
     """Схема для чтения замечания"""
     id: int
+    is_overdue: bool = False
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -52,6 +53,20 @@ class ConstructionRemark(ConstructionRemarkBase):
         from_attributes = True
 
 
+class OverdueRemark(ConstructionRemark):
+    """Схема просроченного замечания"""
+    overdue_days: float  # На сколько дней просрочено
+
+
+class RemarkSummary(BaseModel):
+    """Схема сводки по замечаниям объекта проекта (из remark_counters)"""
+    project_object_id: int
+    total: int = 0
+    overdue: int = 0
+    by_status: Dict[str, int] = {}
+    by_priority: Dict[str, int] = {}
+
+
 class RemarkPhotoBase(BaseModel):
     """Базовая схема для фотографий замечаний"""
     remark_id: int
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -48,6 +48,11 @@ class Document(DocumentBase):
     status: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Последняя отправка и последний возврат
+    last_shipment_date: Optional[datetime] = None
+    last_shipment_recipient: Optional[str] = None
+    last_return_date: Optional[datetime] = None
+    last_return_condition: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -105,6 +110,37 @@ class DocumentReturn(DocumentReturnBase):
         from_attributes = True
 
 
+# Схемы для пакетной отправки и пакетного возврата документов
+BULK_MAX_DOCUMENTS = 500
+
+
+class DocumentShipmentBulkCreate(BaseModel):
+    document_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_DOCUMENTS)
+    recipient: str
+    shipment_date: datetime
+    notes: Optional[str] = None
+
+
+class DocumentReturnBulkCreate(BaseModel):
+    document_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_DOCUMENTS)
+    return_date: datetime
+    condition: str
+    notes: Optional[str] = None
+
+
+class DocumentBulkItemResult(BaseModel):
+    document_id: int
+    success: bool
+    id: Optional[int] = None         # ID созданной отправки или возврата
+    error: Optional[str] = None
+
+
+class DocumentBulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[DocumentBulkItemResult]
+
+
 # Расширенная схема документа с информацией о связях
 class DocumentDetailed(Document):
     type: DocumentType
@@ -112,4 +148,37 @@ class DocumentDetailed(Document):
     returns: List[DocumentReturn] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Схемы истории статусов и аналитики оборачиваемости документов
+class DocumentStatusHistory(BaseModel):
+    id: int
+    document_id: int
+    old_status: Optional[str] = None
+    new_status: str
+    recipient: Optional[str] = None
+    shipment_id: Optional[int] = None
+    return_id: Optional[int] = None
+    changed_by: Optional[str] = None
+    changed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DurationStats(BaseModel):
+    periods: int                      # Число периодов (отправок для получателя)
+    open: int                         # Из них еще не завершены (документ не возвращен)
+    avg_days: Optional[float] = None
+    median_days: Optional[float] = None
+    p75_days: Optional[float] = None
+    p90_days: Optional[float] = None
+    max_days: Optional[float] = None
+
+
+class RecipientTurnaround(DurationStats):
+    recipient: Optional[str] = None
+
+
+class StatusDuration(DurationStats):
+    status: str
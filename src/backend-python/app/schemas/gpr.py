@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, Dict, Any
 from datetime import datetime
+import json
 
 
 class GPRRecordBase(BaseModel):
@@ -34,6 +35,14 @@ class GPRRecord(GPRRecordBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    @field_validator("daily_data", mode="before")
+    @classmethod
+    def parse_daily_data(cls, value):
+        # В модели daily_data хранится строкой JSON
+        if isinstance(value, str):
+            return json.loads(value) if value else None
+        return value
+
     class Config:
         from_attributes = True
 
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List
+
+
+class SyncEntityChanges(BaseModel):
+    upserted: List[Any] = []  # Текущие версии созданных и измененных записей
+    deleted: List[int] = []   # ID удаленных записей (tombstones)
+
+
+class SyncResponse(BaseModel):
+    token: str                # Токен для следующего запроса (since)
+    has_more: bool = False    # Есть еще изменения - повторить запрос с новым токеном
+    full_resync: bool = False  # Нужна полная загрузка списков (первая синхронизация)
+    changes: Dict[str, SyncEntityChanges] = {}
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, field_validator
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+from ..permissions import parse_legacy_permissions
+
 
 # Базовая схема пользователя
 class UserBase(BaseModel):
@@ -20,6 +22,16 @@ class UserCreate(UserBase):
     password: str
 
 
+# Схема самостоятельной регистрации: без is_admin и прав, их назначает администратор
+class UserRegister(BaseModel):
+    username: str
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    position: Optional[str] = None
+    department: Optional[str] = None
+    password: str
+
+
 # Схема для обновления пользователя
 class UserUpdate(BaseModel):
     email: Optional[str] = None
@@ -39,6 +51,14 @@ class UserResponse(UserBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
 
+    @field_validator("permissions", mode="before")
+    @classmethod
+    def parse_permissions(cls, value):
+        # В базе права хранятся строкой
+        if isinstance(value, str):
+            return parse_legacy_permissions(value)
+        return value
+
     class Config:
         from_attributes = True
 
@@ -54,6 +74,23 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    refresh_token: Optional[str] = None
+
+
+# Схема сессии пользователя (для администраторов)
+class UserSessionResponse(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    expires_at: datetime
+    is_revoked: bool
+    revoked_at: Optional[datetime] = None
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    created_at: Optional[datetime] = None
+    last_activity: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 # Схема данных токена
@@ -61,4 +98,24 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     user_id: Optional[int] = None
     is_admin: Optional[bool] = None
-    permissions: Optional[Dict[str, Any]] = {}
\ No newline at end of file
+    permissions: Optional[Dict[str, Any]] = {}
+
+
+# Схемы ролей
+class RoleBase(BaseModel):
+    name: str
+    description: Optional[str] = None
+    permissions: List[str] = []
+
+
+class RoleCreate(RoleBase):
+    pass
+
+
+class RoleUpdate(BaseModel):
+    description: Optional[str] = None
+    permissions: Optional[List[str]] = None
+
+
+class RoleResponse(RoleBase):
+    id: int
@@ -0,0 +1,150 @@
+"""
+Быстрая сериализация больших списков в JSON.
+
+FastAPI проверяет каждую ORM запись схемой response_model (from_attributes)
+и затем кодирует результат; на страницах в сотни записей это основная
+нагрузка на CPU. list_response выбирает из БД только колонки схемы
+(кортежи вместо ORM объектов), приводит значения к типам полей схемы и
+кодирует список orjson (при отсутствии пакета - стандартным json).
+Эндпоинт возвращает готовый Response, а response_model в декораторе
+по-прежнему описывает ответ в OpenAPI.
+
+FAST_JSON_LISTS=False возвращает обычный путь через Pydantic (тот же
+ответ, для сравнения и отката).
+"""
+import json
+import os
+import typing
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Query
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+FAST_JSON_LISTS = os.getenv("FAST_JSON_LISTS", "True").lower() == "true"
+
+Converter = Callable[[Any], Any]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+            return value.replace(tzinfo=None).isoformat() + "Z"
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается")
+
+
+def dumps(data) -> bytes:
+    """JSON в том же виде, что и у Pydantic (UTC как Z)"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json_field(value):
+    """Конвертер для колонок, хранящих JSON строкой (например GPRRecord.daily_data)"""
+    if isinstance(value, str):
+        return (orjson.loads(value) if orjson is not None else json.loads(value)) if value else None
+    return value
+
+
+def _to_str(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _to_float(value):
+    return value if value is None or isinstance(value, float) else float(value)
+
+
+def _field_converter(annotation) -> Optional[Converter]:
+    # Optional[X] -> X
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            annotation = args[0]
+    if annotation is str:
+        return _to_str
+    if annotation is float:
+        return _to_float
+    return None
+
+
+class RowSerializer:
+    """Сериализация строк модели по полям схемы без создания ORM объектов и моделей Pydantic"""
+
+    def __init__(self, model, schema, converters: Optional[Dict[str, Converter]] = None):
+        converters = converters or {}
+        self.names: List[str] = list(schema.model_fields)
+        self.columns = [getattr(model, name) for name in self.names]
+        self.converters: List[Tuple[int, Converter]] = []
+        for index, (name, field) in enumerate(schema.model_fields.items()):
+            converter = converters.get(name) or _field_converter(field.annotation)
+            if converter is not None:
+                self.converters.append((index, converter))
+
+    def rows(self, query: Query) -> List[dict]:
+        names, converters = self.names, self.converters
+        result = []
+        for row in query.with_entities(*self.columns):
+            if converters:
+                row = list(row)
+                for index, converter in converters:
+                    row[index] = converter(row[index])
+            result.append(dict(zip(names, row)))
+        return result
+
+    def dumps(self, query: Query) -> bytes:
+        return dumps(self.rows(query))
+
+
+_serializers: Dict[tuple, RowSerializer] = {}
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def row_serializer(model, schema, converters: Optional[Dict[str, Converter]] = None) -> RowSerializer:
+    key = (model, schema)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = RowSerializer(model, schema, converters)
+    return serializer
+
+
+def serialize_validated(response_type, data) -> bytes:
+    """Проверить данные схемой (как response_model в FastAPI) и сериализовать в JSON"""
+    adapter = _adapters.get(response_type)
+    if adapter is None:
+        adapter = _adapters[response_type] = TypeAdapter(response_type)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def list_response(
+    query: Query,
+    schema,
+    headers: Optional[dict] = None,
+    converters: Optional[Dict[str, Converter]] = None
+) -> Response:
+    """
+    Ответ со списком записей запроса query (с фильтрами, offset и limit) по схеме schema.
+
+    converters - преобразования колонок, которые схема выполняет валидаторами.
+    """
+    if FAST_JSON_LISTS:
+        model = query.column_descriptions[0]["entity"]
+        body = row_serializer(model, schema, converters).dumps(query)
+    else:
+        body = serialize_validated(List[schema], query.all())
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -5,6 +5,7 @@ from typing import List
 
 from .. import crud, models, schemas
 from ..database import get_db
+from ..metrics import material_requests_created_total
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,7 @@ class MaterialNotificationService:
             if not existing_requests:
                 # Создаем новый запрос на закупку
                 new_request = crud.create_material_request(self.db, request_data)
+                material_requests_created_total.inc(reason="low_stock")
                 
                 notification = {
                     "material_name": material.name,
@@ -100,6 +102,7 @@ class MaterialNotificationService:
                         )
                         
                         new_request = crud.create_material_request(self.db, request_data)
+                        material_requests_created_total.inc(reason="section_shortage")
                         
                         notification = {
                             "section_id": section_id,
@@ -134,6 +137,7 @@ class MaterialNotificationService:
                 )
                 
                 new_request = crud.create_material_request(self.db, request_data)
+                material_requests_created_total.inc(reason="section_no_stock")
                 
                 notification = {
                     "section_id": section_id,
@@ -151,47 +155,39 @@ class MaterialNotificationService:
     
     def reserve_materials_for_section(self, section_id: str, material_requirements: dict) -> bool:
         """
-        Резервирует материалы для определенной секции
+        Резервирует материалы для определенной секции.
+        Сначала проверяется наличие всех материалов, затем выполняется резерв,
+        поэтому при нехватке одного материала остальные не резервируются.
         """
-        try:
-            for material_id, quantity in material_requirements.items():
-                stock = crud.get_material_stock_by_material(self.db, material_id)
-                
-                if stock:
-                    available = stock.quantity - stock.reserved_quantity
-                    if available >= quantity:
-                        # Резервируем материалы
-                        stock.reserved_quantity += quantity
-                        self.db.commit()
-                        logger.info(f"Зарезервировано {quantity} единиц материала {material_id} для секции {section_id}")
-                    else:
-                        logger.warning(f"Недостаточно материалов {material_id} для резервирования в секции {section_id}")
-                        return False
-                else:
-                    logger.warning(f"Нет информации о складском запасе материала {material_id}")
-                    return False
-            
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при резервировании материалов: {str(e)}")
-            self.db.rollback()
-            return False
+        stocks = {}
+        for material_id, quantity in material_requirements.items():
+            stock = crud.get_material_stock_by_material(self.db, material_id)
+            if not stock:
+                logger.warning(f"Нет информации о складском запасе материала {material_id}")
+                return False
+            if stock.quantity - stock.reserved_quantity < quantity:
+                logger.warning(f"Недостаточно материалов {material_id} для резервирования в секции {section_id}")
+                return False
+            stocks[material_id] = stock
+        
+        for material_id, quantity in material_requirements.items():
+            # Резервируем материалы
+            stocks[material_id].reserved_quantity += quantity
+            logger.info(f"Зарезервировано {quantity} единиц материала {material_id} для секции {section_id}")
+        self.db.flush()
+        return True
     
     def release_reserved_materials(self, section_id: str, material_requirements: dict):
         """
         Освобождает зарезервированные материалы
         """
-        try:
-            for material_id, quantity in material_requirements.items():
-                stock = crud.get_material_stock_by_material(self.db, material_id)
-                
-                if stock and stock.reserved_quantity >= quantity:
-                    stock.reserved_quantity -= quantity
-                    self.db.commit()
-                    logger.info(f"Освобождено {quantity} единиц материала {material_id} из резерва")
-        except Exception as e:
-            logger.error(f"Ошибка при освобождении зарезервированных материалов: {str(e)}")
-            self.db.rollback()
+        for material_id, quantity in material_requirements.items():
+            stock = crud.get_material_stock_by_material(self.db, material_id)
+            
+            if stock and stock.reserved_quantity >= quantity:
+                stock.reserved_quantity -= quantity
+                logger.info(f"Освобождено {quantity} единиц материала {material_id} из резерва")
+        self.db.flush()
 
 
 # Функция для периодической проверки остатков (может быть вызвана из внешнего планировщика)
@@ -212,6 +208,7 @@ def run_material_check():
                 print(f"- {notification['message']}")
         else:
             print("Все материалы находятся в пределах нормы")
+        db.commit()
             
     finally:
         db.close()
@@ -0,0 +1,73 @@
+"""
+Единица работы (unit of work) на время HTTP запроса.
+
+Сессия из get_db регистрируется в request.state. Перед отправкой ответа
+middleware фиксирует транзакцию одним COMMIT, если ответ успешный (< 400),
+и откатывает ее при ошибке. Фиксация выполняется до отправки заголовков,
+поэтому клиент не получит 200 для незафиксированных изменений, а ошибка
+фиксации превращается в ответ 500.
+"""
+import json
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWorkMiddleware:
+    """ASGI middleware, фиксирующий сессию запроса перед отправкой ответа"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+        commit_failed = False
+
+        async def send_wrapper(message):
+            nonlocal response_started, commit_failed
+            if message["type"] == "http.response.start" and not response_started:
+                response_started = True
+                db = scope.get("state", {}).get("db_session")
+                if db is not None:
+                    if message["status"] < 400:
+                        try:
+                            await run_in_threadpool(db.commit)
+                        except Exception:  # pylint: disable=broad-except
+                            logger.exception("Ошибка фиксации транзакции запроса")
+                            await run_in_threadpool(db.rollback)
+                            commit_failed = True
+                            await _send_commit_error(send)
+                            return
+                    else:
+                        await run_in_threadpool(db.rollback)
+            if commit_failed:
+                # Исходный ответ заменен ответом об ошибке
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            db = scope.get("state", {}).get("db_session")
+            if db is not None and not response_started:
+                await run_in_threadpool(db.rollback)
+            raise
+
+
+async def _send_commit_error(send):
+    body = json.dumps({"detail": "Не удалось сохранить изменения"}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 500,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,108 @@
+"""
+Заполнение полей последней отправки и последнего возврата документов.
+
+Для новых отправок и возвратов поля documents.last_shipment_* и
+documents.last_return_* заполняют CRUD функции. Колонки в существующую
+БД добавляет миграция Alembic 0010; для документов, созданных до
+появления полей, их нужно заполнить один раз: скриптом
+backfill_document_movements.py или фоновой задачей outbox
+(enqueue_backfill). Заполнение идет пачками по BACKFILL_BATCH_SIZE
+документов двумя UPDATE на пачку; повторный запуск безопасен.
+"""
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import literal, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from .. import models
+from ..outbox import enqueue, job_handler
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "1000"))
+BACKFILL_JOB = "documents.backfill_movements"
+
+
+def backfill_batch(db: Session, after_id: int = 0, batch_size: int = BACKFILL_BATCH_SIZE) -> Optional[int]:
+    """
+    Заполнить поля для следующей пачки документов с id > after_id.
+
+    Возвращает id последнего обработанного документа или None, если
+    документов больше нет.
+    """
+    Document, Shipment, Return = models.Document, models.DocumentShipment, models.DocumentReturn
+    ids = db.execute(
+        select(Document.id).where(Document.id > after_id).order_by(Document.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return None
+    in_batch = Document.id.between(ids[0], ids[-1])
+
+    # updated_at не меняется: заполнение не является изменением документа
+    db.execute(
+        update(Document).where(in_batch).values(
+            last_shipment_id=select(func.max(Shipment.id))
+            .where(Shipment.document_id == Document.id).scalar_subquery(),
+            last_return_id=select(func.max(Return.id))
+            .where(Return.document_id == Document.id).scalar_subquery(),
+            updated_at=Document.updated_at,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.execute(
+        update(Document).where(in_batch).values(
+            last_shipment_date=select(Shipment.shipment_date)
+            .where(Shipment.id == Document.last_shipment_id).scalar_subquery(),
+            last_shipment_recipient=select(Shipment.recipient)
+            .where(Shipment.id == Document.last_shipment_id).scalar_subquery(),
+            last_return_date=select(Return.return_date)
+            .where(Return.id == Document.last_return_id).scalar_subquery(),
+            last_return_condition=select(Return.condition)
+            .where(Return.id == Document.last_return_id).scalar_subquery(),
+            updated_at=Document.updated_at,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    # Массовый UPDATE не проходит через after_flush: клиенты синхронизации
+    # получают заполненные документы через явные записи журнала
+    db.execute(
+        models.ChangeLog.__table__.insert().from_select(
+            ["entity", "entity_id", "operation"],
+            select(literal("documents"), Document.id, literal("update")).where(
+                in_batch, or_(Document.last_shipment_id.isnot(None), Document.last_return_id.isnot(None))
+            ),
+        )
+    )
+    return ids[-1]
+
+
+def backfill_all(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Заполнить поля всех документов, фиксируя транзакцию после каждой пачки"""
+    after_id, batches = 0, 0
+    while True:
+        last_id = backfill_batch(db, after_id, batch_size)
+        if last_id is None:
+            return batches
+        db.commit()
+        after_id, batches = last_id, batches + 1
+
+
+def enqueue_backfill(db: Session, after_id: int = 0):
+    """Поставить заполнение (начиная с документа после after_id) в очередь фоновых задач"""
+    return enqueue(
+        db, BACKFILL_JOB, {"after_id": after_id},
+        idempotency_key=f"{BACKFILL_JOB}:{after_id}"
+    )
+
+
+@job_handler(BACKFILL_JOB)
+def _backfill_job(db: Session, payload: Dict[str, Any]):
+    # Одна пачка на задачу: следующая ставится в той же транзакции
+    last_id = backfill_batch(db, payload.get("after_id", 0))
+    if last_id is None:
+        logger.info("Заполнение последних отправок и возвратов документов завершено")
+        return
+    enqueue_backfill(db, last_id)
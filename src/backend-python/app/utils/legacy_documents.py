@@ -0,0 +1,69 @@
+"""
+Соответствие реестра ПТО (doc_tracking_system.py, pto_docs.db) схеме бэкенда.
+
+В реестре ПТО статусы хранятся русскими строками, тип документа - текстом,
+номер проекта необязателен, даты - строками ГГГГ-ММ-ДД. Функции модуля
+используются реестром ПТО в режиме работы с БД бэкенда и переносом
+pto_docs.db в БД бэкенда.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import crud, models, schemas
+
+LEGACY_STATUSES = {
+    "в наличии": models.DocumentStatus.IN_OFFICE.value,
+    "отправлен": models.DocumentStatus.SHIPPED.value,
+    "возвращен": models.DocumentStatus.RETURNED.value,
+}
+STATUS_LABELS = {status: label for label, status in LEGACY_STATUSES.items()}
+
+# Тип для документов без типа, проект для документов без номера проекта
+# и состояние для возвратов без состояния (в бэкенде поля обязательны)
+DEFAULT_DOCUMENT_TYPE = "Прочее"
+NO_PROJECT_ID = "без проекта"
+DEFAULT_RETURN_CONDITION = "не указано"
+
+
+def map_status(label: Optional[str]) -> Optional[str]:
+    """Статус бэкенда по статусу реестра ПТО (None - неизвестный статус)"""
+    if label is None:
+        return models.DocumentStatus.IN_OFFICE.value
+    return LEGACY_STATUSES.get(label.strip().lower())
+
+
+def status_label(status: Optional[str]) -> str:
+    """Статус реестра ПТО по статусу бэкенда"""
+    return STATUS_LABELS.get(status, status or "")
+
+
+def parse_date(value) -> Optional[datetime]:
+    """Дата реестра ПТО (ГГГГ-ММ-ДД, возможно со временем) как datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+class DocumentTypeResolver:
+    """
+    ID типа документа по названию с кэшем; недостающие типы создаются.
+    Один экземпляр на сессию: при пакетной загрузке тип ищется один раз.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._ids: Dict[str, int] = {}
+
+    def __call__(self, name: Optional[str]) -> int:
+        name = (name or "").strip() or DEFAULT_DOCUMENT_TYPE
+        if name not in self._ids:
+            document_type = self.db.query(models.DocumentType).filter(models.DocumentType.name == name).first()
+            if document_type is None:
+                document_type = crud.create_document_type(self.db, schemas.DocumentTypeCreate(name=name))
+            self._ids[name] = document_type.id
+        return self._ids[name]
@@ -5,6 +5,7 @@ import logging
 
 from ..services.material_notification_service import MaterialNotificationService
 from .. import crud, models
+from ..outbox import enqueue, job_handler
 
 logger = logging.getLogger(__name__)
 
@@ -101,6 +102,28 @@ def check_materials_for_work(db: Session, gpr_record_id: int) -> Dict[str, Any]:
         }
 
 
+CHECK_MATERIALS_JOB = "gpr.check_materials"
+
+
+def enqueue_material_check(db: Session, gpr_record_id: int):
+    """
+    Поставить проверку материалов по записи ГПР в очередь фоновых задач.
+
+    Проверка ставится при каждом увеличении планового объема (как раньше
+    выполнялась синхронно): остатки могли измениться с прошлой проверки,
+    поэтому ключа идемпотентности нет.
+    """
+    return enqueue(db, CHECK_MATERIALS_JOB, {"gpr_record_id": gpr_record_id})
+
+
+@job_handler(CHECK_MATERIALS_JOB)
+def _check_materials_job(db: Session, payload: Dict[str, Any]):
+    gpr_record_id = payload["gpr_record_id"]
+    result = check_materials_for_work(db, gpr_record_id)
+    if result.get("needs_order"):
+        logger.warning(f"Для выполнения работ по записи ГПР {gpr_record_id} необходимо заказать материалы: {result.get('message')}")
+
+
 def reserve_materials_for_gpr_work(db: Session, gpr_record_id: int) -> bool:
     """
     Резервирует материалы для выполнения работ по ГПР
@@ -143,7 +166,8 @@ def update_material_usage(db: Session, gpr_record_id: int, work_volume: float):
         # Также уменьшаем зарезервированное количество, если оно было
         if stock.reserved_quantity >= consumed_quantity:
             stock.reserved_quantity -= consumed_quantity
-        db.commit()
+        db.flush()
+        crud.notify_stock_changed(db, stock)
         return True
     
     return False
@@ -0,0 +1,442 @@
+"""
+Перенос реестра ПТО (pto_docs.db, doc_tracking_system.py) в БД бэкенда.
+
+База реестра читается пачками документов по id (WHERE id > последний
+перенесенный), для каждой пачки - отправки и возвраты ее документов,
+поэтому расход памяти не зависит от размера базы. Пачка записывается в
+одной транзакции массовыми INSERT: документы, отправки, возвраты, история
+статусов, журнал синхронизации и соответствие идентификаторов
+(legacy_document_map). Документы, уже перенесенные ранее, пропускаются,
+поэтому перенос можно запускать повторно. В пробном режиме (dry_run)
+каждая пачка откатывается.
+
+Статус документа определяется по последнему движению (история статусов
+должна заканчиваться текущим статусом); движения одного дня
+упорядочиваются так, чтобы отправки и возвраты чередовались и цепочка
+заканчивалась статусом реестра. Расхождения с данными реестра попадают в
+отчет.
+"""
+import csv
+import logging
+import os
+import sqlite3
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .legacy_documents import DocumentTypeResolver, NO_PROJECT_ID, DEFAULT_RETURN_CONDITION, map_status, parse_date
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_CHUNK_SIZE = int(os.getenv("PTO_MIGRATION_CHUNK_SIZE", "1000"))
+# Сколько примеров каждого вида расхождений хранится для итогового отчета
+MISMATCH_SAMPLES = 10
+
+MISMATCH_KINDS = {
+    "unknown_status": "неизвестный статус",
+    "status_differs": "статус не совпадает с последним движением",
+    "invalid_transition": "недопустимый переход статуса",
+    "unknown_user": "пользователь не найден",
+    "invalid_date": "некорректная дата",
+    "orphan_movement": "движение несуществующего документа",
+    "changed_after_migration": "движения изменились после переноса",
+}
+
+SHIPPED = models.DocumentStatus.SHIPPED.value
+RETURNED = models.DocumentStatus.RETURNED.value
+IN_OFFICE = models.DocumentStatus.IN_OFFICE.value
+
+LEGACY_DOCUMENTS = '''
+    SELECT id, doc_number, doc_title, project_number, doc_type, status, created_by, created_at, updated_at
+    FROM documents WHERE id > ? ORDER BY id LIMIT ?
+'''
+# Пачка документов - непрерывный диапазон id, движения читаются по индексу doc_id
+LEGACY_SHIPMENTS = '''
+    SELECT id, doc_id, recipient, shipment_date, shipped_by, notes
+    FROM shipments WHERE doc_id BETWEEN ? AND ? ORDER BY id
+'''
+LEGACY_RETURNS = '''
+    SELECT id, doc_id, return_date, returned_by, condition, notes
+    FROM returns WHERE doc_id BETWEEN ? AND ? ORDER BY id
+'''
+LEGACY_ORPHANS = '''
+    SELECT 'shipments', id, doc_id FROM shipments s
+    WHERE s.doc_id IS NULL OR NOT EXISTS (SELECT 1 FROM documents d WHERE d.id = s.doc_id)
+    UNION ALL
+    SELECT 'returns', id, doc_id FROM returns r
+    WHERE r.doc_id IS NULL OR NOT EXISTS (SELECT 1 FROM documents d WHERE d.id = r.doc_id)
+'''
+
+
+def _order_movements(movements: List[dict], final_status: Optional[str]) -> List[dict]:
+    """
+    Движения документа в порядке смены статусов.
+
+    В реестре ПТО даты без времени: за один день документ могут отправить,
+    вернуть на исправление и отправить снова. Движения одного дня
+    чередуются (после отправки - возврат, после возврата - отправка), а в
+    последний день цепочка заканчивается статусом реестра (final_status),
+    если он известен. Внутри одного вида движения идут по ID реестра.
+    """
+    by_date = defaultdict(list)
+    for movement in movements:
+        by_date[movement["date"]].append(movement)
+
+    ordered, status = [], IN_OFFICE
+    dates = sorted(by_date)
+    for date in dates:
+        pending = {SHIPPED: deque(), RETURNED: deque()}
+        for movement in sorted(by_date[date], key=lambda movement: movement["legacy_id"]):
+            pending[movement["status"]].append(movement)
+        last = None
+        if date == dates[-1] and pending.get(final_status):
+            last = pending[final_status].pop()
+        while pending[SHIPPED] or pending[RETURNED]:
+            wanted = RETURNED if status == SHIPPED else SHIPPED
+            movement = (pending[wanted] or pending[SHIPPED if wanted == RETURNED else RETURNED]).popleft()
+            ordered.append(movement)
+            status = movement["status"]
+        if last is not None:
+            ordered.append(last)
+    return ordered
+
+
+def _has_date(value) -> bool:
+    try:
+        return parse_date(value) is not None
+    except ValueError:
+        return False
+
+
+def open_legacy_database(path: str) -> sqlite3.Connection:
+    """Подключение к pto_docs.db только для чтения"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class MigrationReport:
+    """
+    Итоги переноса: число перенесенных и пропущенных записей и расхождения.
+    Все расхождения пишутся в CSV (если задан), в памяти - только счетчики
+    и первые MISMATCH_SAMPLES примеров каждого вида.
+    """
+
+    def __init__(self, mismatches_file=None):
+        self.counts = Counter()
+        self.mismatches = Counter()
+        self.samples: Dict[str, List[str]] = defaultdict(list)
+        self._writer = None
+        if mismatches_file is not None:
+            self._writer = csv.writer(mismatches_file, delimiter=";")
+            self._writer.writerow(("kind", "entity", "legacy_id", "message"))
+
+    def mismatch(self, kind: str, entity: str, legacy_id, message: str):
+        self.mismatches[kind] += 1
+        if len(self.samples[kind]) < MISMATCH_SAMPLES:
+            self.samples[kind].append(f"{entity} {legacy_id}: {message}")
+        if self._writer is not None:
+            self._writer.writerow((kind, entity, legacy_id, message))
+
+    def lines(self) -> List[str]:
+        result = [
+            f"Документов перенесено: {self.counts['documents']}, "
+            f"пропущено (перенесены ранее): {self.counts['skipped_documents']}",
+            f"Отправок: {self.counts['shipments']}, возвратов: {self.counts['returns']}, "
+            f"записей истории статусов: {self.counts['history']}",
+        ]
+        if not self.mismatches:
+            result.append("Расхождений не найдено")
+        for kind, count in self.mismatches.most_common():
+            result.append(f"{MISMATCH_KINDS[kind]}: {count}")
+            result.extend(f"    {sample}" for sample in self.samples[kind])
+        return result
+
+
+class PtoMigrator:
+    """Перенос pto_docs.db пачками документов (см. описание модуля)"""
+
+    def __init__(
+        self,
+        db: Session,
+        legacy: sqlite3.Connection,
+        report: MigrationReport,
+        chunk_size: int = MIGRATION_CHUNK_SIZE
+    ):
+        self.db = db
+        self.legacy = legacy
+        self.report = report
+        self.chunk_size = chunk_size
+        self.usernames: Dict[int, str] = {}
+        self._reported_users = set()
+
+    def run(self, dry_run: bool = False) -> MigrationReport:
+        self._load_users()
+        after_id, chunks = 0, 0
+        while True:
+            documents = self.legacy.execute(LEGACY_DOCUMENTS, (after_id, self.chunk_size)).fetchall()
+            if not documents:
+                break
+            try:
+                self._migrate_chunk(documents)
+            except Exception:
+                self.db.rollback()
+                raise
+            if dry_run:
+                self.db.rollback()
+            else:
+                self.db.commit()
+            after_id, chunks = documents[-1]["id"], chunks + 1
+            if chunks % 10 == 0:
+                logger.info("Обработано документов до ID %s", after_id)
+        self._report_orphans()
+        return self.report
+
+    def _load_users(self):
+        """Пользователи реестра ПТО: в бэкенде они сопоставляются по имени пользователя"""
+        for row in self.legacy.execute("SELECT id, username FROM users"):
+            self.usernames[row["id"]] = row["username"]
+        known = set()
+        names = list(self.usernames.values())
+        for start in range(0, len(names), 500):
+            known.update(self.db.execute(
+                select(models.User.username).where(models.User.username.in_(names[start:start + 500]))
+            ).scalars())
+        for user_id, username in self.usernames.items():
+            if username not in known:
+                self.report.mismatch("unknown_user", "users", user_id,
+                                     f"пользователя {username} нет в БД бэкенда, имя сохранено в истории статусов")
+
+    def _username(self, user_id, entity: str, legacy_id) -> Optional[str]:
+        if user_id is None:
+            return None
+        username = self.usernames.get(user_id)
+        if username is None and user_id not in self._reported_users:
+            self._reported_users.add(user_id)
+            self.report.mismatch("unknown_user", entity, legacy_id, f"пользователя с ID {user_id} нет в реестре ПТО")
+        return username
+
+    def _date(self, value, entity: str, legacy_id, field: str) -> Optional[datetime]:
+        try:
+            return parse_date(value)
+        except ValueError:
+            self.report.mismatch("invalid_date", entity, legacy_id, f"{field} = {value!r}")
+            return None
+
+    def _migrated(self, entity: str, legacy_ids: Iterable[int]) -> Dict[int, int]:
+        legacy_map = models.LegacyDocumentMap
+        rows = self.db.execute(
+            select(legacy_map.legacy_id, legacy_map.new_id)
+            .where(legacy_map.entity == entity, legacy_map.legacy_id.in_(list(legacy_ids)))
+        )
+        return dict(rows.all())
+
+    def _movements(self, sql: str, low: int, high: int) -> Dict[int, list]:
+        grouped = defaultdict(list)
+        for row in self.legacy.execute(sql, (low, high)):
+            grouped[row["doc_id"]].append(row)
+        return grouped
+
+    def _migrate_chunk(self, documents: List[sqlite3.Row]):
+        low, high = documents[0]["id"], documents[-1]["id"]
+        shipments = self._movements(LEGACY_SHIPMENTS, low, high)
+        returns = self._movements(LEGACY_RETURNS, low, high)
+
+        migrated = self._migrated("documents", (document["id"] for document in documents))
+        if migrated:
+            self.report.counts["skipped_documents"] += len(migrated)
+            self._check_migrated(migrated, shipments, returns)
+        documents = [document for document in documents if document["id"] not in migrated]
+        if not documents:
+            return
+
+        plans = [self._plan(document, shipments.get(document["id"], []), returns.get(document["id"], []))
+                 for document in documents]
+        resolve_type = DocumentTypeResolver(self.db)
+        for plan in plans:
+            plan["document"]["document_type_id"] = resolve_type(plan["doc_type"])
+        for plan, document_id in zip(plans, self._insert_returning(
+                models.Document, [plan["document"] for plan in plans])):
+            plan["id"] = document_id
+            for movement in plan["shipments"] + plan["returns"]:
+                movement["row"]["document_id"] = document_id
+
+        shipment_rows = [movement for plan in plans for movement in plan["shipments"]]
+        return_rows = [movement for plan in plans for movement in plan["returns"]]
+        for movement, new_id in zip(shipment_rows, self._insert_returning(
+                models.DocumentShipment, [movement["row"] for movement in shipment_rows])):
+            movement["id"] = new_id
+        for movement, new_id in zip(return_rows, self._insert_returning(
+                models.DocumentReturn, [movement["row"] for movement in return_rows])):
+            movement["id"] = new_id
+
+        history, last_movements = [], []
+        for plan in plans:
+            history.extend(self._history(plan))
+            last_movements.append(self._last_movements(plan))
+        self.db.execute(models.DocumentStatusHistory.__table__.insert(), history)
+        self.db.execute(
+            models.Document.__table__.update()
+            .where(models.Document.id == bindparam("doc_id"))
+            .values({name: bindparam(name) for name in last_movements[0] if name != "doc_id"}),
+            last_movements
+        )
+
+        # Массовые INSERT не проходят через after_flush: журнал синхронизации заполняется явно
+        self._log_changes("documents", [plan["id"] for plan in plans])
+        self._log_changes("shipments", [movement["id"] for movement in shipment_rows])
+        self._log_changes("returns", [movement["id"] for movement in return_rows])
+        self._save_map("documents", [(plan["legacy_id"], plan["id"]) for plan in plans])
+        self._save_map("shipments", [(movement["legacy_id"], movement["id"]) for movement in shipment_rows])
+        self._save_map("returns", [(movement["legacy_id"], movement["id"]) for movement in return_rows])
+
+        self.report.counts["documents"] += len(plans)
+        self.report.counts["shipments"] += len(shipment_rows)
+        self.report.counts["returns"] += len(return_rows)
+        self.report.counts["history"] += len(history)
+
+    def _plan(self, document: sqlite3.Row, shipments: List[sqlite3.Row], returns: List[sqlite3.Row]) -> dict:
+        """Строки документа и его движений для вставки, статус по движениям"""
+        legacy_id = document["id"]
+        created_at = self._date(document["created_at"], "documents", legacy_id, "created_at") or datetime.utcnow()
+        plan = {
+            "legacy_id": legacy_id,
+            "doc_type": document["doc_type"],
+            "created_by": self._username(document["created_by"], "documents", legacy_id),
+            "created_at": created_at,
+            "document": {
+                "doc_number": document["doc_number"],
+                "title": document["doc_title"],
+                "project_id": document["project_number"] or NO_PROJECT_ID,
+                "created_at": created_at,
+                "updated_at": self._date(document["updated_at"], "documents", legacy_id, "updated_at"),
+            },
+            "shipments": [],
+            "returns": [],
+        }
+        for row in shipments:
+            date = self._date(row["shipment_date"], "shipments", row["id"], "shipment_date")
+            if date is None:
+                continue
+            plan["shipments"].append({
+                "legacy_id": row["id"], "status": SHIPPED, "date": date, "recipient": row["recipient"],
+                "changed_by": self._username(row["shipped_by"], "shipments", row["id"]),
+                "row": {"recipient": row["recipient"], "shipment_date": date, "notes": row["notes"]},
+            })
+        for row in returns:
+            date = self._date(row["return_date"], "returns", row["id"], "return_date")
+            if date is None:
+                continue
+            condition = row["condition"] or DEFAULT_RETURN_CONDITION
+            plan["returns"].append({
+                "legacy_id": row["id"], "status": RETURNED, "date": date, "condition": condition,
+                "changed_by": self._username(row["returned_by"], "returns", row["id"]),
+                "row": {"return_date": date, "condition": condition, "notes": row["notes"]},
+            })
+
+        legacy_status = map_status(document["status"])
+        plan["events"] = _order_movements(plan["shipments"] + plan["returns"], legacy_status)
+        # Движения вставляются в порядке цепочки: последние по ID - последние по статусу
+        plan["shipments"] = [movement for movement in plan["events"] if movement["status"] == SHIPPED]
+        plan["returns"] = [movement for movement in plan["events"] if movement["status"] == RETURNED]
+        status = plan["events"][-1]["status"] if plan["events"] else IN_OFFICE
+        plan["document"]["status"] = status
+
+        if legacy_status is None:
+            self.report.mismatch("unknown_status", "documents", legacy_id,
+                                 f"статус {document['status']!r}, по движениям - {status}")
+        elif legacy_status != status:
+            self.report.mismatch("status_differs", "documents", legacy_id,
+                                 f"в реестре {document['status']!r}, по движениям - {status}")
+        return plan
+
+    def _history(self, plan: dict) -> List[dict]:
+        rows = [{
+            "document_id": plan["id"], "old_status": None, "new_status": IN_OFFICE, "recipient": None,
+            "shipment_id": None, "return_id": None, "changed_by": plan["created_by"], "changed_at": plan["created_at"],
+        }]
+        status = IN_OFFICE
+        for movement in plan["events"]:
+            if movement["status"] not in models.DOCUMENT_TRANSITIONS.get(status, ()):
+                self.report.mismatch("invalid_transition", "documents", plan["legacy_id"],
+                                     f"{status} -> {movement['status']} ({movement['date']:%Y-%m-%d})")
+            shipped = movement["status"] == SHIPPED
+            rows.append({
+                "document_id": plan["id"], "old_status": status, "new_status": movement["status"],
+                "recipient": movement.get("recipient"),
+                "shipment_id": movement["id"] if shipped else None,
+                "return_id": None if shipped else movement["id"],
+                "changed_by": movement["changed_by"], "changed_at": movement["date"],
+            })
+            status = movement["status"]
+        return rows
+
+    @staticmethod
+    def _last_movements(plan: dict) -> dict:
+        # Последние - с наибольшим ID, как в CRUD функциях бэкенда
+        shipment = plan["shipments"][-1] if plan["shipments"] else None
+        return_obj = plan["returns"][-1] if plan["returns"] else None
+        return {
+            "doc_id": plan["id"],
+            "last_shipment_id": shipment["id"] if shipment else None,
+            "last_shipment_date": shipment["date"] if shipment else None,
+            "last_shipment_recipient": shipment["recipient"] if shipment else None,
+            "last_return_id": return_obj["id"] if return_obj else None,
+            "last_return_date": return_obj["date"] if return_obj else None,
+            "last_return_condition": return_obj["condition"] if return_obj else None,
+            # updated_at не меняется: переносится значение из реестра
+            "updated_at": plan["document"]["updated_at"],
+        }
+
+    def _insert_returning(self, model, rows: List[dict]) -> List[int]:
+        """Массовая вставка; ID возвращаются в порядке строк"""
+        if not rows:
+            return []
+        table = model.__table__
+        return self.db.execute(
+            table.insert().returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+    def _log_changes(self, entity: str, ids: List[int]):
+        if ids:
+            self.db.execute(models.ChangeLog.__table__.insert(), [
+                {"entity": entity, "entity_id": entity_id, "operation": "create"} for entity_id in ids
+            ])
+
+    def _save_map(self, entity: str, pairs: List[tuple]):
+        if pairs:
+            self.db.execute(models.LegacyDocumentMap.__table__.insert(), [
+                {"entity": entity, "legacy_id": legacy_id, "new_id": new_id} for legacy_id, new_id in pairs
+            ])
+
+    def _check_migrated(self, migrated: Dict[int, int], shipments: dict, returns: dict):
+        """
+        Перенесенные ранее документы, у которых в реестре ПТО с тех пор появились движения.
+
+        Движения с некорректной датой не переносятся (_plan) и здесь не считаются.
+        """
+        for model, legacy_movements, entity, date_field in (
+            (models.DocumentShipment, shipments, "отправок", "shipment_date"),
+            (models.DocumentReturn, returns, "возвратов", "return_date"),
+        ):
+            counts = dict(self.db.execute(
+                select(model.document_id, func.count())
+                .where(model.document_id.in_(list(migrated.values())))
+                .group_by(model.document_id)
+            ).all())
+            for legacy_id, new_id in migrated.items():
+                legacy_count = sum(1 for row in legacy_movements.get(legacy_id, ()) if _has_date(row[date_field]))
+                if legacy_count != counts.get(new_id, 0):
+                    self.report.mismatch("changed_after_migration", "documents", legacy_id,
+                                         f"{entity} в реестре {legacy_count}, в БД бэкенда "
+                                         f"{counts.get(new_id, 0)} (документ {new_id})")
+
+    def _report_orphans(self):
+        for entity, legacy_id, doc_id in self.legacy.execute(LEGACY_ORPHANS):
+            self.report.mismatch("orphan_movement", entity, legacy_id, f"документа с ID {doc_id} нет, не перенесено")
@@ -0,0 +1,72 @@
+"""
+Проверка сроков замечаний: учет просрочки в remark_counters и эскалация.
+
+При создании и изменении замечания признак is_overdue и счетчики
+обновляет CRUD слой. Замечания, срок которых наступил позже, находит
+периодическая фоновая задача outbox: каждые REMARK_OVERDUE_SCAN_SECONDS
+она проверяет только замечания со сроком между прошлой проверкой
+(отметка в scan_watermarks) и текущим моментом, отмечает их
+просроченными и отправляет событие remark.overdue подписчикам объекта
+и исполнителю, затем ставит свой следующий запуск. Ключ идемпотентности
+содержит номер интервала, поэтому несколько процессов приложения не
+создают параллельных цепочек задачи.
+
+События доставляет воркер outbox в процессе приложения
+(OUTBOX_WORKER_ENABLED) или отдельный процесс python -m app.outbox через
+шину событий (REALTIME_BACKPLANE=redis или postgres).
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import crud_construction_remarks, models
+from ..outbox import enqueue, job_handler
+
+logger = logging.getLogger(__name__)
+
+REMARK_OVERDUE_SCAN_SECONDS = float(os.getenv("REMARK_OVERDUE_SCAN_SECONDS", "300"))
+OVERDUE_SCAN_JOB = "remarks.scan_overdue"
+OVERDUE_WATERMARK = "remarks.overdue"
+
+
+def scan_overdue(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Проверить замечания, срок которых наступил после прошлой проверки, и сдвинуть отметку.
+
+    Возвращает число новых просроченных замечаний.
+    """
+    now = now or datetime.utcnow()
+    watermark = db.query(models.ScanWatermark).filter(
+        models.ScanWatermark.name == OVERDUE_WATERMARK
+    ).with_for_update().first()
+    since = watermark.watermark if watermark is not None else None
+    # Часы сдвинулись назад: отметку не уменьшаем
+    if since is not None and since > now:
+        return 0
+
+    flagged = crud_construction_remarks.scan_overdue_remarks(db, since, now)
+    if watermark is None:
+        db.add(models.ScanWatermark(name=OVERDUE_WATERMARK, watermark=now))
+    else:
+        watermark.watermark = now
+    db.flush()
+    return flagged
+
+
+def enqueue_overdue_scan(db: Session, delay: float = 0):
+    """Поставить проверку просроченных замечаний (не более одной на интервал)"""
+    slot = int((time.time() + delay) // REMARK_OVERDUE_SCAN_SECONDS)
+    return enqueue(db, OVERDUE_SCAN_JOB, idempotency_key=f"{OVERDUE_SCAN_JOB}:{slot}", delay=delay)
+
+
+@job_handler(OVERDUE_SCAN_JOB)
+def _overdue_scan_job(db: Session, payload: Dict[str, Any]):
+    flagged = scan_overdue(db)
+    if flagged:
+        logger.info(f"Новых просроченных замечаний: {flagged}")
+    # Следующий запуск ставится в той же транзакции
+    enqueue_overdue_scan(db, REMARK_OVERDUE_SCAN_SECONDS)
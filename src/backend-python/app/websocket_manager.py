@@ -1,64 +1,326 @@
 from fastapi import WebSocket, WebSocketDisconnect
 from collections import defaultdict
+import asyncio
 import json
-from typing import Dict, List
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+# Максимальное число сообщений в очереди отправки одного соединения
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+# Политика для медленных клиентов при переполнении очереди: "drop" или "disconnect"
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop").lower()
+# Максимальное число подписок на темы для одного соединения
+WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", "200"))
+# Время на отправку первого сообщения с токеном после открытия соединения, с
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", "10"))
+# Интервал отправки ping сервером, с
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# Соединение без входящих сообщений (в т.ч. pong) дольше этого времени закрывается, с
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+
+
+class ClientConnection:
+    """
+    WebSocket соединение с собственной очередью исходящих сообщений.
+
+    Очередь разбирается отдельной задачей, поэтому медленный клиент
+    не задерживает рассылку остальным.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender_task: Optional[asyncio.Task] = None
+        self.dropped_messages = 0
+        self.topics: Set[str] = set()
+        self.connected_at = time.monotonic()
+        # Время последнего входящего сообщения от клиента
+        self.last_seen = self.connected_at
 
 
 class ConnectionManager:
     """Класс для управления WebSocket соединениями"""
-    
-    def __init__(self):
-        # Активные соединения: websocket -> user_id
-        self.active_connections: Dict[WebSocket, int] = {}
+
+    def __init__(
+        self,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        slow_consumer_policy: str = WS_SLOW_CONSUMER_POLICY,
+        ping_interval: float = WS_PING_INTERVAL,
+        idle_timeout: float = WS_IDLE_TIMEOUT
+    ):
+        # Активные соединения: websocket -> соединение с очередью отправки
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
         # Список соединений для каждого пользователя
         self.user_connections: Dict[int, List[WebSocket]] = defaultdict(list)
+        # Подписчики тем: тема -> множество соединений
+        self.topic_subscribers: Dict[str, Set[WebSocket]] = defaultdict(set)
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        # Счетчики для мониторинга
+        self.dropped_messages = 0
+        self.slow_consumer_disconnects = 0
+        self.connections_opened = 0
+        self.reaped_connections = 0
+        self.auth_failures = 0
+        self.auth_timeouts = 0
+        # Передача сообщений другим процессам: relay(kind, target, payload)
+        self.relay: Optional[Callable[[str, Any, str], None]] = None
+
+    def set_relay(self, relay: Optional[Callable[[str, Any, str], None]]):
+        """Установить функцию пересылки сообщений в другие процессы (см. app.events)"""
+        self.relay = relay
+
+    def _forward(self, kind: str, target: Any, payload: str):
+        if self.relay is not None:
+            self.relay(kind, target, payload)
 
     async def connect(self, websocket: WebSocket, user_id: int):
         """Подключить WebSocket соединение для пользователя"""
         await websocket.accept()
-        self.active_connections[websocket] = user_id
+        self.register(websocket, user_id)
+
+    def register(self, websocket: WebSocket, user_id: int) -> ClientConnection:
+        """Зарегистрировать уже принятое соединение и запустить задачу отправки"""
+        connection = ClientConnection(websocket, user_id, self.queue_size)
+        connection.sender_task = asyncio.create_task(self._sender(connection))
+        self.active_connections[websocket] = connection
         self.user_connections[user_id].append(websocket)
+        self.connections_opened += 1
+        return connection
+
+    def touch(self, websocket: WebSocket):
+        """Отметить входящее сообщение от клиента (соединение живо)"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
 
     def disconnect(self, websocket: WebSocket):
         """Отключить WebSocket соединение"""
-        if websocket in self.active_connections:
-            user_id = self.active_connections[websocket]
-            self.active_connections.pop(websocket)
-            if user_id in self.user_connections:
-                try:
-                    self.user_connections[user_id].remove(websocket)
-                    if not self.user_connections[user_id]:
-                        del self.user_connections[user_id]
-                except ValueError:
-                    pass  # Соединение уже удалено
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Отправить личное сообщение через WebSocket"""
-        await websocket.send_text(message)
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
 
-    async def broadcast_to_user(self, user_id: int, message: str):
-        """Отправить сообщение всем соединениям конкретного пользователя"""
-        connections = self.user_connections.get(user_id, [])
-        for connection in connections:
+        user_id = connection.user_id
+        if user_id in self.user_connections:
             try:
-                await connection.send_text(message)
-            except WebSocketDisconnect:
-                # Если соединение разорвано, удаляем его
-                self.disconnect(connection)
-
-    async def broadcast_to_all(self, message: str):
-        """Отправить сообщение всем активным соединениям"""
-        for connection in list(self.active_connections.keys()):
+                self.user_connections[user_id].remove(websocket)
+                if not self.user_connections[user_id]:
+                    del self.user_connections[user_id]
+            except ValueError:
+                pass  # Соединение уже удалено
+
+        for topic in connection.topics:
+            subscribers = self.topic_subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.topic_subscribers[topic]
+        connection.topics.clear()
+
+        task = connection.sender_task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+
+    async def _sender(self, connection: ClientConnection):
+        """Задача, отправляющая сообщения из очереди соединения"""
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            self.disconnect(connection.websocket)
+        except Exception as e:  # pylint: disable=broad-except
+            # Любая ошибка отправки означает, что соединение больше не пригодно
+            logger.warning(f"Ошибка отправки WebSocket сообщения пользователю {connection.user_id}: {e}")
+            self.disconnect(connection.websocket)
+
+    def _enqueue(self, connection: ClientConnection, message: str):
+        """Поставить сообщение в очередь соединения с учетом политики для медленных клиентов"""
+        try:
+            connection.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_consumer_policy == "disconnect":
+            self.slow_consumer_disconnects += 1
+            logger.info(f"Медленный клиент пользователя {connection.user_id} отключен: очередь переполнена")
+            self.disconnect(connection.websocket)
+            asyncio.create_task(self._close_quietly(connection.websocket, 1013, "Slow consumer"))
+            return
+
+        # Политика "drop": отбрасываем самое старое сообщение, новое важнее
+        connection.queue.get_nowait()
+        connection.queue.put_nowait(message)
+        connection.dropped_messages += 1
+        self.dropped_messages += 1
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    @staticmethod
+    def _serialize(message: Union[str, dict]) -> str:
+        """Сериализовать сообщение один раз для всех получателей"""
+        return message if isinstance(message, str) else json.dumps(message, default=str)
+
+    async def send_personal_message(self, message: Union[str, dict], websocket: WebSocket):
+        """Отправить личное сообщение через WebSocket"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, self._serialize(message))
+
+    def deliver_to_user(self, user_id: int, message: Union[str, dict]):
+        """Поставить сообщение в очереди соединений пользователя в текущем процессе"""
+        payload = self._serialize(message)
+        for websocket in list(self.user_connections.get(user_id, [])):
+            connection = self.active_connections.get(websocket)
+            if connection is not None:
+                self._enqueue(connection, payload)
+
+    def deliver_to_all(self, message: Union[str, dict]):
+        """Поставить сообщение в очереди всех соединений текущего процесса"""
+        payload = self._serialize(message)
+        for connection in list(self.active_connections.values()):
+            self._enqueue(connection, payload)
+
+    async def broadcast_to_user(self, user_id: int, message: Union[str, dict]):
+        """Отправить сообщение всем соединениям конкретного пользователя (во всех процессах)"""
+        payload = self._serialize(message)
+        self.deliver_to_user(user_id, payload)
+        self._forward("user", user_id, payload)
+
+    async def broadcast_to_all(self, message: Union[str, dict]):
+        """Отправить сообщение всем активным соединениям (во всех процессах)"""
+        payload = self._serialize(message)
+        self.deliver_to_all(payload)
+        self._forward("all", None, payload)
+
+    def subscribe(self, websocket: WebSocket, topic: str) -> bool:
+        """Подписать соединение на тему. Возвращает False, если превышен лимит подписок"""
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return False
+        if topic not in connection.topics and len(connection.topics) >= WS_MAX_SUBSCRIPTIONS:
+            return False
+        connection.topics.add(topic)
+        self.topic_subscribers[topic].add(websocket)
+        return True
+
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        """Отписать соединение от темы"""
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.topics.discard(topic)
+        subscribers = self.topic_subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(websocket)
+            if not subscribers:
+                del self.topic_subscribers[topic]
+
+    def get_subscriptions(self, websocket: WebSocket) -> List[str]:
+        """Получить список тем, на которые подписано соединение"""
+        connection = self.active_connections.get(websocket)
+        return sorted(connection.topics) if connection is not None else []
+
+    def publish_nowait(self, topic: str, message: Union[str, dict]):
+        """Поставить сообщение в очереди подписчиков темы в текущем процессе"""
+        subscribers = self.topic_subscribers.get(topic)
+        if not subscribers:
+            return
+        payload = self._serialize(message)
+        for websocket in list(subscribers):
+            connection = self.active_connections.get(websocket)
+            if connection is not None:
+                self._enqueue(connection, payload)
+
+    async def publish(self, topic: str, message: Union[str, dict]):
+        """Отправить сообщение подписчикам темы (во всех процессах)"""
+        payload = self._serialize(message)
+        self.publish_nowait(topic, payload)
+        self._forward("topic", topic, payload)
+
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """Закрыть соединения, не отвечавшие дольше idle_timeout. Возвращает их количество"""
+        now = time.monotonic() if now is None else now
+        stale = [
+            connection for connection in self.active_connections.values()
+            if now - connection.last_seen > self.idle_timeout
+        ]
+        for connection in stale:
+            self.disconnect(connection.websocket)
+            asyncio.create_task(self._close_quietly(connection.websocket, 1001, "Heartbeat timeout"))
+        if stale:
+            self.reaped_connections += len(stale)
+            logger.info(f"Закрыто неактивных WebSocket соединений: {len(stale)}")
+        return len(stale)
+
+    def send_pings(self):
+        """Поставить ping в очереди всех соединений; клиент отвечает сообщением pong"""
+        if self.active_connections:
+            self.deliver_to_all(json.dumps({"type": "ping", "timestamp": time.time()}))
+
+    async def _heartbeat(self):
+        """Периодически проверять соединения: закрывать неактивные и отправлять ping"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
             try:
-                await connection.send_text(message)
-            except WebSocketDisconnect:
-                # Если соединение разорвано, удаляем его
-                self.disconnect(connection)
+                self.reap_idle()
+                self.send_pings()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f"Ошибка проверки WebSocket соединений: {e}")
+
+    def start_heartbeat(self):
+        """Запустить фоновую проверку соединений (при старте приложения)"""
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def close_all(self):
+        """Закрыть все соединения (при остановке приложения)"""
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        for websocket in list(self.active_connections.keys()):
+            self.disconnect(websocket)
+            await self._close_quietly(websocket, 1001, "Server shutdown")
 
     def get_user_connections_count(self, user_id: int) -> int:
         """Получить количество активных соединений для пользователя"""
         return len(self.user_connections.get(user_id, []))
 
+    def get_connections_count(self) -> int:
+        """Получить общее количество активных соединений"""
+        return len(self.active_connections)
+
+    def get_stats(self) -> dict:
+        """Метрики соединений для мониторинга"""
+        return {
+            "connections": len(self.active_connections),
+            "users": len(self.user_connections),
+            "topics": len(self.topic_subscribers),
+            "connections_opened": self.connections_opened,
+            "reaped_connections": self.reaped_connections,
+            "auth_failures": self.auth_failures,
+            "auth_timeouts": self.auth_timeouts,
+            "dropped_messages": self.dropped_messages,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "ping_interval": self.ping_interval,
+            "idle_timeout": self.idle_timeout,
+        }
+
 
 # Глобальный экземпляр менеджера соединений
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -0,0 +1,41 @@
+"""
+Заполнение последней отправки и последнего возврата в таблице documents.
+
+Заполняет пачками колонки documents.last_shipment_* и
+documents.last_return_* (в существующую БД их добавляет
+alembic upgrade head). С ключом --enqueue заполнение ставится
+в очередь фоновых задач и выполняется воркером outbox.
+
+    python backfill_document_movements.py [--batch-size N] [--enqueue]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import SessionLocal  # noqa: E402
+from app.utils import document_movements  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заполнение последних отправок и возвратов документов")
+    parser.add_argument("--batch-size", type=int, default=document_movements.BACKFILL_BATCH_SIZE)
+    parser.add_argument("--enqueue", action="store_true", help="выполнить в фоне через очередь outbox")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.enqueue:
+            document_movements.enqueue_backfill(db)
+            db.commit()
+            print("Заполнение поставлено в очередь фоновых задач")
+        else:
+            batches = document_movements.backfill_all(db, args.batch_size)
+            print(f"Обработано пачек: {batches}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
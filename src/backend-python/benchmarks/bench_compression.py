@@ -0,0 +1,113 @@
+"""
+Экономия трафика и затраты CPU на сжатие ответов по размеру ответа.
+
+Строит JSON страниц списков документов и замечаний (русский текст, как
+в реальных ответах) размером от 1 до 1000 записей и для каждой доступной
+кодировки (gzip; br и zstd - при установленных пакетах) выводит размер
+после сжатия, сэкономленные байты и время сжатия. Отдельно - потоковое
+сжатие частями по 16 КБ с flush после каждой части (как у потоковых
+ответов в CompressionMiddleware).
+
+Запуск: python benchmarks/bench_compression.py [повторов]
+"""
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app import compression  # noqa: E402
+from app.serialization import dumps  # noqa: E402
+
+STREAM_CHUNK = 16 * 1024
+
+
+def documents_page(rows: int) -> bytes:
+    now = datetime(2026, 3, 1, 9, 30)
+    return dumps([{
+        "doc_number": f"ИД-{1000 + i}",
+        "title": f"Акт освидетельствования скрытых работ по устройству разметки, участок {i % 40 + 1}",
+        "project_id": f"P-{i % 12}",
+        "document_type_id": i % 7 + 1,
+        "id": i + 1,
+        "status": ("in_office", "shipped", "returned")[i % 3],
+        "created_at": now + timedelta(minutes=i),
+        "updated_at": None if i % 4 else now + timedelta(hours=i),
+    } for i in range(rows)])
+
+
+def remarks_page(rows: int) -> bytes:
+    now = datetime(2026, 3, 1, 9, 30)
+    return dumps([{
+        "remark_number": f"СК-{i}",
+        "project_object_id": i % 5 + 1,
+        "title": f"Нарушение геометрии линий разметки на пикете {i % 90}",
+        "description": "Ширина линии не соответствует проекту, требуется демаркировка и повторное нанесение краской",
+        "status": ("new", "in_progress", "resolved")[i % 3],
+        "priority": ("low", "normal", "high")[i % 3],
+        "assigned_to": f"Исполнитель {i % 9}",
+        "deadline": now + timedelta(days=i % 20),
+        "created_by": "Инспектор строительного контроля",
+        "id": i + 1,
+        "created_at": now,
+        "updated_at": None,
+    } for i in range(rows)])
+
+
+def variants():
+    yield "gzip-1", lambda: compression._GzipEncoder(1)
+    yield f"gzip-{compression.GZIP_LEVEL}", lambda: compression._GzipEncoder(compression.GZIP_LEVEL)
+    yield "gzip-9", lambda: compression._GzipEncoder(9)
+    if compression.brotli is not None:
+        yield f"br-{compression.BROTLI_QUALITY}", lambda: compression._BrotliEncoder(compression.BROTLI_QUALITY)
+        yield "br-11", lambda: compression._BrotliEncoder(11)
+    if compression.zstandard is not None:
+        yield f"zstd-{compression.ZSTD_LEVEL}", lambda: compression._ZstdEncoder(compression.ZSTD_LEVEL)
+
+
+def compress_whole(factory, body: bytes) -> bytes:
+    encoder = factory()
+    return encoder.compress(body) + encoder.finish()
+
+
+def compress_stream(factory, body: bytes) -> bytes:
+    encoder = factory()
+    parts = []
+    for offset in range(0, len(body), STREAM_CHUNK):
+        parts.append(encoder.compress(body[offset:offset + STREAM_CHUNK]) + encoder.flush())
+    parts.append(encoder.finish())
+    return b"".join(parts)
+
+
+def measure(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"Доступные кодировки: {', '.join(compression.ENCODERS)}; "
+          f"порог сжатия COMPRESSION_MIN_SIZE={compression.COMPRESSION_MIN_SIZE} байт")
+    print(f"{'Ответ':22} {'исходный':>9} {'кодировка':>10} {'сжатый':>8} {'сэконом.':>9} {'степень':>8} "
+          f"{'мс':>7} {'МБ/с':>7} {'поток':>8}")
+    for title, build in (("документы", documents_page), ("замечания", remarks_page)):
+        for rows in (1, 10, 100, 1000):
+            body = build(rows)
+            for name, factory in variants():
+                whole = compress_whole(factory, body)
+                streamed = compress_stream(factory, body)
+                elapsed = measure(lambda: compress_whole(factory, body), repeats)
+                throughput = len(body) / 1024 / 1024 / (elapsed / 1000) if elapsed else 0
+                print(f"{title + f' x{rows}':22} {len(body):>9} {name:>10} {len(whole):>8} "
+                      f"{len(body) - len(whole):>9} {len(body) / len(whole):>7.1f}x "
+                      f"{elapsed:>7.3f} {throughput:>7.1f} {len(streamed):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Сериализация страниц списков: response_model (Pydantic) и list_response.
+
+Для списков документов, файлов, записей ГПР и замечаний на временной
+SQLite базе сравнивает:
+    pydantic - загрузка ORM объектов и сериализация так, как FastAPI
+               обрабатывает response_model (проверка from_attributes,
+               dump в JSON-совместимые объекты, JSONResponse)
+    fast     - list_response: выборка только колонок схемы и orjson
+Проверяет, что оба пути дают одинаковый JSON, и выводит медиану времени
+на страницу из 100 и 1000 записей.
+
+Запуск: python benchmarks/bench_list_serialization.py [повторов]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.serialization import list_response, loads_json_field  # noqa: E402
+
+ROWS = 1000
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    now = datetime(2026, 1, 1, 8, 0, 0)
+    db.add(models.DocumentType(name="Акт"))
+    db.add(models.ProjectObject(object_id="OBJ-1", name="Объект 1"))
+    db.flush()
+    for i in range(ROWS):
+        db.add(models.Document(doc_number=f"Д-{i}", title=f"Исполнительная документация {i}",
+                               project_id=f"P{i % 10}", document_type_id=1, updated_at=now))
+        db.add(models.UploadedFile(filename=f"f{i}.pdf", original_filename=f"Файл {i}.pdf",
+                                   file_path=f"uploads/f{i}.pdf", file_size=1024 * i, content_type="application/pdf",
+                                   section_id=f"S{i % 5}", project_id=f"P{i % 10}", uploaded_by="bench"))
+        db.add(models.GPRRecord(customer_id=f"C{i % 3}", object_id="OBJ-1", work_type="kraska_b",
+                                volume_plan=100 + i, volume_fact=i / 2, volume_remainder=100 + i / 2,
+                                progress=round(i / 10, 2), daily_data=json.dumps({"2026-01-01": i})))
+        db.add(models.ConstructionRemark(remark_number=f"R-{i}", project_object_id=1, title=f"Замечание {i}",
+                                         description="Описание замечания", priority="normal",
+                                         deadline=now + timedelta(days=i % 30), created_by="bench"))
+    db.commit()
+    db.close()
+
+
+CASES = [
+    ("GET /api/documents/", models.Document, schemas.Document, None),
+    ("GET /api/files/", models.UploadedFile, schemas.UploadedFile, None),
+    ("GET /api/gpr/records", models.GPRRecord, schemas.GPRRecord, {"daily_data": loads_json_field}),
+    ("GET /construction-remarks/", models.ConstructionRemark, schemas.ConstructionRemark, None),
+]
+
+
+def pydantic_path(db, model, schema, limit, field, loop) -> bytes:
+    rows = db.query(model).limit(limit).all()
+    content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def fast_path(db, model, schema, limit, converters) -> bytes:
+    return list_response(db.query(model).limit(limit), schema, converters=converters).body
+
+
+def measure(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    seed()
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+
+    print(f"{'Эндпоинт':28} {'строк':>6} {'pydantic, мс':>13} {'fast, мс':>9} {'ускорение':>10}")
+    for title, model, schema, converters in CASES:
+        field = create_response_field(name="Response", type_=List[schema])
+        for limit in (100, ROWS):
+            expected = json.loads(pydantic_path(db, model, schema, limit, field, loop))
+            actual = json.loads(fast_path(db, model, schema, limit, converters))
+            if expected != actual:
+                raise SystemExit(f"{title}: ответы не совпадают")
+            # Каждый замер - новая сессия, чтобы ORM объекты не брались из identity map
+            def run_pydantic():
+                with SessionLocal() as session:
+                    pydantic_path(session, model, schema, limit, field, loop)
+
+            def run_fast():
+                with SessionLocal() as session:
+                    fast_path(session, model, schema, limit, converters)
+
+            slow = measure(run_pydantic, repeats)
+            fast = measure(run_fast, repeats)
+            print(f"{title:28} {limit:>6} {slow:>13.2f} {fast:>9.2f} {slow / fast:>9.1f}x")
+
+    db.close()
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
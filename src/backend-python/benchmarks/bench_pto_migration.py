@@ -0,0 +1,139 @@
+"""
+Скорость и расход памяти переноса реестра ПТО (migrate_pto_docs.py).
+
+Создает во временном каталоге базу реестра ПТО со схемой
+doc_tracking_system.py (документы, у части - отправки и возвраты,
+пользователи, несколько строк с расхождениями) и переносит ее в пустую
+БД бэкенда (SQLite; DATABASE_URL задает другую). Выводит время, скорость
+и пик памяти Python (tracemalloc) для нескольких размеров базы: при
+переносе пачками пик не должен расти вместе с числом документов.
+Затем повторный перенос - все документы должны быть пропущены.
+
+Запуск: python benchmarks/bench_pto_migration.py [число документов ...]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/backend.db"
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+from sqlalchemy import delete  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.utils import pto_migration  # noqa: E402
+from doc_tracking_system import DocTrackingSystem  # noqa: E402
+
+STATUSES = ("в наличии", "отправлен", "возвращен")
+
+
+def build_legacy_database(path: str, documents: int):
+    # Схема - из самого реестра ПТО
+    DocTrackingSystem(path).close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO users (username, full_name) VALUES (?, ?)",
+                         [(f"pto{i}", f"Инженер ПТО {i}") for i in range(1, 21)])
+        conn.executemany(
+            "INSERT INTO documents (id, doc_number, doc_title, project_number, issue_date, doc_type, status, created_by) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((i, f"ИД-{i}", f"Акт освидетельствования скрытых работ {i}", f"П-{i % 40}" if i % 10 else None,
+              "2025-12-01", ("Акт", "Схема", None)[i % 3], STATUSES[i % 3], i % 20 + 1)
+             for i in range(1, documents + 1))
+        )
+        # i % 3 == 1: отправлен; i % 3 == 2: отправлен и возвращен
+        conn.executemany(
+            "INSERT INTO shipments (doc_id, recipient, shipment_date, shipped_by) VALUES (?, ?, ?, ?)",
+            ((i, f"Заказчик {i % 15}", f"2026-01-{i % 28 + 1:02d}", i % 20 + 1)
+             for i in range(1, documents + 1) if i % 3)
+        )
+        conn.executemany(
+            "INSERT INTO returns (doc_id, return_date, returned_by, condition) VALUES (?, ?, ?, ?)",
+            ((i, f"2026-02-{i % 28 + 1:02d}", i % 20 + 1, "хорошее")
+             for i in range(1, documents + 1) if i % 3 == 2)
+        )
+        # Расхождения: неизвестный статус, некорректная дата и отправка несуществующего документа
+        conn.execute("UPDATE documents SET status = 'утерян' WHERE id = 3")
+        conn.execute("UPDATE shipments SET shipment_date = '01.01.2026' WHERE doc_id = 1")
+        # Документ 4 (отправлен 2026-01-05) в тот же день возвращен на исправление и отправлен снова
+        conn.execute("INSERT INTO returns (doc_id, return_date, returned_by, condition) "
+                     "VALUES (4, '2026-01-05', 1, 'на исправление')")
+        conn.execute("INSERT INTO shipments (doc_id, recipient, shipment_date, shipped_by) "
+                     "VALUES (4, 'Заказчик 4', '2026-01-05', 1)")
+        conn.execute("INSERT INTO shipments (doc_id, recipient, shipment_date) VALUES (?, 'Никто', '2026-01-01')",
+                     (documents + 100,))
+    conn.close()
+
+
+def check_same_day_reshipment():
+    """Документ 4: отправка, возврат и повторная отправка за один день - итог 'отправлен'"""
+    with SessionLocal() as db:
+        document = db.query(models.Document).join(
+            models.LegacyDocumentMap,
+            (models.LegacyDocumentMap.new_id == models.Document.id) & (models.LegacyDocumentMap.entity == "documents")
+        ).filter(models.LegacyDocumentMap.legacy_id == 4).one()
+        assert document.status == models.DocumentStatus.SHIPPED.value, document.status
+        assert document.last_shipment_id > document.last_return_id, (document.last_shipment_id, document.last_return_id)
+        history = [row.new_status for row in db.query(models.DocumentStatusHistory).filter(
+            models.DocumentStatusHistory.document_id == document.id).order_by(models.DocumentStatusHistory.id)]
+        assert history == ["in_office", "shipped", "returned", "shipped"], history
+
+
+def clear_backend():
+    with SessionLocal() as db:
+        for model in (models.LegacyDocumentMap, models.ChangeLog, models.DocumentStatusHistory,
+                      models.DocumentShipment, models.DocumentReturn, models.Document):
+            db.execute(delete(model))
+        db.commit()
+
+
+def migrate(path: str):
+    legacy = pto_migration.open_legacy_database(path)
+    try:
+        with SessionLocal() as db:
+            return pto_migration.PtoMigrator(db, legacy, pto_migration.MigrationReport()).run()
+    finally:
+        legacy.close()
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [20000, 100000]
+    Base.metadata.create_all(bind=engine)
+    workdir = tempfile.mkdtemp()
+    print(f"{'документов':>10} {'с':>7} {'док/с':>8} {'пик, МБ':>8} {'повторно, с':>12}  расхождения")
+    for size in sizes:
+        path = os.path.join(workdir, f"pto_{size}.db")
+        build_legacy_database(path, size)
+        clear_backend()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        report = migrate(path)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        rerun = migrate(path)
+        rerun_elapsed = time.perf_counter() - started
+        assert rerun.counts["documents"] == 0 and rerun.counts["skipped_documents"] == size, rerun.counts
+        # Движение с некорректной датой не перенесено, но и не считается появившимся позже
+        assert not rerun.mismatches["changed_after_migration"], rerun.samples["changed_after_migration"]
+        assert report.counts["documents"] == size, report.counts
+        assert not report.mismatches["invalid_transition"], report.samples["invalid_transition"]
+        check_same_day_reshipment()
+
+        print(f"{size:>10} {elapsed:>7.1f} {size / elapsed:>8.0f} {peak / 1024 / 1024:>8.1f} {rerun_elapsed:>12.1f}  "
+              f"{dict(report.mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
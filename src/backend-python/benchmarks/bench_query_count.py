@@ -0,0 +1,118 @@
+"""
+Количество SQL запросов и фиксаций транзакций на запрос к API.
+
+Выполняет типовые операции записи (документы, отправки, замечания, ГПР
+с проверкой материалов, остатки) через TestClient на временной SQLite
+базе и для каждого эндпоинта выводит число выполненных SQL выражений
+и число COMMIT.
+
+Запуск: python benchmarks/bench_query_count.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import models  # noqa: E402
+from app.api import gpr_routes  # noqa: E402
+from app.api.construction_remarks_routes import router as construction_remarks_router  # noqa: E402
+from app.api.document_routes import router as document_router  # noqa: E402
+from app.api.file_routes import router as file_router  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.permissions import ALL_PERMISSIONS  # noqa: E402
+from app.unit_of_work import UnitOfWorkMiddleware  # noqa: E402
+
+
+class QueryCounter:
+    def __init__(self, db_engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(db_engine, "before_cursor_execute", self._on_execute)
+        event.listen(db_engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UnitOfWorkMiddleware)
+    app.include_router(gpr_routes.router)
+    app.include_router(document_router)
+    app.include_router(file_router)
+    app.include_router(construction_remarks_router)
+    return app
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all([
+        models.ProjectObject(object_id="OBJ-1", name="Объект 1"),
+        models.Material(name="Краска б"),
+    ])
+    db.commit()
+    db.close()
+
+
+def main():
+    seed()
+    counter = QueryCounter(engine)
+    token = create_access_token({"sub": "bench", "user_id": 1, "is_admin": True, "perms": int(ALL_PERMISSIONS)})
+    headers = {"Authorization": f"Bearer {token}"}
+    client = TestClient(build_app())
+
+    steps = [
+        ("POST /api/documents/types", "post", "/api/documents/types", {"name": "Акт"}),
+        ("POST /api/documents/", "post", "/api/documents/",
+         {"doc_number": "1", "title": "Документ", "project_id": "P1", "document_type_id": 1}),
+        ("PUT /api/documents/1", "put", "/api/documents/1", {"title": "Документ (ред.)"}),
+        ("POST /api/documents/1/shipments", "post", "/api/documents/1/shipments",
+         {"document_id": 1, "recipient": "Заказчик", "shipment_date": "2026-01-01T00:00:00"}),
+        ("POST /api/documents/1/returns", "post", "/api/documents/1/returns",
+         {"document_id": 1, "return_date": "2026-01-10T00:00:00", "condition": "good"}),
+        ("POST /api/files/material-stocks", "post", "/api/files/material-stocks",
+         {"material_id": 1, "quantity": 5, "min_threshold": 10}),
+        ("POST /construction-remarks/", "post", "/construction-remarks/",
+         {"remark_number": "R-1", "project_object_id": 1, "title": "Замечание", "description": "Описание",
+          "created_by": "bench"}),
+        ("PUT /construction-remarks/1", "put", "/construction-remarks/1", {"status": "in_progress"}),
+        ("POST /api/gpr/records", "post", "/api/gpr/records",
+         {"customer_id": "C1", "object_id": "OBJ-1", "work_type": "kraska_b", "volume_plan": 100}),
+        ("POST /api/gpr/records/1/update-fact", "post", "/api/gpr/records/1/update-fact?volume_fact=10", None),
+        ("GET /api/documents/", "get", "/api/documents/", None),
+    ]
+
+    print(f"{'Эндпоинт':45} {'статус':>6} {'SQL':>5} {'COMMIT':>7}")
+    total_statements = total_commits = 0
+    for title, method, url, body in steps:
+        counter.reset()
+        kwargs = {"headers": headers}
+        if body is not None:
+            kwargs["json"] = body
+        response = getattr(client, method)(url, **kwargs)
+        total_statements += counter.statements
+        total_commits += counter.commits
+        print(f"{title:45} {response.status_code:>6} {counter.statements:>5} {counter.commits:>7}")
+    print(f"{'Итого':45} {'':>6} {total_statements:>5} {total_commits:>7}")
+
+
+if __name__ == "__main__":
+    main()
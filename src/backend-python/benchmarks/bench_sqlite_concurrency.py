@@ -0,0 +1,122 @@
+"""
+Бенчмарк чтения SQLite во время пакетной записи.
+
+Писатель в отдельном потоке вставляет документы крупными транзакциями
+(как при загрузке пакета), читатели параллельно выполняют запросы списка.
+Сравниваются движок с настройками по умолчанию (журнал отката) и движок
+из create_db_engine (WAL, synchronous=NORMAL, busy_timeout, mmap, cache_size).
+
+Запуск: python benchmarks/bench_sqlite_concurrency.py [--readers 4] [--batches 10] [--batch-size 20000]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.database import Base, create_db_engine  # noqa: E402
+from app.models import Document, DocumentType  # noqa: E402
+
+
+def prepare(engine):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(DocumentType), [{"name": "Акт"}])
+
+
+def writer(engine, args, stop_event, stats):
+    rows = [
+        {"doc_number": f"D-{i}", "title": f"Документ {i}", "project_id": f"P{i % 20}", "document_type_id": 1}
+        for i in range(args.batch_size)
+    ]
+    start = time.perf_counter()
+    for _ in range(args.batches):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Document), rows)
+                # Имитация обработки файлов внутри транзакции загрузки
+                time.sleep(args.hold)
+        except OperationalError:
+            stats["write_errors"] += 1
+    stats["write_time"] = time.perf_counter() - start
+    stop_event.set()
+
+
+def reader(engine, stop_event, latencies, errors):
+    # Типичный запрос списка документов проекта
+    query = (
+        select(Document.id, Document.doc_number, Document.title, Document.status)
+        .where(Document.project_id == "P3")
+        .order_by(Document.id.desc())
+        .limit(50)
+    )
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(query).fetchall()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+
+
+def run(title, engine, args):
+    prepare(engine)
+    stop_event = threading.Event()
+    stats = {"write_errors": 0, "write_time": 0.0}
+    latencies, errors = [], []
+
+    readers = [
+        threading.Thread(target=reader, args=(engine, stop_event, latencies, errors))
+        for _ in range(args.readers)
+    ]
+    write_thread = threading.Thread(target=writer, args=(engine, args, stop_event, stats))
+    for thread in readers:
+        thread.start()
+    write_thread.start()
+    write_thread.join()
+    for thread in readers:
+        thread.join()
+    engine.dispose()
+
+    print(title)
+    print(f"  запись: {args.batches} транзакций за {stats['write_time']:.2f} с, ошибок {stats['write_errors']}")
+    if latencies:
+        latencies.sort()
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+        stalls = sum(1 for latency in latencies if latency > args.stall)
+        print(f"  чтение: {len(latencies)} запросов, p50 {statistics.median(latencies) * 1000:.2f} мс, "
+              f"p99 {p99 * 1000:.2f} мс, max {latencies[-1] * 1000:.2f} мс")
+        print(f"  запросов дольше {args.stall * 1000:.0f} мс: {stalls}")
+    print(f"  ошибок чтения (database is locked): {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--hold", type=float, default=0.0, help="Длительность удержания транзакции записи, с")
+    parser.add_argument("--stall", type=float, default=0.1, help="Порог задержки чтения, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = create_engine(
+            f"sqlite:///{tmp}/legacy.db",
+            connect_args={"check_same_thread": False, "timeout": 1}
+        )
+        run("Прежние настройки (журнал отката)", legacy, args)
+        print()
+        tuned = create_db_engine(f"sqlite:///{tmp}/tuned.db")
+        run("create_db_engine (WAL)", tuned, args)
+
+
+if __name__ == "__main__":
+    main()
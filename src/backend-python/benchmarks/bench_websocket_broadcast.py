@@ -0,0 +1,101 @@
+"""
+Бенчмарк рассылки WebSocket сообщений на 1000 имитированных клиентов.
+
+Сравнивает прежнюю последовательную рассылку (await send_text для каждого
+сокета по очереди) с рассылкой через очереди отправки ConnectionManager.
+Часть клиентов имитирует медленную мобильную сеть.
+
+Запуск: python benchmarks/bench_websocket_broadcast.py [--clients 1000] [--slow 50]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.websocket_manager import ConnectionManager  # noqa: E402
+
+
+class FakeWebSocket:
+    """Имитация WebSocket клиента с заданной задержкой отправки"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.received_at = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+        self.received_at.append(time.perf_counter())
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+
+def make_clients(count: int, slow: int, fast_delay: float, slow_delay: float):
+    return [FakeWebSocket(slow_delay if i < slow else fast_delay) for i in range(count)]
+
+
+def summarize(title: str, call_time: float, latencies):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{title}")
+    print(f"  вызов broadcast:            {call_time * 1000:9.2f} мс")
+    print(f"  доставка быстрым клиентам:  p50 {p50 * 1000:9.2f} мс, p99 {p99 * 1000:9.2f} мс, "
+          f"max {latencies[-1] * 1000:9.2f} мс")
+    print(f"  среднее:                    {statistics.mean(latencies) * 1000:9.2f} мс")
+
+
+async def bench_sequential(args):
+    """Прежняя реализация: последовательный await send_text"""
+    clients = make_clients(args.clients, args.slow, args.fast_delay, args.slow_delay)
+    start = time.perf_counter()
+    for websocket in clients:
+        await websocket.send_text('{"type": "benchmark"}')
+    call_time = time.perf_counter() - start
+    fast = [ws.received_at[0] - start for ws in clients[args.slow:]]
+    summarize("Последовательная рассылка", call_time, fast)
+
+
+async def bench_queued(args):
+    """Рассылка через очереди отправки ConnectionManager"""
+    manager = ConnectionManager(queue_size=args.queue_size, slow_consumer_policy="drop")
+    clients = make_clients(args.clients, args.slow, args.fast_delay, args.slow_delay)
+    for user_id, websocket in enumerate(clients):
+        await manager.connect(websocket, user_id)
+
+    start = time.perf_counter()
+    await manager.broadcast_to_all({"type": "benchmark"})
+    call_time = time.perf_counter() - start
+
+    # Ждем доставки всем быстрым клиентам
+    while any(not ws.received_at for ws in clients[args.slow:]):
+        await asyncio.sleep(0.001)
+    fast = [ws.received_at[0] - start for ws in clients[args.slow:]]
+    summarize("Рассылка через очереди соединений", call_time, fast)
+    await manager.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=50, help="Количество медленных клиентов")
+    parser.add_argument("--fast-delay", type=float, default=0.0005, help="Задержка send_text быстрого клиента, с")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="Задержка send_text медленного клиента, с")
+    parser.add_argument("--queue-size", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"Клиентов: {args.clients}, из них медленных: {args.slow}\n")
+    asyncio.run(bench_sequential(args))
+    print()
+    asyncio.run(bench_queued(args))
+
+
+if __name__ == "__main__":
+    main()
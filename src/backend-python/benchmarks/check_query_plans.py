@@ -0,0 +1,277 @@
+"""
+Проверка планов запросов CRUD функций (EXPLAIN).
+
+Заполняет временную БД (по умолчанию SQLite; DATABASE_URL задает другую)
+так, чтобы основные таблицы были больше LARGE_TABLE_ROWS строк, выполняет
+CRUD функции из CASES, перехватывает все их SQL выражения и получает для
+каждого план выполнения:
+    SQLite     - EXPLAIN QUERY PLAN, ищется "SCAN <таблица>"
+    PostgreSQL - EXPLAIN при enable_seqscan=off, ищется "Seq Scan on <таблица>"
+                 (последовательное чтение остается, только если нет
+                 подходящего индекса)
+Полный просмотр большой таблицы - ошибка, если для случая он не разрешен
+явно (с причиной, например поиск по подстроке). Код выхода 1 при ошибках,
+поэтому скрипт можно запускать в CI после изменения моделей или запросов.
+
+Запуск: python benchmarks/check_query_plans.py [-v]
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/plans.db"
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from app import crud, crud_construction_remarks, crud_document_analytics, crud_sync, crud_user, crud_work_session, models, schemas  # noqa: E402
+from app.conditional import list_validators  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+LARGE_TABLE_ROWS = int(os.getenv("LARGE_TABLE_ROWS", "1000"))
+ROWS = LARGE_TABLE_ROWS * 2
+
+# Идентификаторы записей в середине таблиц, по которым выполняются случаи
+DOCUMENT_ID = ROWS // 2
+IN_OFFICE_DOCUMENT_ID = DOCUMENT_ID - DOCUMENT_ID % 3
+USER_ID = 7
+REMARK_ID = ROWS // 2
+PROJECT_OBJECT_ID = 3
+# Момент проверки сроков замечаний (сроки в данных - от -30 до +29 дней от 2026-03-01)
+OVERDUE_SCAN_NOW = datetime(2026, 3, 1, 9, 0)
+# Большая часть замечаний закрыта, как в рабочей базе
+REMARK_STATUSES = ("CLOSED", "CLOSED", "CLOSED", "VERIFIED", "FIXED", "CLOSED", "NEW", "IN_PROGRESS")
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    now = datetime(2026, 3, 1, 9, 0)
+    with SessionLocal() as db:
+        def insert(model, rows):
+            db.execute(model.__table__.insert(), rows)
+
+        insert(models.DocumentType, [{"name": "Акт"}])
+        insert(models.User, [{"username": f"user{i}", "hashed_password": "x"} for i in range(1, 51)])
+        insert(models.ProjectObject, [{"object_id": f"OBJ-{i}", "name": f"Объект {i}"} for i in range(1, 11)])
+        insert(models.Document, [{
+            "doc_number": f"Д-{i}", "title": f"Исполнительная документация {i}", "project_id": f"P{i % 20}",
+            "document_type_id": 1, "status": ("in_office", "shipped", "returned")[i % 3],
+        } for i in range(1, ROWS + 1)])
+        insert(models.DocumentShipment, [{
+            "document_id": i, "recipient": "Заказчик", "shipment_date": now + timedelta(hours=i),
+        } for i in range(1, ROWS + 1)])
+        insert(models.DocumentReturn, [{
+            "document_id": i, "return_date": now + timedelta(days=1, hours=i), "condition": "good",
+        } for i in range(1, ROWS + 1, 2)])
+        insert(models.DocumentStatusHistory, [{
+            "document_id": i, "old_status": "in_office", "new_status": "shipped", "recipient": "Заказчик",
+            "shipment_id": i, "changed_at": now + timedelta(hours=i),
+        } for i in range(1, ROWS + 1)])
+        insert(models.UploadedFile, [{
+            "filename": f"f{i}.pdf", "original_filename": f"Файл {i}.pdf", "file_path": f"uploads/f{i}.pdf",
+            "file_size": 1024, "project_id": f"P{i % 20}", "section_id": f"S{i % 5}", "uploaded_by": "check",
+        } for i in range(1, ROWS + 1)])
+        insert(models.UserSession, [{
+            "user_id": i % 50 + 1, "session_token": f"t{i}", "expires_at": now + timedelta(days=i % 30),
+            "is_revoked": i % 4 == 0,
+        } for i in range(1, ROWS + 1)])
+        insert(models.WorkSession, [{
+            "user_id": i % 50 + 1, "start_time": now - timedelta(hours=i), "is_active": False,
+        } for i in range(1, ROWS + 1)])
+        insert(models.ConstructionRemark, [{
+            "remark_number": f"R-{i}", "project_object_id": i % 10 + 1, "title": f"Замечание {i}",
+            "description": "Описание", "status": REMARK_STATUSES[i % len(REMARK_STATUSES)], "priority": "normal",
+            "created_by": "check",
+            "deadline": now + timedelta(days=i % 60 - 30),
+        } for i in range(1, ROWS + 1)])
+        insert(models.RemarkPhoto, [{
+            "remark_id": i, "file_path": f"p{i}.jpg", "filename": f"p{i}.jpg", "file_size": 1, "created_by": "check",
+        } for i in range(1, ROWS + 1)])
+        insert(models.RemarkHistory, [{
+            "remark_id": i, "new_status": "NEW", "changed_by": "check",
+        } for i in range(1, ROWS + 1)])
+        insert(models.ChangeLog, [{
+            "entity": "documents", "entity_id": i, "operation": "update",
+        } for i in range(1, ROWS + 1)])
+        crud_construction_remarks.rebuild_remark_counters(db, now)
+        db.commit()
+
+    # Статистика для планировщика
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+
+def large_tables():
+    with SessionLocal() as db:
+        return {
+            table.name for table in Base.metadata.sorted_tables
+            if db.execute(select(func.count()).select_from(table)).scalar() >= LARGE_TABLE_ROWS
+        }
+
+
+def _get_document_detailed(db):
+    # Как в GET /api/documents/{id}
+    return db.query(models.Document)\
+        .options(selectinload(models.Document.type))\
+        .options(selectinload(models.Document.shipments))\
+        .options(selectinload(models.Document.returns))\
+        .filter(models.Document.id == DOCUMENT_ID).first()
+
+
+def _delete_guard(db):
+    # Как в DELETE /api/documents/{id}: проверка связанных отправок и возвратов
+    return crud.get_document_shipments(db, DOCUMENT_ID) or crud.get_document_returns(db, DOCUMENT_ID)
+
+
+def _ship_and_delete(db):
+    shipment = crud.create_document_shipment(db, schemas.DocumentShipmentCreate(
+        document_id=IN_OFFICE_DOCUMENT_ID, recipient="Проверка", shipment_date=datetime(2026, 4, 1)
+    ))
+    crud.delete_document_shipment(db, shipment.id)
+
+
+# (название, функция от сессии, причина, по которой полный просмотр допустим)
+CASES = [
+    ("get_document", lambda db: crud.get_document(db, DOCUMENT_ID), None),
+    ("get_document (shipments, returns)", _get_document_detailed, None),
+    ("get_documents(project_id)", lambda db: crud.get_documents(db, project_id="P3"), None),
+    ("get_documents(status)", lambda db: crud.get_documents(db, status="shipped"), None),
+    ("get_documents()", lambda db: crud.get_documents(db), "страница без фильтров, LIMIT"),
+    ("list_validators(documents, project_id)", lambda db: list_validators(
+        db.query(models.Document).filter(models.Document.project_id == "P3"), models.Document, "0:100"), None),
+    ("search_documents(query_str)", lambda db: crud.search_documents(db, query_str="12"), "поиск по подстроке (LIKE '%...%')"),
+    ("get_document_shipments", lambda db: crud.get_document_shipments(db, DOCUMENT_ID), None),
+    ("get_document_returns", lambda db: crud.get_document_returns(db, DOCUMENT_ID), None),
+    ("delete_document (проверка связей)", _delete_guard, None),
+    ("create/delete_document_shipment", _ship_and_delete, None),
+    ("create_document_shipments_bulk", lambda db: crud.create_document_shipments_bulk(
+        db, schemas.DocumentShipmentBulkCreate(document_ids=list(range(1, 201)), recipient="Проверка",
+                                               shipment_date=datetime(2026, 4, 1))), None),
+    ("get_document_status_history", lambda db: crud.get_document_status_history(db, DOCUMENT_ID), None),
+    ("get_turnaround_by_recipient", lambda db: crud_document_analytics.get_turnaround_by_recipient(db),
+     "агрегат по всей истории статусов"),
+    ("get_uploaded_files(project_id)", lambda db: crud.get_uploaded_files(db, project_id="P3"), None),
+    ("get_user_sessions(user_id)", lambda db: crud_user.get_user_sessions(db, user_id=USER_ID), None),
+    ("revoke_user_sessions_for_user", lambda db: crud_user.revoke_user_sessions_for_user(db, USER_ID), None),
+    ("get_revoked_sessions", lambda db: crud_user.get_revoked_sessions(db), None),
+    ("get_active_work_session", lambda db: crud_work_session.get_active_work_session(db, USER_ID), None),
+    ("get_work_sessions_by_user", lambda db: crud_work_session.get_work_sessions_by_user(db, USER_ID), None),
+    ("get_work_sessions_for_date", lambda db: crud_work_session.get_work_sessions_for_date(db, USER_ID, date(2026, 2, 25)), None),
+    ("get_construction_remarks(project_object_id)",
+     lambda db: crud_construction_remarks.get_construction_remarks(db, project_object_id=PROJECT_OBJECT_ID), None),
+    ("get_remark_photos", lambda db: crud_construction_remarks.get_remark_photos(db, REMARK_ID), None),
+    ("get_remark_history", lambda db: crud_construction_remarks.get_remark_history(db, REMARK_ID), None),
+    ("get_remarks_summary_by_project_object",
+     lambda db: crud_construction_remarks.get_remarks_summary_by_project_object(db, PROJECT_OBJECT_ID), None),
+    ("get_remarks_summaries", lambda db: crud_construction_remarks.get_remarks_summaries(db, range(1, 11)), None),
+    ("update_construction_remark (счетчики)", lambda db: crud_construction_remarks.update_construction_remark(
+        db, REMARK_ID, schemas.ConstructionRemarkUpdate(status=schemas.RemarkStatus.IN_PROGRESS, priority="high")), None),
+    ("get_overdue_remarks", lambda db: crud_construction_remarks.get_overdue_remarks(db, now=OVERDUE_SCAN_NOW), None),
+    ("scan_overdue_remarks (за интервал)", lambda db: crud_construction_remarks.scan_overdue_remarks(
+        db, OVERDUE_SCAN_NOW - timedelta(minutes=5), OVERDUE_SCAN_NOW), None),
+    ("sync get_changes", lambda db: crud_sync.get_changes(db, ROWS - 50, ["documents"]), None),
+]
+
+_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (\w+)"),
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+class StatementCapture:
+    """Сбор SQL выражений, выполненных на движке"""
+
+    def __init__(self):
+        self.statements = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            self.statements.append((statement, parameters))
+
+
+def explain(statement: str, parameters) -> list:
+    """Строки плана выполнения выражения"""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if engine.dialect.name == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            return [row[3] for row in cursor.fetchall()]
+        cursor.execute("SET enable_seqscan = off")
+        cursor.execute("EXPLAIN " + statement, parameters)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def full_scans(plan: list, tables: set) -> list:
+    pattern = _SCAN_PATTERNS.get(engine.dialect.name, _SCAN_PATTERNS["postgresql"])
+    scanned = []
+    for line in plan:
+        for name in pattern.findall(line):
+            # Псевдонимы SQLAlchemy (documents_1) относятся к той же таблице
+            table = re.sub(r"_\d+$", "", name)
+            if table in tables:
+                scanned.append(table)
+    return scanned
+
+
+def main():
+    verbose = "-v" in sys.argv
+    seed()
+    tables = large_tables()
+    capture = StatementCapture()
+    print(f"Большие таблицы (>= {LARGE_TABLE_ROWS} строк): {', '.join(sorted(tables))}")
+
+    failures = 0
+    for title, func_, allowed in CASES:
+        capture.statements = []
+        with SessionLocal() as db:
+            capture.active = True
+            try:
+                func_(db)
+                db.flush()
+            finally:
+                capture.active = False
+                db.rollback()
+
+        scans = []
+        for statement, parameters in capture.statements:
+            plan = explain(statement, parameters)
+            scanned = full_scans(plan, tables)
+            if scanned:
+                scans.append((statement, plan, scanned))
+            elif verbose:
+                print(f"    {' '.join(statement.split())[:120]}\n      " + "\n      ".join(plan))
+
+        if not scans:
+            status = "OK"
+        elif allowed:
+            status = f"просмотр разрешен: {allowed}"
+        else:
+            status = "ПОЛНЫЙ ПРОСМОТР"
+            failures += 1
+        print(f"{title:45} {len(capture.statements):>3} SQL  {status}")
+        if scans and (not allowed or verbose):
+            for statement, plan, scanned in scans:
+                print(f"    {', '.join(sorted(set(scanned)))}: {' '.join(statement.split())[:160]}")
+                for line in plan:
+                    print(f"      {line}")
+
+    if failures:
+        print(f"\nЗапросов с полным просмотром больших таблиц: {failures}")
+        sys.exit(1)
+    print("\nПолных просмотров больших таблиц не найдено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Проверка маршрутизации чтения между основной БД и репликой на двух файлах SQLite.
+
+Реплика - отдельный файл, который не получает изменений после копирования,
+поэтому по данным видно, из какой БД выполнено чтение:
+    1. запись идет в основную БД, чтение другого клиента - из реплики (старые данные);
+    2. клиент, только что выполнивший запись, читает из основной БД;
+    3. после окна read-your-writes клиент снова читает из реплики;
+    4. при недоступной реплике чтение переключается на основную БД.
+
+Запуск: python benchmarks/check_read_replicas.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+tmp = tempfile.mkdtemp()
+primary_path = os.path.join(tmp, "primary.db")
+replica_path = os.path.join(tmp, "replica.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{primary_path}"
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{replica_path},sqlite:///{tmp}/missing/replica.db"
+os.environ["DB_READ_YOUR_WRITES_SECONDS"] = "0.5"
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app import database  # noqa: E402
+from app.models import DocumentType  # noqa: E402
+
+
+def read_names(key):
+    db = database.read_router.open_read_session(key)
+    try:
+        return sorted(name for (name,) in db.query(DocumentType.name))
+    finally:
+        db.close()
+
+
+def write(key, name):
+    db = database.SessionLocal()
+    db.info["client_key"] = key
+    try:
+        db.add(DocumentType(name=name))
+        db.commit()
+    finally:
+        db.close()
+
+
+def check(title, condition):
+    print(f"{'OK  ' if condition else 'FAIL'} {title}")
+    return condition
+
+
+def main():
+    database.Base.metadata.create_all(bind=database.engine)
+    write(None, "Акт")
+    database.engine.dispose()
+    shutil.copy(primary_path, replica_path)
+
+    results = []
+    write("client-a", "Чертеж")
+    results.append(check("клиент A сразу после записи читает из основной БД",
+                         read_names("client-a") == ["Акт", "Чертеж"]))
+    results.append(check("клиент B читает из реплики (без новой записи)",
+                         read_names("client-b") == ["Акт"]))
+    # Вторая реплика недоступна: после отказа она пропускается
+    results.append(check("недоступная реплика пропущена, чтение из рабочей реплики",
+                         read_names("client-b") == ["Акт"]))
+    time.sleep(0.6)
+    results.append(check("после окна read-your-writes клиент A читает из реплики",
+                         read_names("client-a") == ["Акт"]))
+
+    db = database.read_router.open_read_session("client-b")
+    try:
+        db.add(DocumentType(name="Запрещено"))
+        db.flush()
+        results.append(check("запись через сессию чтения запрещена", False))
+    except RuntimeError:
+        results.append(check("запись через сессию чтения запрещена", True))
+    finally:
+        db.close()
+
+    os.remove(replica_path)
+    os.makedirs(replica_path)  # файл реплики больше не открывается
+    for replica in database.read_router.replicas:
+        replica.kw["bind"].dispose()
+    database.read_router._down_until = [0.0] * len(database.read_router.replicas)
+    results.append(check("при недоступных репликах чтение идет из основной БД",
+                         read_names("client-b") == ["Акт", "Чертеж"]))
+
+    print(database.read_router.get_stats())
+    shutil.rmtree(tmp, ignore_errors=True)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,8 @@ from pathlib import Path
 # Добавим путь к директории проекта
 sys.path.append(str(Path(__file__).parent))
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.database import Base
+from app.database import Base, create_db_engine
 from app.models import DocumentType
 from app.crud import create_document_type
 from app.schemas import DocumentTypeCreate
@@ -18,7 +17,7 @@ from app.schemas import DocumentTypeCreate
 # Получаем URL базы данных из переменных окружения, если доступно
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./strod_service_tech.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_database():
@@ -52,6 +51,7 @@ def init_database():
             for doc_type_data in default_doc_types:
                 doc_type = DocumentTypeCreate(**doc_type_data)
                 create_document_type(db, doc_type)
+            db.commit()
             
             print(f"Добавлено {len(default_doc_types)} типов документов.")
         else:
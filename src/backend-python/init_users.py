@@ -5,18 +5,17 @@ Script to initialize default users in the database.
 
 import os
 import sys
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 # Add the app directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.database import DATABASE_URL, Base
+from app.database import DATABASE_URL, Base, create_db_engine
 from app import crud_user, schemas
 from app.auth import get_password_hash
 
 def init_users():
-    engine = create_engine(DATABASE_URL)
+    engine = create_db_engine(DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
     
@@ -48,6 +47,7 @@ def init_users():
         )
         
         created_admin = crud_user.create_user(db, admin_user)
+        db.commit()
         print(f"Successfully created admin user: {created_admin.username}")
         
     except Exception as e:
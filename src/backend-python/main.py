@@ -7,8 +7,7 @@ from datetime import date
 
 from fastapi import FastAPI, Request, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
@@ -17,13 +16,29 @@ from app.api.auth_routes import router as auth_router
 from app.api.construction_remarks_routes import router as construction_remarks_router
 from app.api.document_routes import router as document_router
 from app.api.file_routes import router as file_router
+from app.api.sync_routes import router as sync_router
 from app.api.work_session_routes import router as work_session_router
 from app.auth import get_current_active_user
-from app.database import get_db
+from app.database import get_read_db
+from app.unit_of_work import UnitOfWorkMiddleware
+from app.profiler import ProfiledRoute, ProfilerMiddleware, profiler
+from app.metrics import MetricsMiddleware, registry as metrics_registry
+from app.compression import CompressionMiddleware, PrecompressedStaticFiles
 from app import crud_work_session
-from app.websocket_manager import manager
+from app.websocket_manager import manager, WS_AUTH_TIMEOUT
+from app import events, outbox
+# Регистрация обработчиков фоновых задач заполнения реестра документов и просрочки замечаний
+from app.utils import document_movements  # noqa: F401
+from app.utils import remark_deadlines
+from app.backplane import create_backplane
 from app.auth import verify_access_token
+from app.permissions import Permission, require
+import asyncio
 import json
+import os
+
+# Токен для доступа к /metrics (пусто - без авторизации, например во внутренней сети)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 # Initialize templates
 templates = Jinja2Templates(directory="templates")
@@ -34,13 +49,29 @@ async def lifespan(app: FastAPI):
     # Запуск инициализации складских остатков при старте приложения
     from app.utils.material_checker import initialize_material_stocks
     from app.database import SessionLocal
-    from app import crud_user, schemas
+    from app import crud_sync, crud_user, schemas
+    from app.auth import revoked_sessions
     import os
 
+    # Публикация доменных событий из CRUD слоя и обмен ими между воркерами
+    events.start(asyncio.get_running_loop(), create_backplane())
+    # Ping клиентов и закрытие соединений, переставших отвечать
+    manager.start_heartbeat()
+
     db = SessionLocal()
     try:
         initialize_material_stocks(db)
 
+        # Загружаем отозванные сессии, чтобы проверка токенов не обращалась к БД
+        revoked_sessions.load(crud_user.get_revoked_sessions(db))
+        crud_user.ensure_default_roles(db)
+        # Журнал изменений для синхронизации клиентов хранится SYNC_RETENTION_DAYS
+        crud_sync.prune_change_log(db)
+        outbox.prune_finished_jobs(db)
+        # Периодическая отметка просроченных замечаний (задача сама ставит следующий запуск)
+        remark_deadlines.enqueue_overdue_scan(db)
+        db.commit()
+
         # Создание администратора по умолчанию при запуске приложения
         admin_username = os.getenv("ADMIN_USERNAME", "Yahweh")
         admin_password = os.getenv("ADMIN_PASSWORD", "90vopepi")
@@ -63,15 +94,24 @@ async def lifespan(app: FastAPI):
 
             try:
                 created_admin = crud_user.create_user(db, admin_user)
+                db.commit()
                 print(f"Создан администратор: {created_admin.username}")
             except Exception as e:  # pylint: disable=broad-except
+                db.rollback()
                 print(f"Ошибка при создании администратора: {e}")
         else:
             print(f"Администратор {existing_admin.username} уже существует")
     finally:
         db.close()
+
+    # Фоновые задачи (outbox); при отдельном процессе python -m app.outbox отключается
+    if outbox.OUTBOX_WORKER_ENABLED:
+        outbox.worker.start()
     yield
-    # Здесь можно добавить код для завершения работы приложения
+    await outbox.worker.stop()
+    # Закрываем WebSocket соединения и останавливаем задачи отправки
+    await manager.close_all()
+    events.stop()
 
 
 app = FastAPI(
@@ -79,6 +119,10 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+app.router.route_class = ProfiledRoute
+
+# Фиксация транзакции запроса одним COMMIT перед отправкой ответа
+app.add_middleware(UnitOfWorkMiddleware)
 
 # Настройка CORS
 app.add_middleware(
@@ -89,6 +133,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Число SQL запросов и время в БД на запрос (Server-Timing, /debug/profile)
+app.add_middleware(ProfilerMiddleware)
+
+# Сжатие ответов gzip/brotli/zstd по Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
+# Метрики Prometheus (/metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Подключение маршрутов ГПР
 app.include_router(gpr_routes.router)
 
@@ -107,74 +160,184 @@ app.include_router(work_session_router)
 # Подключение маршрутов замечаний от строительного контроля
 app.include_router(construction_remarks_router)
 
+# Подключение маршрутов инкрементальной синхронизации клиентов
+app.include_router(sync_router)
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# (файл.br/файл.gz рядом с исходным отдаются клиентам, принимающим сжатие)
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
+
+
+async def handle_subscription(websocket: WebSocket, payload: dict, action: str, topics: list):
+    """Обработать подписку/отписку на темы доменных событий"""
+    permission_mask = payload.get("perms", 0)
+    accepted, rejected = [], []
+    for topic in topics:
+        if not isinstance(topic, str):
+            continue
+        if action == "unsubscribe":
+            manager.unsubscribe(websocket, topic)
+            accepted.append(topic)
+            continue
+        
+        required = events.topic_permission(topic)
+        if required is None or permission_mask & required != required:
+            rejected.append(topic)
+        elif manager.subscribe(websocket, topic):
+            accepted.append(topic)
+        else:
+            rejected.append(topic)
+    
+    await manager.send_personal_message(
+        json.dumps({"type": f"{action}d", "topics": accepted, "rejected": rejected}),
+        websocket
+    )
+
+
+async def authenticate_websocket(websocket: WebSocket):
+    """
+    Аутентификация по первому сообщению {"type": "auth", "token": "<JWT>"}.
+    Токен не передается в URL и не попадает в журналы прокси-серверов.
+    """
+    try:
+        data = await asyncio.wait_for(websocket.receive_text(), timeout=WS_AUTH_TIMEOUT)
+    except asyncio.TimeoutError:
+        manager.auth_timeouts += 1
+        await websocket.close(code=1008, reason="Authentication timeout")
+        return None
+
+    try:
+        message = json.loads(data)
+        if message.get("type") != "auth":
+            raise ValueError("Expected auth message")
+        payload = verify_access_token(message.get("token") or "")
+        if not payload.get("user_id"):
+            raise ValueError("Invalid token")
+        return payload
+    except (ValueError, AttributeError, HTTPException):
+        manager.auth_failures += 1
+        await websocket.close(code=1008, reason="Authentication failed")
+        return None
 
 
 # WebSocket routes
-@app.websocket("/ws/{token}")
-async def websocket_endpoint(websocket: WebSocket, token: str):
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint для реал-тайм уведомлений"""
+    await websocket.accept()
     try:
-        # Верифицируем токен
-        payload = verify_access_token(token)
-        user_id = payload.get("user_id")
-        
-        if not user_id:
-            await websocket.close(code=1008, reason="Invalid token")
-            return
-            
-        # Подключаем пользователя к вебсокету
-        await manager.connect(websocket, user_id)
+        payload = await authenticate_websocket(websocket)
+    except WebSocketDisconnect:
+        return
+    if payload is None:
+        return
+
+    user_id = payload["user_id"]
+    # Регистрируем соединение пользователя
+    manager.register(websocket, user_id)
+    
+    try:
+        # Отправляем подтверждение подключения
+        await manager.send_personal_message(
+            json.dumps({
+                "type": "connection",
+                "message": "Connected to server",
+                "user_id": user_id,
+                "ping_interval": manager.ping_interval
+            }),
+            websocket
+        )
         
-        try:
-            # Отправляем подтверждение подключения
-            await manager.send_personal_message(
-                json.dumps({"type": "connection", "message": "Connected to server", "user_id": user_id}),
-                websocket
-            )
+        # Основной цикл обработки сообщений
+        while True:
+            # Получаем сообщение от клиента; любое сообщение подтверждает, что соединение живо
+            data = await websocket.receive_text()
+            manager.touch(websocket)
             
-            # Основной цикл обработки сообщений
-            while True:
-                # Получаем сообщение от клиента (опционально)
-                data = await websocket.receive_text()
+            # Парсим сообщение
+            try:
+                message_data = json.loads(data)
+                message_type = message_data.get("type")
                 
-                # Парсим сообщение
-                try:
-                    message_data = json.loads(data)
-                    message_type = message_data.get("type")
-                    
-                    # В зависимости от типа сообщения, можем обрабатывать по-разному
-                    if message_type == "ping":
-                        await manager.send_personal_message(
-                            json.dumps({"type": "pong", "message": "Pong"}),
-                            websocket
-                        )
-                    elif message_type == "request_user_info":
-                        await manager.send_personal_message(
-                            json.dumps({
-                                "type": "user_info", 
-                                "user_id": user_id,
-                                "connections_count": manager.get_user_connections_count(user_id)
-                            }),
-                            websocket
-                        )
-                        
-                except json.JSONDecodeError:
-                    # Если не удалось распарсить JSON, просто продолжаем
+                # В зависимости от типа сообщения, можем обрабатывать по-разному
+                if message_type == "ping":
+                    await manager.send_personal_message(
+                        json.dumps({"type": "pong", "message": "Pong"}),
+                        websocket
+                    )
+                elif message_type == "pong":
+                    # Ответ на ping сервера, достаточно отметки активности
                     continue
+                elif message_type == "request_user_info":
+                    await manager.send_personal_message(
+                        json.dumps({
+                            "type": "user_info", 
+                            "user_id": user_id,
+                            "connections_count": manager.get_user_connections_count(user_id)
+                        }),
+                        websocket
+                    )
+                elif message_type in ("subscribe", "unsubscribe"):
+                    await handle_subscription(websocket, payload, message_type, message_data.get("topics") or [])
+                elif message_type == "list_subscriptions":
+                    await manager.send_personal_message(
+                        json.dumps({"type": "subscriptions", "topics": manager.get_subscriptions(websocket)}),
+                        websocket
+                    )
                     
-        except WebSocketDisconnect:
-            manager.disconnect(websocket)
-            
-    except Exception as e:
-        await websocket.close(code=1008, reason="Authentication failed")
+            except (json.JSONDecodeError, AttributeError):
+                # Если не удалось распарсить сообщение, просто продолжаем
+                continue
+                
+    except WebSocketDisconnect:
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+
+@app.get("/ws/stats")
+async def websocket_stats(current_user: dict = Depends(require(Permission.USERS_MANAGE))):
+    """Метрики WebSocket соединений (только для администраторов)"""
+    return manager.get_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Метрики в формате Prometheus. Если задан METRICS_TOKEN, требуется
+    заголовок Authorization: Bearer <METRICS_TOKEN>.
+    """
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Неверный токен метрик")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def debug_profile(current_user: dict = Depends(require(Permission.USERS_MANAGE))):
+    """Перцентили длительности и числа SQL запросов по маршрутам, медленные запросы (только для администраторов)"""
+    return profiler.get_stats()
+
+
+@app.get("/debug/profile/samples/{sample_id}", response_class=PlainTextResponse)
+async def debug_profile_sample(sample_id: int, current_user: dict = Depends(require(Permission.USERS_MANAGE))):
+    """Отчет профилировщика для выборочного запроса"""
+    sample = profiler.get_sample(sample_id)
+    if sample is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return sample["report"]
+
+
+@app.delete("/debug/profile")
+async def reset_debug_profile(current_user: dict = Depends(require(Permission.USERS_MANAGE))):
+    """Сбросить накопленную статистику профилирования"""
+    profiler.reset()
+    return {"message": "Статистика профилирования сброшена"}
 
 
 # Web UI routes
 
 @app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, current_user=Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def dashboard(request: Request, current_user=Depends(get_current_active_user), db: Session = Depends(get_read_db)):
     # Get current work status
     work_status = crud_work_session.get_current_work_status(db, current_user.id)
     today_sessions = crud_work_session.get_work_sessions_for_date(db, current_user.id, date.today())
@@ -204,7 +367,7 @@ async def profile(request: Request, current_user=Depends(get_current_active_user
 
 
 @app.get("/employees", response_class=HTMLResponse)
-async def employees(request: Request, current_user=Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def employees(request: Request, current_user=Depends(get_current_active_user), db: Session = Depends(get_read_db)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ разрешен только администраторам")
 
@@ -0,0 +1,64 @@
+"""
+Перенос реестра ПТО (pto_docs.db) в БД бэкенда.
+
+Документы, отправки и возвраты переносятся пачками (--chunk-size) вместе
+с историей статусов; уже перенесенные документы пропускаются, поэтому
+скрипт можно запускать повторно. С ключом --dry-run изменения не
+сохраняются, выводится только отчет. Все расхождения можно сохранить
+в CSV (--mismatches).
+
+    python migrate_pto_docs.py [путь к pto_docs.db] [--chunk-size N] [--dry-run] [--mismatches файл.csv]
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.utils import pto_migration  # noqa: E402
+
+DEFAULT_LEGACY_PATH = Path(__file__).resolve().parents[2] / "pto_docs.db"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос реестра ПТО в БД бэкенда")
+    parser.add_argument("path", nargs="?", default=str(DEFAULT_LEGACY_PATH), help="база реестра ПТО")
+    parser.add_argument("--chunk-size", type=int, default=pto_migration.MIGRATION_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="проверить перенос без сохранения")
+    parser.add_argument("--mismatches", help="CSV файл со всеми расхождениями")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    try:
+        legacy = pto_migration.open_legacy_database(args.path)
+    except FileNotFoundError:
+        print(f"Файл {args.path} не найден")
+        sys.exit(1)
+
+    # Таблицы, появившиеся после создания БД (legacy_document_map и др.)
+    Base.metadata.create_all(bind=engine)
+    mismatches_file = open(args.mismatches, "w", newline="", encoding="utf-8-sig") if args.mismatches else None
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        report = pto_migration.PtoMigrator(
+            db, legacy, pto_migration.MigrationReport(mismatches_file), args.chunk_size
+        ).run(dry_run=args.dry_run)
+    finally:
+        db.close()
+        legacy.close()
+        if mismatches_file:
+            mismatches_file.close()
+
+    if args.dry_run:
+        print("Пробный запуск: изменения не сохранены")
+    for line in report.lines():
+        print(line)
+    print(f"Время: {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
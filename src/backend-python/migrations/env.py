@@ -0,0 +1,54 @@
+"""
+Окружение Alembic: подключение к БД приложения и метаданные моделей.
+
+Таблицы новой БД создает init_db.py (Base.metadata.create_all), миграции
+доводят до текущей схемы базы, созданные раньше.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import models  # noqa: F401 - регистрация моделей в Base.metadata
+from app.database import DATABASE_URL, Base, create_db_engine
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def _is_sqlite() -> bool:
+    return DATABASE_URL.startswith("sqlite")
+
+
+def run_migrations_offline():
+    """Вывод SQL миграций без подключения к БД (alembic upgrade head --sql)"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=_is_sqlite(),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_db_engine(DATABASE_URL)
+    with engine.connect() as connection:
+        # SQLite не поддерживает большую часть ALTER TABLE: изменения таблиц через batch
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=_is_sqlite(),
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
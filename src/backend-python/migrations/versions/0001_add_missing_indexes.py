@@ -0,0 +1,41 @@
+"""Индексы по внешним ключам и полям фильтрации
+
+Отправки и возвраты документов выбираются по document_id (список отправок
+и возвратов, загрузка документа с отправками, удаление документа),
+сессии пользователей - по user_id, сессии работы - по user_id и
+start_time. Без индексов каждый такой запрос читал всю таблицу.
+
+Индексы создаются с IF NOT EXISTS: в базах, созданных create_all после
+добавления index=True в модели, они уже есть.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_document_shipments_document_id", "document_shipments", ["document_id"]),
+    ("ix_document_returns_document_id", "document_returns", ["document_id"]),
+    ("ix_user_sessions_user_id", "user_sessions", ["user_id"]),
+    ("ix_work_sessions_user_id_start_time", "work_sessions", ["user_id", "start_time"]),
+)
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,74 @@
+"""История статусов документов
+
+Таблица document_status_history с переходами автомата состояний документа.
+Для существующих документов история восстанавливается по датам создания,
+отправок и возвратов: создание (in_office), каждая отправка (shipped,
+с получателем), каждый возврат (returned). Документы, у которых история
+уже есть, пропускаются. Строки вставляются в порядке переходов: периоды
+статусов считаются по порядку id истории.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = """
+    INSERT INTO document_status_history
+        (document_id, old_status, new_status, recipient, shipment_id, return_id, changed_at)
+    SELECT
+        document_id,
+        LAG(status) OVER (PARTITION BY document_id ORDER BY is_movement, changed_at, kind, row_id),
+        status, recipient, shipment_id, return_id, changed_at
+    FROM (
+        SELECT id AS document_id, 'in_office' AS status, NULL AS recipient, NULL AS shipment_id,
+               NULL AS return_id, created_at AS changed_at, 0 AS is_movement, 0 AS kind, id AS row_id
+        FROM documents
+        UNION ALL
+        SELECT document_id, 'shipped', recipient, id, NULL, shipment_date, 1, 1, id
+        FROM document_shipments
+        UNION ALL
+        SELECT document_id, 'returned', NULL, NULL, id, return_date, 1, 2, id
+        FROM document_returns
+    ) events
+    WHERE document_id NOT IN (SELECT document_id FROM document_status_history)
+    ORDER BY document_id, is_movement, changed_at, kind, row_id
+"""
+
+
+def upgrade() -> None:
+    # Таблица может быть уже создана init_db.py (create_all)
+    if not sa.inspect(op.get_bind()).has_table("document_status_history"):
+        op.create_table(
+            "document_status_history",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("document_id", sa.Integer(), sa.ForeignKey("documents.id"), nullable=False),
+            sa.Column("old_status", sa.String(), nullable=True),
+            sa.Column("new_status", sa.String(), nullable=False),
+            sa.Column("recipient", sa.String(), nullable=True),
+            sa.Column("shipment_id", sa.Integer(), nullable=True),
+            sa.Column("return_id", sa.Integer(), nullable=True),
+            sa.Column("changed_by", sa.String(), nullable=True),
+            sa.Column("changed_at", sa.DateTime(), nullable=False),
+            sa.Column("recorded_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    op.create_index("ix_document_status_history_id", "document_status_history", ["id"], if_not_exists=True)
+    op.create_index("ix_document_status_history_recipient", "document_status_history", ["recipient"],
+                    if_not_exists=True)
+    op.create_index("ix_document_status_history_document_id_changed_at", "document_status_history",
+                    ["document_id", "changed_at"], if_not_exists=True)
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_table("document_status_history")
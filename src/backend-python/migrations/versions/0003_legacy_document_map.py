@@ -0,0 +1,41 @@
+"""Соответствие записей реестра ПТО записям бэкенда
+
+Таблица legacy_document_map заполняется переносом pto_docs.db
+(migrate_pto_docs.py): ID документа, отправки или возврата в реестре ПТО
+и ID перенесенной записи. По ней повторный перенос пропускает уже
+перенесенные документы.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица может быть уже создана init_db.py (create_all)
+    if sa.inspect(op.get_bind()).has_table("legacy_document_map"):
+        return
+    op.create_table(
+        "legacy_document_map",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("entity", sa.String(), nullable=False),
+        sa.Column("legacy_id", sa.Integer(), nullable=False),
+        sa.Column("new_id", sa.Integer(), nullable=False),
+        sa.Column("migrated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("entity", "legacy_id", name="uq_legacy_document_map_entity_legacy_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("legacy_document_map")
@@ -0,0 +1,65 @@
+"""Счетчики замечаний по объектам проекта
+
+Таблица remark_counters (объект, статус, приоритет, число замечаний,
+число просроченных) и признак construction_remarks.is_overdue.
+Счетчики поддерживают функции создания, изменения и удаления замечаний;
+здесь они заполняются по существующим замечаниям. Повторный запуск
+пересчитывает счетчики заново.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# В construction_remarks хранятся имена RemarkStatus, в remark_counters - значения
+MARK_OVERDUE = """
+    UPDATE construction_remarks SET is_overdue = CASE
+        WHEN deadline IS NOT NULL AND deadline < :now AND status NOT IN ('FIXED', 'VERIFIED', 'CLOSED')
+        THEN TRUE ELSE FALSE END
+"""
+
+BACKFILL = """
+    INSERT INTO remark_counters (project_object_id, status, priority, count, overdue_count)
+    SELECT project_object_id, LOWER(CAST(status AS VARCHAR)), COALESCE(priority, 'normal'),
+           COUNT(*), SUM(CASE WHEN is_overdue THEN 1 ELSE 0 END)
+    FROM construction_remarks
+    GROUP BY project_object_id, LOWER(CAST(status AS VARCHAR)), COALESCE(priority, 'normal')
+"""
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "is_overdue" not in {column["name"] for column in inspector.get_columns("construction_remarks")}:
+        op.add_column("construction_remarks",
+                      sa.Column("is_overdue", sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Таблица может быть уже создана init_db.py (create_all)
+    if not inspector.has_table("remark_counters"):
+        op.create_table(
+            "remark_counters",
+            sa.Column("project_object_id", sa.Integer(), sa.ForeignKey("project_objects.id"), primary_key=True),
+            sa.Column("status", sa.String(), primary_key=True),
+            sa.Column("priority", sa.String(), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("overdue_count", sa.Integer(), nullable=False),
+        )
+    op.execute(sa.text(MARK_OVERDUE).bindparams(now=datetime.utcnow()))
+    op.execute("DELETE FROM remark_counters")
+    op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    op.drop_table("remark_counters")
+    with op.batch_alter_table("construction_remarks") as batch_op:
+        batch_op.drop_column("is_overdue")
@@ -0,0 +1,42 @@
+"""Индекс сроков замечаний и отметки фоновых проверок
+
+Индекс construction_remarks (status, deadline): просроченные замечания
+выбираются по открытым статусам и диапазону сроков без чтения всей
+таблицы. Таблица scan_watermarks хранит, до какого момента периодическая
+проверка сроков замечаний уже выполнена; первая проверка после миграции
+просматривает все замечания с прошедшим сроком, следующие - только
+срок которых наступил после прошлой проверки.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_construction_remarks_status_deadline", "construction_remarks", ["status", "deadline"],
+                    if_not_exists=True)
+    # Таблица может быть уже создана init_db.py (create_all)
+    if not sa.inspect(op.get_bind()).has_table("scan_watermarks"):
+        op.create_table(
+            "scan_watermarks",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("watermark", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("scan_watermarks")
+    op.drop_index("ix_construction_remarks_status_deadline", table_name="construction_remarks", if_exists=True)
@@ -0,0 +1,49 @@
+"""Отзыв сессий пользователей
+
+Колонки user_sessions для ротации refresh токенов: признак и время
+отзыва сессии, клиент (User-Agent) и IP адрес, открывшие сессию, и индекс
+по признаку отзыва (загрузка отозванных сессий при старте приложения).
+Существующие сессии считаются неотозванными.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns():
+    return [
+        sa.Column("is_revoked", sa.Boolean(), server_default=sa.false(), nullable=True),
+        sa.Column("revoked_at", sa.DateTime(), nullable=True),
+        sa.Column("user_agent", sa.String(), nullable=True),
+        sa.Column("ip_address", sa.String(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    # В базах, созданных create_all после изменения модели, колонки уже есть
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("user_sessions")}
+    missing = [column for column in _columns() if column.name not in existing]
+    if missing:
+        with op.batch_alter_table("user_sessions") as batch_op:
+            for column in missing:
+                batch_op.add_column(column)
+    op.create_index("ix_user_sessions_is_revoked", "user_sessions", ["is_revoked"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_sessions_is_revoked", table_name="user_sessions", if_exists=True)
+    with op.batch_alter_table("user_sessions") as batch_op:
+        for column in reversed(_columns()):
+            batch_op.drop_column(column.name)
@@ -0,0 +1,65 @@
+"""Роли и права доступа
+
+Таблицы roles, role_permissions и user_roles ролевой модели. Роли по
+умолчанию и их права создает приложение при старте
+(crud_user.ensure_default_roles).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблицы могут быть уже созданы init_db.py (create_all)
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("roles"):
+        op.create_table(
+            "roles",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_roles_id", "roles", ["id"])
+        op.create_index("ix_roles_name", "roles", ["name"], unique=True)
+    if not inspector.has_table("role_permissions"):
+        op.create_table(
+            "role_permissions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id"), nullable=False),
+            sa.Column("permission", sa.String(), nullable=False),
+            sa.UniqueConstraint("role_id", "permission", name="uq_role_permission"),
+        )
+        op.create_index("ix_role_permissions_id", "role_permissions", ["id"])
+        op.create_index("ix_role_permissions_role_id", "role_permissions", ["role_id"])
+    if not inspector.has_table("user_roles"):
+        op.create_table(
+            "user_roles",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.UniqueConstraint("user_id", "role_id", name="uq_user_role"),
+        )
+        op.create_index("ix_user_roles_id", "user_roles", ["id"])
+        op.create_index("ix_user_roles_user_id", "user_roles", ["user_id"])
+        op.create_index("ix_user_roles_role_id", "user_roles", ["role_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("user_roles")
+    op.drop_table("role_permissions")
+    op.drop_table("roles")
@@ -0,0 +1,40 @@
+"""Журнал изменений для синхронизации клиентов
+
+Таблица change_log: записи журнала добавляет обработчик after_flush
+(app.models.sync), GET /api/sync отдает изменения после токена клиента.
+Существующие записи в журнал не попадают: клиенты без токена получают
+полный снимок.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-20 11:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица может быть уже создана init_db.py (create_all)
+    if not sa.inspect(op.get_bind()).has_table("change_log"):
+        op.create_table(
+            "change_log",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("entity", sa.String(), nullable=False),
+            sa.Column("entity_id", sa.Integer(), nullable=False),
+            sa.Column("operation", sa.String(), nullable=False),
+            sa.Column("changed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    op.create_index("ix_change_log_changed_at", "change_log", ["changed_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_table("change_log")
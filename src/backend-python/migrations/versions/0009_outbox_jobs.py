@@ -0,0 +1,45 @@
+"""Очередь фоновых задач (transactional outbox)
+
+Таблица outbox_jobs, из которой воркер app.outbox выбирает готовые
+задачи по индексу (status, run_after).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-20 11:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица может быть уже создана init_db.py (create_all)
+    if not sa.inspect(op.get_bind()).has_table("outbox_jobs"):
+        op.create_table(
+            "outbox_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("job_type", sa.String(), nullable=False),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("idempotency_key", sa.String(), nullable=True, unique=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("max_attempts", sa.Integer(), nullable=False),
+            sa.Column("run_after", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        )
+    op.create_index("ix_outbox_jobs_status_run_after", "outbox_jobs", ["status", "run_after"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_table("outbox_jobs")
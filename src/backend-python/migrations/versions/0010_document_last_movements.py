@@ -0,0 +1,49 @@
+"""Последняя отправка и последний возврат в таблице documents
+
+Колонки documents.last_shipment_* и documents.last_return_*. Для новых
+отправок и возвратов их заполняют CRUD функции; для существующих
+документов - скрипт backfill_document_movements.py (пачками, можно
+в фоне через очередь outbox).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-20 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns():
+    return [
+        sa.Column("last_shipment_id", sa.Integer(), nullable=True),
+        sa.Column("last_shipment_date", sa.DateTime(), nullable=True),
+        sa.Column("last_shipment_recipient", sa.String(), nullable=True),
+        sa.Column("last_return_id", sa.Integer(), nullable=True),
+        sa.Column("last_return_date", sa.DateTime(), nullable=True),
+        sa.Column("last_return_condition", sa.String(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    # В базах, созданных create_all после изменения модели, колонки уже есть
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("documents")}
+    missing = [column for column in _columns() if column.name not in existing]
+    if missing:
+        with op.batch_alter_table("documents") as batch_op:
+            for column in missing:
+                batch_op.add_column(column)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("documents") as batch_op:
+        for column in reversed(_columns()):
+            batch_op.drop_column(column.name)
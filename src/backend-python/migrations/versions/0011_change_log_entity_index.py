@@ -0,0 +1,28 @@
+"""Индекс журнала изменений по типу записей
+
+ETag списков документов, файлов, записей ГПР и замечаний включает номер
+последней строки change_log своего типа; индекс (entity, id) позволяет
+получить его без просмотра журнала.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_change_log_entity_id", "change_log", ["entity", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_log_entity_id", table_name="change_log", if_exists=True)
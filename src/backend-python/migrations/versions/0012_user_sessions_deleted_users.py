@@ -0,0 +1,32 @@
+"""Сессии удаленных пользователей
+
+user_sessions.user_id допускает NULL: при удалении пользователя его
+сессии не удаляются, а отзываются и отвязываются от пользователя, чтобы
+отзыв загружался при старте приложения до истечения сессий.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-20 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("user_sessions") as batch_op:
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM user_sessions WHERE user_id IS NULL")
+    with op.batch_alter_table("user_sessions") as batch_op:
+        batch_op.alter_column("user_id", existing_type=sa.Integer(), nullable=False)
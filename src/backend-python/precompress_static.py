@@ -0,0 +1,55 @@
+"""
+Скрипт предварительного сжатия статических файлов (static/).
+
+Для текстовых файлов (CSS, JS, HTML, SVG, JSON) создает рядом файл.gz и,
+при установленном пакете brotli, файл.br с максимальной степенью сжатия.
+PrecompressedStaticFiles отдает их без сжатия на каждом запросе.
+Запускается при сборке или после обновления статики:
+
+    python precompress_static.py [каталог]
+"""
+import gzip
+import sys
+from mimetypes import guess_type
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from app.compression import COMPRESSION_MIN_SIZE, brotli, is_compressible  # noqa: E402
+
+
+def _is_stale(source: Path, target: Path) -> bool:
+    return not target.exists() or target.stat().st_mtime < source.stat().st_mtime
+
+
+def precompress(directory: Path):
+    """Сжать текстовые файлы каталога; возвращает (файлов, байт исходных, байт gzip)"""
+    files = original = compressed = 0
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        content_type = guess_type(path.name)[0] or ""
+        if not is_compressible(content_type) or path.stat().st_size < COMPRESSION_MIN_SIZE:
+            continue
+
+        data = path.read_bytes()
+        gz_path = path.with_name(path.name + ".gz")
+        if _is_stale(path, gz_path):
+            gz_path.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            br_path = path.with_name(path.name + ".br")
+            if _is_stale(path, br_path):
+                br_path.write_bytes(brotli.compress(data, quality=11))
+
+        files += 1
+        original += len(data)
+        compressed += gz_path.stat().st_size
+    return files, original, compressed
+
+
+if __name__ == "__main__":
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "static"
+    count, original_size, gzip_size = precompress(target)
+    print(f"Сжато файлов: {count}; {original_size} -> {gzip_size} байт (gzip)")
+    if brotli is None:
+        print("Пакет brotli не установлен: файлы .br не созданы")